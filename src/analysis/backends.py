@@ -0,0 +1,454 @@
+import copy
+import itertools
+import time as timer
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.optimize import milp, linprog, Bounds, LinearConstraint
+
+from src.analysis.results import OptimizationResult, format_result
+
+# Solvers for MatrixProblem (see matrix_models.py).
+# - 'gurobi' - Gurobi via its matrix API, requires gurobipy and a licence,
+# - 'highs' - open-source HiGHS via scipy.optimize.milp, available offline with SciPy.
+# Both return the same (result_optimization, result_variables) pair as the functions in optimization.py.
+
+BACKENDS = ('gurobi', 'highs')
+
+# Formulations of the products of a binary and a continuous variable (e.g. u_st * st_in.sum()):
+# - 'bilinear' - products as they are (Gurobi solves a MIQP, HiGHS enumerates the binaries),
+# - 'split' - one LP per value of the binaries, solved concurrently, the best one is chosen,
+# - 'mccormick' - exact linearization with a new variable per product (MILP), see mccormick.
+FORMULATIONS = ('bilinear', 'split', 'mccormick')
+
+# Maximal number of binary variables in bilinear terms, which are enumerated by the HiGHS backend
+MAX_ENUMERATED_BINARIES = 10
+
+# Number of variables of the model solved by gurobi_available - more than the size-limited (pip) licence allows
+LICENCE_PROBE_SIZE = 2001
+
+# Gurobi error code of a model too large for the licence
+SIZE_LIMIT_EXCEEDED = 10010
+
+_gurobi_available = None
+
+
+def gurobi_available():
+    """
+    Checks (once) if gurobipy is installed and a licence for models of full size is available
+    (the size-limited licence installed with pip is not enough for the models of a year).
+    """
+    global _gurobi_available
+    if _gurobi_available is None:
+        try:
+            import gurobipy
+            with gurobipy.Env(params = {'OutputFlag': 0}) as env, gurobipy.Model(env = env) as m:
+                x = m.addMVar(LICENCE_PROBE_SIZE, ub = 1.0)
+                m.addConstr(x.sum() <= 1.0)
+                m.optimize()
+            _gurobi_available = True
+        except Exception: # missing package, missing or size-limited licence
+            _gurobi_available = False
+    return _gurobi_available
+
+
+def default_backend():
+    """
+    Returns 'gurobi' if it can be used on this machine, 'highs' otherwise.
+    """
+    return 'gurobi' if gurobi_available() else 'highs'
+
+
+def build_gurobi_model(problem, output_flag = False, env = None):
+    """
+    Creates Gurobi model from MatrixProblem with the matrix API (one call per block instead of one per constraint).
+    env is the Gurobi environment (default - the default one), every thread needs its own.
+    Returns the model and MVar with all the variables.
+    """
+    from gurobipy import Model, GRB
+
+    m = Model(problem.name, env = env)
+    m.setParam( 'OutputFlag', output_flag )
+
+    x = m.addMVar(problem.num_vars, lb = problem.lb, ub = problem.ub, vtype = problem.vtype, name = problem.var_names())
+    m.addMConstr(problem.A, x, problem.sense, problem.rhs)
+    m.setMObjective(problem.Q, problem.c, problem.constant, sense = GRB.MINIMIZE)
+
+    return m, x
+
+
+def _solve_gurobi(problem, output_flag = False, env = None):
+    m, x = build_gurobi_model(problem, output_flag, env)
+    m.optimize()
+    return m.objVal, x.X
+
+
+def fix_binaries(problem, variables, values):
+    """
+    Returns copy of MatrixProblem with binary variables fixed to values (bounds lb = ub, continuous type).
+    Products of the fixed variables in Q become linear terms of c (or constant).
+    """
+    fixed = copy.copy(problem)
+    x_fixed = np.full(problem.num_vars, np.nan)
+    x_fixed[variables] = values
+
+    fixed.c = problem.c.copy()
+    fixed.lb, fixed.ub, fixed.vtype = problem.lb.copy(), problem.ub.copy(), problem.vtype.copy()
+    fixed.lb[variables] = fixed.ub[variables] = values
+    fixed.vtype[variables] = 'C'
+
+    if problem.Q is not None:
+        Q = problem.Q.tocoo()
+        row_fixed, col_fixed = ~np.isnan(x_fixed[Q.row]), ~np.isnan(x_fixed[Q.col])
+        both = row_fixed & col_fixed
+        fixed.constant = problem.constant + np.sum(Q.data[both] * x_fixed[Q.row[both]] * x_fixed[Q.col[both]])
+        np.add.at(fixed.c, Q.col[row_fixed & ~both], Q.data[row_fixed & ~both] * x_fixed[Q.row[row_fixed & ~both]])
+        np.add.at(fixed.c, Q.row[col_fixed & ~both], Q.data[col_fixed & ~both] * x_fixed[Q.col[col_fixed & ~both]])
+
+        rest = ~(row_fixed | col_fixed)
+        fixed.Q = sp.csr_matrix((Q.data[rest], (Q.row[rest], Q.col[rest])), shape = Q.shape) if np.any(rest) else None
+
+    return fixed
+
+
+def _enumerated_binaries(problem):
+    """
+    Returns binary variables of the products in Q (every product has to contain a binary).
+    """
+    Q = problem.Q.tocoo()
+    binary = problem.vtype == 'B'
+    if not np.all(binary[Q.row] | binary[Q.col]):
+        raise ValueError("Only products of a binary and another variable are supported")
+
+    enumerated = np.unique(np.where(binary[Q.row], Q.row, Q.col))
+    if enumerated.shape[0] > MAX_ENUMERATED_BINARIES:
+        raise ValueError("Too many binary variables in products to enumerate: %d" % enumerated.shape[0])
+    return enumerated
+
+
+def _linear_subproblems(problem):
+    """
+    HiGHS does not support the products in Q. All of them in the models are products of a binary and
+    another variable (e.g. u_st * st_in), so they are removed exactly by fixing the binaries to 0 and 1.
+    Yields every linear problem.
+    """
+    enumerated = _enumerated_binaries(problem)
+    for values in itertools.product((0.0, 1.0), repeat = enumerated.shape[0]):
+        yield fix_binaries(problem, enumerated, values)
+
+
+def _highs_constraints(problem):
+    lower = np.where(problem.sense == '<', -np.inf, problem.rhs)
+    upper = np.where(problem.sense == '>', np.inf, problem.rhs)
+    return LinearConstraint(sp.csr_matrix(problem.A), lower, upper)
+
+
+def _solve_highs(problem, output_flag = False):
+    constraints = _highs_constraints(problem)
+
+    if problem.Q is None or problem.Q.nnz == 0:
+        subproblems = [problem]
+    else:
+        subproblems = _linear_subproblems(problem)
+
+    best_value, best_x, message = np.inf, None, None
+    for subproblem in subproblems:
+        integrality = (subproblem.vtype != 'C').astype(int)
+        result = milp(subproblem.c, integrality = integrality, bounds = Bounds(subproblem.lb, subproblem.ub),
+                      constraints = constraints, options = {'disp': output_flag})
+        if result.x is not None and result.fun + subproblem.constant < best_value:
+            best_value, best_x = result.fun + subproblem.constant, result.x
+        message = result.message
+
+    if best_x is None:
+        raise RuntimeError("HiGHS did not find a solution: %s" % message)
+
+    return best_value, best_x
+
+
+def implied_upper_bounds(problem):
+    """
+    Upper bounds of the variables implied by the constraints with '<' or '=' sense and the bounds of the other variables
+    in them (one pass), e.g. st_in[t] <= storage_available / default_in_rate from st_in[t] - st_max / default_in_rate <= 0.
+    """
+    A = sp.csr_matrix(problem.A)
+    A = A[np.flatnonzero(problem.sense != '>')]
+    rhs = problem.rhs[problem.sense != '>']
+    rows = np.repeat(np.arange(A.shape[0]), np.diff(A.indptr))
+
+    # Minimal activity of every term and of the whole row (infinite terms counted separately)
+    activity = np.where(A.data > 0, A.data * problem.lb[A.indices], A.data * problem.ub[A.indices])
+    infinite = np.isinf(activity)
+    row_infinite = np.bincount(rows, weights = infinite, minlength = A.shape[0])
+    row_finite = np.bincount(rows, weights = np.where(infinite, 0, activity), minlength = A.shape[0])
+
+    others_infinite = row_infinite[rows] - infinite
+    others = row_finite[rows] - np.where(infinite, 0, activity)
+    positive = (A.data > 0) & (others_infinite == 0)
+    bounds = (rhs[rows[positive]] - others[positive]) / A.data[positive]
+
+    upper = problem.ub.copy()
+    np.minimum.at(upper, A.indices[positive], bounds)
+    return upper
+
+
+def mccormick(problem):
+    """
+    Returns MatrixProblem without Q - every product q * x_b * x_c of a binary x_b and a variable x_c with bounds
+    [L, U] is replaced by q * w with (exact for binary x_b):
+        L * x_b <= w <= U * x_b,  x_c - U * (1 - x_b) <= w <= x_c - L * (1 - x_b).
+    U is the upper bound implied by the constraints (see implied_upper_bounds), it has to be finite.
+    The new variables are added after all the others, in family '_products'.
+    """
+    Q = problem.Q.tocoo()
+    binary = problem.vtype == 'B'
+    if not np.all(binary[Q.row] | binary[Q.col]):
+        raise ValueError("Only products of a binary and another variable are supported")
+    x_b = np.where(binary[Q.row], Q.row, Q.col)
+    x_c = np.where(binary[Q.row], Q.col, Q.row)
+
+    lower = problem.lb[x_c]
+    upper = implied_upper_bounds(problem)[x_c]
+    if np.any(np.isinf(lower)) or np.any(np.isinf(upper)):
+        raise ValueError("McCormick linearization needs finite bounds of the variables in products")
+
+    n, products = problem.num_vars, Q.nnz
+    w = n + np.arange(products)
+    ones = np.ones(products)
+
+    # Rows: w - U x_b <= 0, w - L x_b >= 0, w - x_c - L x_b <= -L, w - x_c - U x_b >= -U
+    block_rows = np.concatenate([np.arange(products) + k * products for k in range(4) for _ in range(2)] +
+                                [np.arange(products) + 2 * products, np.arange(products) + 3 * products])
+    block_cols = np.concatenate([w, x_b, w, x_b, w, x_b, w, x_b, x_c, x_c])
+    block_vals = np.concatenate([ones, -upper, ones, -lower, ones, -lower, ones, -upper, -ones, -ones])
+    block = sp.csr_matrix((block_vals, (block_rows, block_cols)), shape = (4 * products, n + products))
+
+    linear = copy.copy(problem)
+    linear.A = sp.vstack([sp.hstack([sp.csr_matrix(problem.A), sp.csr_matrix((problem.num_constrs, products))]), block]).tocsr()
+    linear.sense = np.concatenate([problem.sense, np.repeat(np.array(['<', '>', '<', '>']), products)])
+    linear.rhs = np.concatenate([problem.rhs, np.zeros(2 * products), -lower, -upper])
+    linear.c = np.concatenate([problem.c, Q.data])
+    linear.lb = np.concatenate([problem.lb, np.minimum(lower, 0)])
+    linear.ub = np.concatenate([problem.ub, np.maximum(upper, 0)])
+    linear.vtype = np.concatenate([problem.vtype, np.full(products, 'C')])
+    linear.families = dict(problem.families, _products = (n, (products,)))
+    linear.Q = None
+
+    return linear
+
+
+def _solve_split(problem, backend, output_flag = False):
+    """
+    Solves the LP of every value of the binaries in products in its own thread (with its own Gurobi environment).
+    """
+    enumerated = _enumerated_binaries(problem)
+    subproblems = [fix_binaries(problem, enumerated, values) for values in itertools.product((0.0, 1.0), repeat = enumerated.shape[0])]
+
+    def solve_one(subproblem):
+        if backend == 'gurobi':
+            import gurobipy
+            with gurobipy.Env(params = {'OutputFlag': int(output_flag)}) as env:
+                try:
+                    return _solve_gurobi(subproblem, output_flag, env)
+                except (gurobipy.GurobiError, AttributeError):
+                    return np.inf, None
+        try:
+            return _solve_highs(subproblem, output_flag)
+        except RuntimeError:
+            return np.inf, None
+
+    with ThreadPoolExecutor(max_workers = len(subproblems)) as executor:
+        results = list(executor.map(solve_one, subproblems))
+
+    best_value, best_x = min(results, key = lambda result: result[0])
+    if best_x is None:
+        raise RuntimeError("None of the split problems was solved")
+    return best_value, best_x
+
+
+def solve_lp(problem, backend = 'highs', output_flag = False):
+    """
+    Solves linear MatrixProblem (without Q and binaries, see fix_binaries).
+    Returns objective value, values of the variables and their reduced costs - change of the objective
+    per unit change of the variable's bound, e.g. subgradient for a variable fixed with lb = ub.
+    """
+    if backend == 'gurobi':
+        m, x = build_gurobi_model(problem, output_flag)
+        m.optimize()
+        return m.objVal, x.X, x.RC
+    elif backend != 'highs':
+        raise ValueError("Unknown backend %r, use one of %s" % (backend, BACKENDS))
+
+    A = sp.csr_matrix(problem.A)
+    upper = problem.sense == '<'
+    lower = problem.sense == '>'
+    equal = problem.sense == '='
+    A_ub = sp.vstack([A[upper], -A[lower]]).tocsr()
+    b_ub = np.concatenate([problem.rhs[upper], -problem.rhs[lower]])
+
+    result = linprog(problem.c, A_ub = A_ub if A_ub.shape[0] > 0 else None, b_ub = b_ub if A_ub.shape[0] > 0 else None,
+                     A_eq = A[equal] if np.any(equal) else None, b_eq = problem.rhs[equal] if np.any(equal) else None,
+                     bounds = np.column_stack([problem.lb, problem.ub]), method = 'highs', options = {'disp': output_flag})
+    if result.status != 0:
+        raise RuntimeError("HiGHS did not find a solution: %s" % result.message)
+
+    return result.fun + problem.constant, result.x, result.lower.marginals + result.upper.marginals
+
+
+def solve(problem, backend = 'gurobi', output_flag = False, formulation = 'bilinear'):
+    """
+    Solves MatrixProblem with given backend ('gurobi' or 'highs') and formulation of the products (see FORMULATIONS).
+    Returns objective value and NumPy array of values of all the variables.
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Unknown backend %r, use one of %s" % (backend, BACKENDS))
+    if formulation not in FORMULATIONS:
+        raise ValueError("Unknown formulation %r, use one of %s" % (formulation, FORMULATIONS))
+
+    if problem.Q is not None and problem.Q.nnz > 0:
+        if formulation == 'split':
+            return _solve_split(problem, backend, output_flag)
+        elif formulation == 'mccormick':
+            result_optimization, values = solve(mccormick(problem), backend, output_flag)
+            return result_optimization, values[:problem.num_vars]
+
+    if backend == 'gurobi':
+        from gurobipy import GurobiError
+        try:
+            return _solve_gurobi(problem, output_flag)
+        except GurobiError as error:
+            if error.errno != SIZE_LIMIT_EXCEEDED:
+                raise
+            warnings.warn("Model %s is too large for the Gurobi licence, solved with HiGHS" % problem.name)
+    return _solve_highs(problem, output_flag)
+
+
+def optimize(problem, backend = 'gurobi', output_flag = False, saving_storage = False, result_format = 'frame', formulation = 'bilinear'):
+    """
+    Solves MatrixProblem and returns the same (result_optimization, result_variables) pair as the functions in optimization.py.
+    result_format defines result_variables: Names/Values table ('frame') or OptimizationResult ('result', see results.py).
+    """
+    result_optimization, values = solve(problem, backend, output_flag, formulation)
+
+    if saving_storage:
+        result_variables = values[problem.family('st_max')]
+    else:
+        result_variables = format_result(OptimizationResult.from_problem(result_optimization, values, problem), result_format)
+
+    return result_optimization, result_variables
+
+
+class GurobiModel:
+    """
+    Gurobi model of MatrixProblem kept between solves. Coefficients are changed in place and every solve
+    starts from the previous solution (Gurobi also reuses the previous basis of LPs by itself).
+    """
+
+    def __init__(self, problem, output_flag = False, threads = None):
+        self.problem = problem
+        self.m, self.x = build_gurobi_model(problem, output_flag)
+        if threads is not None:
+            self.m.setParam( 'Threads', threads )
+        self.c = problem.c.copy()
+        self.Q = problem.Q
+        self.constant = problem.constant
+        self.constrs = None
+        self.solution = None
+
+    def set_objective(self, c, Q = None, constant = None):
+        """
+        Changes objective vector. Only changed coefficients are updated, unless new Q or constant is given.
+        """
+        from gurobipy import GRB
+
+        if Q is None and constant is None:
+            changed = np.flatnonzero(c != self.c)
+            if changed.shape[0] > 0:
+                self.x[changed].Obj = c[changed]
+        else:
+            self.Q = self.Q if Q is None else Q
+            self.constant = self.constant if constant is None else constant
+            self.m.setMObjective(self.Q, c, self.constant, sense = GRB.MINIMIZE)
+        self.c = c.copy()
+
+    def set_rhs(self, rows, values):
+        if self.constrs is None:
+            self.m.update()
+            self.constrs = self.m.getConstrs()
+        self.m.setAttr('RHS', [self.constrs[r] for r in np.atleast_1d(rows)], np.atleast_1d(values).tolist())
+
+    def set_bounds(self, variables, lb = None, ub = None):
+        if lb is not None:
+            self.x[variables].LB = lb
+        if ub is not None:
+            self.x[variables].UB = ub
+
+    def solve(self):
+        if self.solution is not None:
+            self.x.Start = self.solution
+        self.m.optimize()
+        self.solution = self.x.X
+        return self.m.objVal, self.solution
+
+
+class HighsModel:
+    """
+    The same interface as GurobiModel for HiGHS. scipy.optimize.milp cannot keep a model between solves,
+    so only the arrays are kept and changed, and every solve starts from scratch.
+    """
+
+    def __init__(self, problem, output_flag = False, threads = None):
+        self.problem = copy.copy(problem)
+        for name in ('c', 'rhs', 'lb', 'ub'):
+            setattr(self.problem, name, getattr(problem, name).copy())
+        self.output_flag = output_flag
+
+    def set_objective(self, c, Q = None, constant = None):
+        self.problem.c = c.copy()
+        if Q is not None:
+            self.problem.Q = Q
+        if constant is not None:
+            self.problem.constant = constant
+
+    def set_rhs(self, rows, values):
+        self.problem.rhs[rows] = values
+
+    def set_bounds(self, variables, lb = None, ub = None):
+        if lb is not None:
+            self.problem.lb[variables] = lb
+        if ub is not None:
+            self.problem.ub[variables] = ub
+
+    def solve(self):
+        return _solve_highs(self.problem, self.output_flag)
+
+
+def persistent_model(problem, backend = 'gurobi', output_flag = False, threads = None):
+    """
+    Creates model of MatrixProblem, which can be changed and solved many times (see GurobiModel).
+    """
+    if backend == 'gurobi':
+        return GurobiModel(problem, output_flag, threads)
+    elif backend == 'highs':
+        return HighsModel(problem, output_flag, threads)
+    raise ValueError("Unknown backend %r, use one of %s" % (backend, BACKENDS))
+
+
+def compare_backends(problem, backends = BACKENDS, repeats = 1):
+    """
+    Solves the same MatrixProblem with every backend.
+    Returns objective value and best solving time (in seconds, including model building in the solver) of every backend.
+    """
+    results = []
+    for backend in backends:
+        timings = []
+        for _ in range(repeats):
+            start = timer.perf_counter()
+            result_optimization, _ = solve(problem, backend)
+            timings.append(timer.perf_counter() - start)
+        results.append({'backend': backend, 'objective': result_optimization, 'seconds': min(timings)})
+
+    return pd.DataFrame(results)
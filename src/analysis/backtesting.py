@@ -0,0 +1,124 @@
+import time as timer
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import forecasting
+
+# Walk-forward backtest of the SARIMAX forecasts of forecasting.py.
+# Forecasts are made at every origin (every step observations) for the next horizon observations.
+# Parameters are estimated only at the first origin of every segment of refit_every origins; at the other origins
+# the fitted results are extended with the newly observed data (Kalman filter only, no optimization).
+# Segments are independent, so they are computed in a process pool.
+# Positions of observations are used instead of dates, as the series skip public holidays.
+
+
+def _segment(values, origins, horizon, order, seasonal_order, alpha, cache, fit_kwargs):
+    """
+    Forecasts of one segment: refit at origins[0], extension of the results at the others.
+    Returns forecasts, lower and upper bounds (origins, horizon) and time of every origin (in seconds).
+    """
+    forecasts, lower, upper = (np.full((len(origins), horizon), np.nan) for _ in range(3))
+    seconds = np.zeros(len(origins))
+
+    for k, origin in enumerate(origins):
+        begin = timer.perf_counter()
+        if k == 0:
+            model_fit = forecasting.fit_sarimax(pd.Series(values[:origin]), order, seasonal_order, cache, **fit_kwargs)
+        else:
+            model_fit = model_fit.extend(values[origins[k - 1]:origin])
+
+        forecast = model_fit.get_forecast(horizon)
+        forecasts[k] = forecast.predicted_mean
+        interval = np.asarray(forecast.conf_int(alpha = alpha))
+        lower[k], upper[k] = interval[:, 0], interval[:, 1]
+        seconds[k] = timer.perf_counter() - begin
+
+    return forecasts, lower, upper, seconds
+
+
+def backtest(gas_data,
+             data_since = '2012-01-01',
+             first_origin = '2013-01-01',
+             last_origin = None,
+             horizon = 30,
+             step = 1,
+             refit_every = 30,
+             ARIMA_order = (3,1,3),
+             ARIMA_season_order = (2,2,3,7),
+             alpha = 0.05,
+             processes = None,
+             cache = None,
+             **fit_kwargs
+             ):
+    """
+    This function will backtest the forecasts of forecast_prices / forecast_demand based on:
+    - series (gas_data) observed from data_since,
+    - origins - every step-th observation from first_origin to last_origin (default - the last one with a full horizon),
+      at every origin the next horizon observations are forecasted with the data before the origin,
+    - refit_every - number of origins between estimations of the parameters,
+    - orders of SARIMAX (ARIMA_order, ARIMA_season_order) and alpha of the confidence intervals.
+    processes defines number of worker processes (default - number of CPUs), cache the FitCache of the refits (see model_cache.py),
+    fit_kwargs are passed to fit (e.g. maxiter).
+
+    Returns table with one row per origin and forecasted observation: origin, target date, step, refit (if the origin
+    was refitted), seconds (time of the origin), actual value, forecast, lower and upper bound, errors and metrics of the
+    origin (mape - mean_absolute_percentage_error, mae, rmse, coverage of the intervals).
+    """
+    series = gas_data.loc[pd.to_datetime(data_since):]
+    values = series.to_numpy(dtype = float)
+    dates = series.index
+
+    first = dates.searchsorted(pd.to_datetime(first_origin))
+    last = values.shape[0] - horizon if last_origin is None else dates.searchsorted(pd.to_datetime(last_origin), side = 'right') - 1
+    origins = np.arange(first, min(last, values.shape[0] - 1) + 1, step)
+    if origins.shape[0] == 0:
+        raise ValueError("No origins between first_origin and last_origin")
+
+    segments = [origins[k:k + refit_every] for k in range(0, origins.shape[0], refit_every)]
+    arguments = [(values, segment, horizon, ARIMA_order, ARIMA_season_order, alpha, cache, fit_kwargs) for segment in segments]
+    if len(segments) == 1 or processes == 1:
+        results = [_segment(*a) for a in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers = processes) as executor:
+            results = list(executor.map(_segment, *zip(*arguments)))
+
+    forecasts, lower, upper = (np.concatenate([r[i] for r in results]) for i in range(3))
+    seconds = np.concatenate([r[3] for r in results])
+    refit = np.concatenate([np.arange(len(segment)) == 0 for segment in segments])
+
+    # Columns of all the (origin, step) pairs; targets after the end of the series have no actual value
+    n = origins.shape[0]
+    targets = origins[:, None] + np.arange(horizon)[None, :]
+    inside = targets < values.shape[0]
+    actual = np.where(inside, values[np.minimum(targets, values.shape[0] - 1)], np.nan)
+    target_dates = np.where(inside, dates.to_numpy()[np.minimum(targets, values.shape[0] - 1)], np.datetime64('NaT'))
+
+    table = pd.DataFrame({'origin': np.repeat(dates[origins], horizon), 'target': target_dates.ravel(),
+                          'step': np.tile(np.arange(1, horizon + 1), n), 'refit': np.repeat(refit, horizon),
+                          'seconds': np.repeat(seconds, horizon), 'actual': actual.ravel(), 'forecast': forecasts.ravel(),
+                          'lower': lower.ravel(), 'upper': upper.ravel()})
+    table['error'] = table['forecast'] - table['actual']
+    table['absolute_percentage_error'] = np.abs(table['error'] / table['actual'])
+    table['covered'] = (table['actual'] >= table['lower']) & (table['actual'] <= table['upper'])
+
+    # Metrics of every origin (mean over its forecasted observations), the same as forecasting.mean_absolute_percentage_error
+    errors = table['error'].to_numpy().reshape(n, horizon)
+    with np.errstate(invalid = 'ignore'):
+        metrics = {'mape': np.nanmean(table['absolute_percentage_error'].to_numpy().reshape(n, horizon), axis = 1),
+                   'mae': np.nanmean(np.abs(errors), axis = 1),
+                   'rmse': np.sqrt(np.nanmean(errors ** 2, axis = 1)),
+                   'coverage': np.nanmean(np.where(inside, table['covered'].to_numpy().reshape(n, horizon), np.nan), axis = 1)}
+    for name, metric in metrics.items():
+        table[name] = np.repeat(metric, horizon)
+
+    return table
+
+
+def summary(table):
+    """
+    Metrics of the backtest by forecast step (mape, mae, rmse, coverage over all the origins).
+    """
+    return table.groupby('step').agg(mape = ('absolute_percentage_error', 'mean'), mae = ('error', lambda e: e.abs().mean()),
+                                     rmse = ('error', lambda e: np.sqrt((e ** 2).mean())), coverage = ('covered', 'mean'))
@@ -0,0 +1,395 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import time as timer
+import tracemalloc
+
+import pandas as pd
+import numpy as np
+
+from src.analysis import optimization
+from src.analysis import matrix_models
+from src.analysis import backends
+from src.analysis.results import OptimizationResult
+
+# Benchmarks of the optimization module:
+# - build_time - model construction in optimization.py (scalar LinExpr generators) against matrix_models.py
+#   (sparse matrix blocks), for different horizon lengths,
+# - run_suite - build, solve and result extraction times and peak memory of all the models of optimization.py
+#   for different horizon lengths and numbers of scenarios, appended to a JSON lines file with the git commit,
+#   so the results of different commits can be compared (compare_commits).
+# Without a Gurobi licence the suite uses the open-source HiGHS backend, so it runs offline.
+# To run the script:
+# - go to the main dir of the repository,
+# - run "python -m src.analysis.benchmark" (suite, see --help) or "python -m src.analysis.benchmark --build-time"
+
+# Parameters of the models used in the suite (the same format as in optimization.py)
+STORAGE_BID = 1.0
+ST_MAX = 50
+LIMIT_TRADING = 200
+DETERMINISTIC_PARAMETERS = (100, 10, 10, 0.5, 200, 200)
+FULL_PARAMETERS = (100, 10, 10, 5, 5, 1, 1, 0.5)
+FLEXIBILITY_PARAMETERS = (10, 10, 1, 1, 3, 3, 0.5)
+STOCHASTIC_PARAMETERS = (100, 10, 10, 0.5)
+
+MODELS = ('deterministic', 'additional_flexibility_full', 'additional_flexibility', 'stochastic', 'additional_flexibility_stochastic')
+STOCHASTIC_MODELS = ('stochastic', 'additional_flexibility_stochastic')
+
+# Timed phases of run_suite
+PHASES = ('build', 'solve', 'extract', 'total')
+
+# Default file of the records of run_suite (ignored by git)
+DEFAULT_OUTPUT = os.path.join('data', 'benchmarks', 'benchmarks.jsonl')
+
+
+def synthetic_inputs(time, seed = 0):
+    """
+    Creates daily prices and demand of given horizon length (time), with weekly seasonality and noise.
+    Returns forecasting_since, forecasting_till, prices and demand in the format used by optimization.py.
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2013-01-01', periods = time, freq = 'D')
+    days = np.arange(time)
+
+    prices = pd.Series(20 + 3 * np.sin(2 * np.pi * days / 7) + 5 * np.sin(2 * np.pi * days / 365) + rng.normal(0, 1, time), index = index)
+    demand = pd.Series(50 + 10 * np.cos(2 * np.pi * days / 365) + rng.normal(0, 2, time), index = index)
+
+    return index[0], index[-1], prices, demand
+
+
+def synthetic_scenarios(time, paths_GPN = 3, paths_WD = 3, paths_demand = 3, samples_WD = 3, seed = 0):
+    """
+    Creates inputs of the stochastic models of given horizon length (time) and numbers of scenarios:
+    price and demand paths around the series of synthetic_inputs, and within-day samples around every demand path.
+    Returns forecasting_since, forecasting_till, prices_GPN, prices_WD, demand (DataFrames, one path per row)
+    and demand_WD (NumPy array (demand paths, time, samples)).
+    """
+    rng = np.random.default_rng(seed)
+    forecasting_since, forecasting_till, prices, demand = synthetic_inputs(time, seed)
+
+    def paths(series, n, scale):
+        return pd.DataFrame(series.to_numpy() + np.cumsum(rng.normal(0, scale, (n, time)), axis = 1) / np.sqrt(np.arange(1, time + 1)),
+                            columns = series.index)
+
+    prices_GPN = paths(prices, paths_GPN, 2)
+    prices_WD = paths(prices, paths_WD, 3)
+    demand_paths = paths(demand, paths_demand, 3)
+    demand_WD = demand_paths.to_numpy()[:, :, None] + rng.normal(0, 2, (paths_demand, time, samples_WD))
+
+    return forecasting_since, forecasting_till, prices_GPN, prices_WD, demand_paths, demand_WD
+
+
+def _build(model, time, scenarios, seed = 0):
+    """
+    Returns function building MatrixProblem of the model from synthetic inputs (the same steps as in optimization.py).
+    """
+    if model in STOCHASTIC_MODELS:
+        inputs = synthetic_scenarios(time, *scenarios, seed = seed)
+
+        def build():
+            arrays = matrix_models.stochastic_arrays(*inputs)
+            if model == 'stochastic':
+                return matrix_models.stochastic_problem(STORAGE_BID, STOCHASTIC_PARAMETERS, *arrays)
+            return matrix_models.additional_flexibility_stochastic_problem(ST_MAX, STORAGE_BID, FLEXIBILITY_PARAMETERS, *arrays)
+    else:
+        inputs = synthetic_inputs(time, seed)
+
+        def build():
+            prices, demand = matrix_models.horizon_arrays(*inputs)
+            if model == 'deterministic':
+                return matrix_models.deterministic_problem(STORAGE_BID, DETERMINISTIC_PARAMETERS, prices, demand)
+            elif model == 'additional_flexibility_full':
+                return matrix_models.additional_flexibility_full_problem(STORAGE_BID, FULL_PARAMETERS, LIMIT_TRADING, prices, demand)
+            return matrix_models.additional_flexibility_problem(ST_MAX, STORAGE_BID, FLEXIBILITY_PARAMETERS, LIMIT_TRADING, prices, demand)
+
+    return build
+
+
+def _phases(build, backend):
+    """
+    Runs build, solve and extraction once. Returns time of every phase (seconds), the problem and objective value.
+    """
+    start = timer.perf_counter()
+    problem = build()
+    built = timer.perf_counter()
+    result_optimization, values = backends.solve(problem, backend)
+    solved = timer.perf_counter()
+    OptimizationResult.from_problem(result_optimization, values, problem).to_frame()
+    extracted = timer.perf_counter()
+
+    return {'build': built - start, 'solve': solved - built, 'extract': extracted - solved}, problem, result_optimization
+
+
+def _entry_point(model, time, scenarios, backend, seed = 0):
+    """
+    Returns function calling the public function of the model in optimization.py (what the users call) with synthetic inputs.
+    """
+    if model in STOCHASTIC_MODELS:
+        inputs = synthetic_scenarios(time, *scenarios, seed = seed)
+        if model == 'stochastic':
+            return lambda: optimization.stochastic(inputs[0], inputs[1], STORAGE_BID, STOCHASTIC_PARAMETERS, *inputs[2:],
+                                                   output_flag = False, backend = backend)
+        return lambda: optimization.additional_flexibility_stochastic(inputs[0], inputs[1], ST_MAX, STORAGE_BID, FLEXIBILITY_PARAMETERS,
+                                                                      *inputs[2:], output_flag = False, backend = backend)
+
+    forecasting_since, forecasting_till, prices, demand = synthetic_inputs(time, seed)
+    if model == 'deterministic':
+        return lambda: optimization.deterministic(forecasting_since, forecasting_till, STORAGE_BID, DETERMINISTIC_PARAMETERS,
+                                                  prices, demand, backend = backend)
+    elif model == 'additional_flexibility_full':
+        return lambda: optimization.additional_flexibility_full(forecasting_since, forecasting_till, STORAGE_BID, FULL_PARAMETERS,
+                                                                LIMIT_TRADING, prices, demand, backend = backend)
+    return lambda: optimization.additional_flexibility(forecasting_since, forecasting_till, ST_MAX, STORAGE_BID, FLEXIBILITY_PARAMETERS,
+                                                       LIMIT_TRADING, prices, demand, backend = backend)
+
+
+def max_rss():
+    """
+    Maximal resident memory of the process so far (bytes), None where the resource module is missing (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def git_commit():
+    """
+    Returns hash of the current git commit (None outside of a git repository).
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(horizons = (30, 90, 365), scenarios = ((2, 2, 2, 2), (3, 3, 3, 3)), models = MODELS, backend = None,
+              repeats = 3, output = None, seed = 0):
+    """
+    This function will benchmark every model for every horizon length (in days) and, for the stochastic models,
+    every number of scenarios (paths_GPN, paths_WD, paths_demand, samples_WD).
+    Reported per case (seconds - best of repeats):
+    - build - creating MatrixProblem from the inputs, solve - solving it, extract - Names/Values table of the results,
+    - total - the public function of optimization.py (e.g. optimization.deterministic), from the inputs to the results,
+    - peak_memory - peak of Python (incl. NumPy) allocations during all the phases (tracemalloc, bytes, separate run),
+    - max_rss - maximal resident memory of the process so far (bytes, includes the solver).
+    backend defaults to backends.default_backend() - Gurobi if licensed, HiGHS otherwise.
+    If output is given, every record is appended to it as a JSON line, with the git commit, date and versions.
+
+    Returns table of the records.
+    """
+    backend = backend or backends.default_backend()
+    environment = {'commit': git_commit(), 'date': datetime.datetime.now().isoformat(timespec = 'seconds'),
+                   'backend': backend, 'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine()}
+
+    records = []
+    for model in models:
+        for time in horizons:
+            for scenario in (scenarios if model in STOCHASTIC_MODELS else [None]):
+                build = _build(model, time, scenario, seed)
+
+                timings = []
+                entry_point = _entry_point(model, time, scenario, backend, seed)
+                for _ in range(repeats):
+                    phases, problem, result_optimization = _phases(build, backend)
+                    start = timer.perf_counter()
+                    entry_point()
+                    phases['total'] = timer.perf_counter() - start
+                    timings.append(phases)
+
+                tracemalloc.start()
+                _phases(build, backend)
+                _, peak_memory = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                record = dict(environment, model = model, horizon = time, scenarios = list(scenario) if scenario else None,
+                              variables = problem.num_vars, constraints = problem.num_constrs, nonzeros = int(problem.A.nnz),
+                              objective = float(result_optimization), peak_memory = peak_memory,
+                              max_rss = max_rss())
+                record.update({phase: min(t[phase] for t in timings) for phase in PHASES})
+                records.append(record)
+
+                if output is not None:
+                    os.makedirs(os.path.dirname(output) or '.', exist_ok = True)
+                    with open(output, 'a') as file:
+                        file.write(json.dumps(record) + '\n')
+
+    return pd.DataFrame(records)
+
+
+def compare_commits(path, baseline, commit = None, threshold = 1.2):
+    """
+    Compares the records of two commits (commit defaults to the last one) in the JSON lines file of run_suite.
+    Returns table of the cases with ratio of every phase time (commit / baseline), regression - if any ratio is above threshold.
+    """
+    records = pd.read_json(path, lines = True)
+    records['scenarios'] = records['scenarios'].map(lambda scenario: str(scenario) if isinstance(scenario, list) else '-')
+    records['commit'] = records['commit'].astype(str)
+    commit = commit or records['commit'].iloc[-1]
+    keys = ['model', 'horizon', 'scenarios', 'backend']
+    phases = [phase for phase in PHASES if phase in records.columns]
+
+    def last(c):
+        return records[records['commit'].str.startswith(c)].groupby(keys)[phases + ['peak_memory']].last()
+
+    compared = last(commit) / last(baseline)
+    compared['regression'] = (compared[phases] > threshold).any(axis = 1)
+
+    return compared.reset_index()
+
+
+def legacy_deterministic_model(forecasting_since, forecasting_till, storage_bid, storage_parameters, prices, demand, output_flag = False):
+    """
+    Builds the model of optimization.deterministic variable by variable in gurobipy (the first version of the model,
+    before matrix_models.py), as the reference of build_time. Returns the gurobipy model (not optimized).
+    """
+    import gurobipy as gp
+
+    # Parameters of auction for storage
+    storage_available, default_in_rate, default_out_rate, price_injection, limit_buying, limit_selling = storage_parameters
+    
+    ### Defining parameters to be calculated
+
+    # time - number of days of the forecast
+    # Has to be adjusted in case of public holiday flow
+    time = (pd.to_datetime(forecasting_till) - pd.to_datetime(forecasting_since)).days - demand[~demand.index.isin(prices.index)].shape[0] + 1
+    demand = demand[demand.index.isin(prices.index)]
+
+    # Creating a model which is MIP - mixed-integer programming model
+    m = gp.Model("mip1")
+    m.setParam( 'OutputFlag', output_flag )
+
+    #-----------------------------------------#
+
+    ### Setting variables
+
+    # Production level in spot market
+    g_spot = m.addVars(time, vtype = gp.GRB.CONTINUOUS, name = 'g_spot', lb = -limit_selling, ub = limit_buying)
+
+    # Storage capacity
+    st_max = m.addVar(vtype = gp.GRB.CONTINUOUS, name = 'st_max', lb = 0, ub = storage_available)
+
+    # Storage level
+    st = m.addVars(time, vtype = gp.GRB.CONTINUOUS, name = "st", lb = 0)
+
+    # Storage injection level
+    st_in = m.addVars(time, vtype = gp.GRB.CONTINUOUS, name = 'st_in', lb = 0)
+
+    # Storage withdrawal level
+    st_out = m.addVars(time, vtype = gp.GRB.CONTINUOUS, name = 'st_out', lb = 0)
+
+    # If payment via injection or whole storage
+    u_st = m.addVar(vtype = gp.GRB.BINARY, name = 'u_st')
+
+
+    #-----------------------------------------#
+
+    ### Objective function
+
+    # Defining cost of storage
+    cost_storage = storage_bid * st_max + (u_st * st_in.sum() + (1 - u_st) * st_max) * price_injection 
+
+    # Defining cost of trading on spot market
+    cost_trading = sum(g_spot[t] * prices.iloc[t] for t in range(time))
+
+    m.setObjective(cost_storage + cost_trading, gp.GRB.MINIMIZE)
+
+    #-----------------------------------------#
+
+    ### Setting constraints
+
+    # Demand and supply balance of Day-Ahead market
+    m.addConstrs(g_spot[t] - st_in[t] + st_out[t] == demand.iloc[t] for t in range(time))
+
+    # Max capacity of the storage
+    m.addConstrs(st[t] <= st_max for t in range(time))
+
+    # Max injection and withdrawal
+    m.addConstrs(st_in[t] <= 1/default_in_rate * st_max for t in range(time)) # 
+    m.addConstrs(st_out[t] <= 1/default_out_rate * st_max for t in range(time))
+
+
+    # Flow in the storage
+    m.addConstr(st[0] == 0)
+    m.addConstrs(st[t-1] + st_in[t-1] - st_out[t-1] == st[t] for t in range(1,time))
+    m.addConstr(st[time-1] == 0)
+
+    #-----------------------------------------#
+
+    m.update()
+    return m
+
+
+def build_time(horizons = (30, 90, 365, 730, 1460), repeats = 3, storage_bid = 1.0,
+               storage_parameters = (100, 10, 10, 0.5, 200, 200), legacy = True):
+    """
+    Measures time of building deterministic model for every horizon length (in days).
+    Reported columns (seconds, best of repeats):
+    - matrix_arrays - creating MatrixProblem with NumPy/SciPy,
+    - matrix_gurobi - passing MatrixProblem to Gurobi with the matrix API,
+    - matrix_solve - solving the model,
+    - legacy_build - legacy_deterministic_model, which builds the model variable by variable in gurobipy (if legacy is True),
+    - legacy_solve - solving that model.
+    matrix_arrays + matrix_gurobi compared with legacy_build is the speed-up of building the model.
+    """
+    results = []
+    for time in horizons:
+        forecasting_since, forecasting_till, prices, demand = synthetic_inputs(time)
+        timings = {'matrix_arrays': [], 'matrix_gurobi': [], 'matrix_solve': [], 'legacy_build': [], 'legacy_solve': []}
+
+        for _ in range(repeats):
+            start = timer.perf_counter()
+            prices_array, demand_array = matrix_models.horizon_arrays(forecasting_since, forecasting_till, prices, demand)
+            problem = matrix_models.deterministic_problem(storage_bid, storage_parameters, prices_array, demand_array)
+            timings['matrix_arrays'].append(timer.perf_counter() - start)
+
+            start = timer.perf_counter()
+            m, x = backends.build_gurobi_model(problem)
+            m.update()
+            timings['matrix_gurobi'].append(timer.perf_counter() - start)
+
+            start = timer.perf_counter()
+            m.optimize()
+            timings['matrix_solve'].append(timer.perf_counter() - start)
+
+            if legacy:
+                start = timer.perf_counter()
+                m = legacy_deterministic_model(forecasting_since, forecasting_till, storage_bid, storage_parameters, prices, demand)
+                timings['legacy_build'].append(timer.perf_counter() - start)
+
+                start = timer.perf_counter()
+                m.optimize()
+                timings['legacy_solve'].append(timer.perf_counter() - start)
+
+        row = {'horizon': time, 'variables': problem.num_vars, 'constraints': problem.num_constrs}
+        row.update({name: min(values) if values else np.nan for name, values in timings.items()})
+        results.append(row)
+
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmarks of the optimization module")
+    parser.add_argument('--build-time', action = 'store_true', help = "compare model construction of optimization.py and matrix_models.py (requires Gurobi)")
+    parser.add_argument('--horizons', type = int, nargs = '+', default = [30, 90, 365])
+    parser.add_argument('--scenarios', type = int, nargs = 4, action = 'append', metavar = ('GPN', 'WD', 'DEMAND', 'SAMPLES'),
+                        help = "numbers of paths of the stochastic models, can be given many times")
+    parser.add_argument('--models', nargs = '+', choices = MODELS, default = list(MODELS))
+    parser.add_argument('--backend', choices = backends.BACKENDS, default = None)
+    parser.add_argument('--repeats', type = int, default = 3)
+    parser.add_argument('--output', default = DEFAULT_OUTPUT, help = "JSON lines file, the records are appended")
+    parser.add_argument('--compare', metavar = 'BASELINE', help = "compare the last commit in --output with the BASELINE commit instead of running")
+    args = parser.parse_args()
+
+    if args.build_time:
+        print(build_time(args.horizons).to_string(index = False))
+    elif args.compare:
+        print(compare_commits(args.output, args.compare).to_string(index = False))
+    else:
+        results = run_suite(args.horizons, [tuple(s) for s in args.scenarios] if args.scenarios else ((2, 2, 2, 2), (3, 3, 3, 3)),
+                            args.models, args.backend, args.repeats, args.output)
+        print(results[['model', 'horizon', 'scenarios', 'variables', 'build', 'solve', 'extract', 'total', 'peak_memory']].to_string(index = False))
@@ -0,0 +1,199 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+
+from src.analysis import backends
+from src.analysis import matrix_models
+from src.analysis.results import OptimizationResult, format_result
+from src.analysis.scenario_tree import ScenarioTree
+
+# L-shaped (Benders) decomposition of the three-stage models stochastic and additional_flexibility_stochastic.
+# The first stage decisions (u_st and st_max, or u_st and the additional flexibility) are coordinated by a small
+# master problem, while every Day-ahead scenario together with its Within-day scenarios is solved as a separate LP
+# in a process pool. Objective of the extensive form is the expected value of the objectives of these subproblems (each
+# of them contains the first stage costs too), so multi-cut master is:
+#     minimize sum(probability_DA[a] * theta_a) subject to theta_a >= objective_a(x_k) + subgradient_a(x_k) * (x - x_k) for all iterations k.
+# u_st is the only binary, so both of its values are decomposed separately and the better one is chosen.
+# Trading in the spot markets is unbounded, so every subproblem is feasible and no feasibility cuts are needed.
+
+# Data of the worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(builder, parameters, arrays, tree, backend):
+    _worker.clear()
+    _worker.update(builder = builder, parameters = parameters, arrays = arrays, tree = tree, backend = backend, subproblems = {})
+
+
+def _subproblem(a):
+    """
+    Model of DA scenario a with all its WD scenarios.
+    """
+    if a not in _worker['subproblems']:
+        _worker['subproblems'][a] = _worker['builder'](*_worker['parameters'], *_worker['arrays'], tree = _worker['tree'].subtree(a))
+    return _worker['subproblems'][a]
+
+
+def _evaluate(scenarios, first_stage, u_st, values, solutions = False):
+    """
+    Solves subproblems of DA scenarios with u_st and first stage variables fixed to values.
+    Returns objective values, subgradients with respect to the first stage variables and (optionally) solutions.
+    """
+    objectives, subgradients, results = [], [], []
+    for a in scenarios:
+        problem = _subproblem(a)
+        fixed = backends.fix_binaries(problem, problem.family('u_st').ravel(), [u_st])
+        fixed.lb[first_stage] = fixed.ub[first_stage] = values
+        objective, x, reduced_costs = backends.solve_lp(fixed, _worker['backend'])
+        objectives.append(objective)
+        subgradients.append(reduced_costs[first_stage])
+        if solutions:
+            results.append(x)
+
+    return np.array(objectives), np.array(subgradients), results
+
+
+def _master(cuts_x, cuts_objectives, cuts_subgradients, probability, lb, ub):
+    """
+    Solves multi-cut master problem with variables (first stage, theta of every scenario).
+    """
+    iterations, scenarios = cuts_objectives.shape
+    n = lb.shape[0]
+
+    # subgradient * x - theta_a <= subgradient * x_k - objective_a(x_k)
+    A_x = cuts_subgradients.reshape(iterations * scenarios, n)
+    A_theta = -sp.vstack([sp.identity(scenarios)] * iterations)
+    A = sp.hstack([sp.csr_matrix(A_x), A_theta]).tocsr()
+    b = np.einsum('ksn,kn->ks', cuts_subgradients, cuts_x).ravel() - cuts_objectives.ravel()
+
+    c = np.concatenate([np.zeros(n), probability])
+    bounds = [(l, u) for l, u in zip(lb, ub)] + [(None, None)] * scenarios
+    result = linprog(c, A_ub = A, b_ub = b, bounds = bounds, method = 'highs')
+    if result.status != 0:
+        raise RuntimeError("Master problem was not solved: %s" % result.message)
+
+    return result.fun, result.x[:n]
+
+
+def _full_solution(template, tree, u_st, solutions):
+    """
+    Places solutions of the subproblems in the variables of the extensive form, in the same order and with the same names.
+    """
+    families = {}
+    start = 0
+    for name, (_, shape) in template.families.items():
+        if name.endswith('_DA'):
+            shape = (shape[0], tree.scenarios_DA)
+        elif name.endswith('_WD'):
+            shape = (shape[0], tree.scenarios_WD)
+        families[name] = (start, shape)
+        start += int(np.prod(shape, dtype = int))
+
+    values = np.zeros(start)
+    for name, (start, shape) in families.items():
+        index = template.family(name)
+        if shape == ():
+            values[start] = u_st if name == 'u_st' else solutions[0][index]
+            continue
+
+        block = np.zeros(shape)
+        for a, solution in enumerate(solutions):
+            columns = [a] if name.endswith('_DA') else tree.children(a)
+            block[:, columns] = solution[index]
+        values[start:start + block.size] = block.ravel()
+
+    return values, families
+
+
+def _benders(builder, parameters, arrays, tree, first_stage_names, output_flag, backend, processes, tolerance, max_iterations, result_format):
+    if tree is None:
+        tree = ScenarioTree.product(arrays[0].shape[0], arrays[1].shape[0], arrays[2].shape[0], arrays[3].shape[2])
+    scenarios = tree.scenarios_DA
+
+    _init_worker(builder, parameters, arrays, tree, backend)
+    template = _subproblem(0)
+    first_stage = np.concatenate([template.family(name).ravel() for name in first_stage_names])
+    lb, ub = template.lb[first_stage], template.ub[first_stage]
+
+    processes = min(processes or os.cpu_count(), scenarios)
+    chunks = [chunk for chunk in np.array_split(np.arange(scenarios), processes) if chunk.shape[0] > 0]
+    executor = None
+    if len(chunks) > 1:
+        executor = ProcessPoolExecutor(max_workers = len(chunks), initializer = _init_worker, initargs = (builder, parameters, arrays, tree, backend))
+
+    def evaluate(u_st, values, solutions = False):
+        if executor is None:
+            results = [_evaluate(chunks[0], first_stage, u_st, values, solutions)]
+        else:
+            results = list(executor.map(_evaluate, chunks, repeat(first_stage), repeat(u_st), repeat(values), repeat(solutions)))
+        return (np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results]),
+                [x for r in results for x in r[2]])
+
+    try:
+        best = None
+        for u_st in (0.0, 1.0):
+            cuts_x, cuts_objectives, cuts_subgradients = [], [], []
+            x_k = ub.copy()
+            upper_bound, x_best = np.inf, x_k
+            for iteration in range(max_iterations):
+                objectives, subgradients, _ = evaluate(u_st, x_k)
+                expected = np.dot(tree.probability_DA, objectives)
+                if expected < upper_bound:
+                    upper_bound, x_best = expected, x_k
+
+                cuts_x.append(x_k)
+                cuts_objectives.append(objectives)
+                cuts_subgradients.append(subgradients)
+                lower_bound, x_k = _master(np.array(cuts_x), np.array(cuts_objectives), np.array(cuts_subgradients), tree.probability_DA, lb, ub)
+
+                if output_flag:
+                    print("u_st = %d, iteration %d: lower bound %f, upper bound %f" % (u_st, iteration, lower_bound, upper_bound))
+                if upper_bound - lower_bound <= tolerance * max(1, abs(upper_bound)):
+                    break
+
+            if best is None or upper_bound < best[0]:
+                best = (upper_bound, u_st, x_best)
+
+        result_optimization, u_st, x_best = best
+        _, _, solutions = evaluate(u_st, x_best, solutions = True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    values, families = _full_solution(template, tree, u_st, solutions)
+    result_variables = format_result(OptimizationResult(result_optimization, values, families), result_format)
+
+    return result_optimization, result_variables
+
+
+def stochastic(forecasting_since, forecasting_till, storage_bid, storage_parameters, prices_GPN, prices_WD, demand, demand_WD,
+               output_flag = False, backend = 'highs', processes = None, tolerance = 1e-6, max_iterations = 100, tree = None,
+               result_format = 'frame'):
+    """
+    Solves the model of optimization.stochastic with L-shaped decomposition on u_st and st_max.
+    Subproblems (one per DA scenario) are solved with given backend in processes worker processes (default - number of CPUs).
+    Iterations stop when the gap between the bounds is below tolerance (relative), output_flag prints them.
+    tree defines scenarios and their probabilities (ScenarioTree), default - all combinations of the paths with equal probabilities.
+    Returns the same (result_optimization, result_variables) pair as optimization.stochastic (result_format as in backends.optimize).
+    """
+    arrays = matrix_models.stochastic_arrays(forecasting_since, forecasting_till, prices_GPN, prices_WD, demand, demand_WD)
+
+    return _benders(matrix_models.stochastic_problem, (storage_bid, tuple(storage_parameters)), arrays, tree, ['st_max'],
+                    output_flag, backend, processes, tolerance, max_iterations, result_format)
+
+
+def additional_flexibility_stochastic(forecasting_since, forecasting_till, st_max, storage_bid, storage_parameters, prices_GPN, prices_WD, demand, demand_WD,
+                                      output_flag = False, backend = 'highs', processes = None, tolerance = 1e-6, max_iterations = 100, tree = None,
+                                      result_format = 'frame'):
+    """
+    Solves the model of optimization.additional_flexibility_stochastic with L-shaped decomposition on u_st,
+    st_in_additional and st_out_additional. The other parameters are the same as in stochastic.
+    """
+    arrays = matrix_models.stochastic_arrays(forecasting_since, forecasting_till, prices_GPN, prices_WD, demand, demand_WD)
+
+    return _benders(matrix_models.additional_flexibility_stochastic_problem, (st_max, storage_bid, tuple(storage_parameters)), arrays, tree,
+                    ['st_in_additional', 'st_out_additional'], output_flag, backend, processes, tolerance, max_iterations, result_format)
@@ -0,0 +1,229 @@
+import bisect
+import time as timer
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import backends
+from src.analysis import matrix_models
+
+# Dispatch of one storage with fixed capacity (st_max) and payment mode (u_st), without a solver.
+# With st_max and u_st fixed the models of deterministic and additional_flexibility are LPs with one storage level
+# chained over time. Only the net flow f[t] = st_in[t] - st_out[t] links the days, with convex piecewise linear cost
+#     h_t(f) = prices[t] * f + injection_cost * st_in(f)    (trading and injection payment, g_spot = demand + f),
+# so they are solved exactly by dynamic programming over the storage level:
+#     V_t(s) = min over f of h_t(f) + V_t+1(s + f),  0 <= s <= st_max,
+# where every V_t is convex piecewise linear and is kept as its slopes - V_t is the infimal convolution of V_t+1
+# and h_t, i.e. sorted merge of their slopes (no discretization of the storage level).
+# As in the models, injection and withdrawal of the last day are not linked to the storage level.
+# Payment mode u_st is chosen by solving both cases.
+
+_EPSILON = 1e-9
+
+
+def _flow_costs(prices, demand, injection_max, withdrawal_max, injection_cost, limit_buying, limit_selling):
+    """
+    Bounds of the net flow of every day and its cost h_t(f) = a * (f - r) + h(r) for f < r, b * (f - r) + h(r) for f > r.
+    """
+    f_min = np.maximum(-withdrawal_max, -limit_selling - demand)
+    f_max = np.minimum(injection_max, limit_buying - demand)
+
+    if injection_cost >= 0:
+        # Injection and withdrawal at the same time only cost more - st_in = max(f, 0)
+        r, a, b = np.zeros_like(prices), prices, prices + injection_cost
+    else:
+        # Both are used as much as possible - st_in = min(injection_max, withdrawal_max + f)
+        r, a, b = np.full_like(prices, injection_max - withdrawal_max), prices + injection_cost, prices
+    r = np.clip(r, f_min, f_max)
+    h_r = prices * r + injection_cost * _injection(r, injection_max, withdrawal_max, injection_cost)
+
+    return f_min, f_max, r, a, b, h_r
+
+
+def _injection(f, injection_max, withdrawal_max, injection_cost):
+    if injection_cost >= 0:
+        return np.maximum(f, 0)
+    return np.minimum(injection_max, withdrawal_max + f)
+
+
+def _value_functions(f_min, f_max, r, a, b, h_r, capacity):
+    """
+    Backward pass. V_t is stored as (left end of its domain, value there, lengths of segments, slopes of segments).
+    Returns list of V_t (t = 0, ..., time - 1), or None if the problem is infeasible.
+    V_t has only a few segments (storage level is bounded), so they are kept in Python lists - for such sizes
+    faster than NumPy calls, which are used only once for all the days.
+    """
+    time = f_min.shape[0]
+    f_min, f_max, r, a, b, h_r = (array.tolist() for array in (f_min, f_max, r, a, b, h_r))
+    functions = [None] * time
+    # The storage is empty at the end
+    left, value, lengths, slopes = 0.0, 0.0, [], []
+    functions[time - 1] = (left, value, (), ())
+
+    for t in range(time - 2, -1, -1):
+        # Infimal convolution with h_t(-z), z in [-f_max, -f_min] - merge of the sorted slopes
+        left -= f_max[t]
+        value += h_r[t] + b[t] * (f_max[t] - r[t])
+        for length, slope in ((f_max[t] - r[t], -b[t]), (r[t] - f_min[t], -a[t])):
+            if length > _EPSILON:
+                position = bisect.bisect_right(slopes, slope)
+                slopes.insert(position, slope)
+                lengths.insert(position, length)
+
+        # Restriction to 0 <= s <= capacity
+        while left < 0 and lengths:
+            cut = min(lengths[0], -left)
+            value += cut * slopes[0]
+            left += cut
+            lengths[0] -= cut
+            if lengths[0] <= _EPSILON:
+                del lengths[0], slopes[0]
+        if left < -_EPSILON or left > capacity + _EPSILON:
+            return None
+        left = max(left, 0.0)
+        excess = left + sum(lengths) - capacity
+        while excess > _EPSILON:
+            cut = min(lengths[-1], excess)
+            excess -= cut
+            lengths[-1] -= cut
+            if lengths[-1] <= _EPSILON:
+                del lengths[-1], slopes[-1]
+
+        functions[t] = (left, value, tuple(lengths), tuple(slopes))
+
+    if functions[0][0] > _EPSILON:
+        return None
+    return functions
+
+
+def _decisions(functions, f_min, f_max, r, a, b, h_r):
+    """
+    Forward pass - net flow of every day, minimizing h_t(f) + V_t+1(s + f) from the empty storage.
+    """
+    time = f_min.shape[0]
+    flow = np.zeros(time)
+    level = np.zeros(time)
+
+    def h(t, f):
+        return h_r[t] + np.where(f < r[t], a[t], b[t]) * (f - r[t])
+
+    s = 0.0
+    for t in range(time - 1):
+        left, value, lengths, slopes = functions[t + 1]
+        positions = left + np.concatenate([[0], np.cumsum(lengths)])
+        values = value + np.concatenate([[0], np.cumsum(np.multiply(lengths, slopes))])
+        low, high = max(s + f_min[t], positions[0]), min(s + f_max[t], positions[-1])
+
+        candidates = np.concatenate([positions[(positions > low) & (positions < high)], [low, high, np.clip(s + r[t], low, high)]])
+        costs = h(t, candidates - s) + np.interp(candidates, positions, values)
+        y = candidates[costs.argmin()]
+
+        level[t] = s
+        flow[t] = y - s
+        s = y
+
+    # The last day is not linked to the storage level
+    candidates = np.array([f_min[-1], f_max[-1], r[-1]])
+    flow[-1] = candidates[h(time - 1, candidates).argmin()]
+    level[-1] = 0.0
+
+    return flow, level
+
+
+def dispatch(prices, demand, capacity, injection_max, withdrawal_max, injection_cost, limit_buying, limit_selling, decisions = True):
+    """
+    This function will find the optimal dispatch of a storage with:
+    - capacity (st_max), maximal injection and withdrawal per day (injection_max, withdrawal_max),
+    - cost per unit of injection (injection_cost - price_injection if u_st = 1, 0 otherwise),
+    - bounds of trading (limit_buying, limit_selling),
+    - one scenario (prices, demand - NumPy arrays of the horizon length).
+
+    Returns cost of trading and injection (inf if infeasible) and, if decisions is True, dictionary with g_spot, st, st_in and st_out.
+    """
+    prices = np.asarray(prices, dtype = float)
+    demand = np.asarray(demand, dtype = float)
+    f_min, f_max, r, a, b, h_r = _flow_costs(prices, demand, injection_max, withdrawal_max, injection_cost, limit_buying, limit_selling)
+
+    functions = None if np.any(f_min > f_max + _EPSILON) else _value_functions(f_min, f_max, r, a, b, h_r, capacity)
+    if functions is None:
+        return np.inf, None
+
+    # Value of the last day, which is not linked to the storage level
+    last = np.array([f_min[-1], f_max[-1], r[-1]])
+    last = np.min(h_r[-1] + np.where(last < r[-1], a[-1], b[-1]) * (last - r[-1]))
+    cost = prices @ demand + functions[0][1] + last
+    if not decisions:
+        return cost, None
+
+    flow, level = _decisions(functions, f_min, f_max, r, a, b, h_r)
+    st_in = _injection(flow, injection_max, withdrawal_max, injection_cost)
+    st_out = st_in - flow
+    return cost, {'g_spot': demand + flow, 'st': level, 'st_in': st_in, 'st_out': st_out}
+
+
+def _both_modes(st_max, fixed_cost, price_injection, injection_max, withdrawal_max, limit_buying, limit_selling, prices, demand, decisions):
+    """
+    Solves both payment modes: u_st = 1 - price_injection paid for every injection, u_st = 0 - for the whole capacity.
+    """
+    best = None
+    for u_st in (0, 1):
+        cost, variables = dispatch(prices, demand, st_max, injection_max, withdrawal_max, u_st * price_injection,
+                                   limit_buying, limit_selling, decisions)
+        cost = cost + fixed_cost + (1 - u_st) * st_max * price_injection
+        if best is None or cost < best[0]:
+            best = (cost, u_st, variables)
+    return best
+
+
+def deterministic(st_max, storage_bid, storage_parameters, prices, demand, decisions = True):
+    """
+    This function will solve the model of optimization.deterministic with fixed st_max.
+    prices and demand are NumPy arrays of the horizon length (see matrix_models.horizon_arrays).
+    Returns objective value, u_st and (if decisions is True) dictionary with g_spot, st, st_in and st_out.
+    """
+    storage_available, default_in_rate, default_out_rate, price_injection, limit_buying, limit_selling = storage_parameters
+    return _both_modes(st_max, storage_bid * st_max, price_injection, st_max / default_in_rate, st_max / default_out_rate,
+                       limit_buying, limit_selling, prices, demand, decisions)
+
+
+def additional_flexibility(st_max, st_in_additional, st_out_additional, storage_bid, storage_parameters, limit_trading, prices, demand, decisions = True):
+    """
+    This function will solve the model of optimization.additional_flexibility with fixed st_in_additional and st_out_additional.
+    The other parameters and results are the same as in deterministic.
+    """
+    storage_in_max, storage_out_max, cost_in_additional, cost_out_additional, storage_in_additional, storage_out_additional, price_injection = storage_parameters
+    price_additional_injecting = (1/storage_in_max) / 24 * cost_in_additional * (st_in_additional - 1)
+    price_additional_withdrawal = (1/storage_out_max) / 24 * cost_out_additional * (st_out_additional - 1)
+    return _both_modes(st_max, (storage_bid + price_additional_injecting + price_additional_withdrawal) * st_max, price_injection,
+                       (1/storage_in_max) * st_max * st_in_additional, (1/storage_out_max) * st_max * st_out_additional,
+                       limit_trading, limit_trading, prices, demand, decisions)
+
+
+def monte_carlo(st_max, storage_bid, storage_parameters, prices, demand):
+    """
+    This function will value the storage with fixed st_max (as in deterministic) in every scenario - row of prices and demand
+    (NumPy arrays (paths, time)). Returns table with objective value and u_st of every path, and time of all the solves (in seconds).
+    """
+    prices = np.atleast_2d(np.asarray(prices, dtype = float))
+    demand = np.broadcast_to(np.asarray(demand, dtype = float), prices.shape)
+
+    start = timer.perf_counter()
+    results = [deterministic(st_max, storage_bid, storage_parameters, prices[i], demand[i], decisions = False)[:2] for i in range(prices.shape[0])]
+    seconds = timer.perf_counter() - start
+
+    return pd.DataFrame(results, columns = ['objective', 'u_st']), seconds
+
+
+def cross_check(forecasting_since, forecasting_till, st_max, storage_bid, storage_parameters, prices, demand, backend = 'gurobi'):
+    """
+    Compares deterministic with the model of optimization.deterministic (with st_max fixed) solved by backend.
+    Returns both objective values and u_st.
+    """
+    prices, demand = matrix_models.horizon_arrays(forecasting_since, forecasting_till, prices, demand)
+    problem = matrix_models.deterministic_problem(storage_bid, storage_parameters, prices, demand)
+    problem.lb[problem.family('st_max')] = problem.ub[problem.family('st_max')] = st_max
+    result_solver, values = backends.solve(problem, backend)
+
+    result_dispatch, u_st, _ = deterministic(st_max, storage_bid, storage_parameters, prices, demand, decisions = False)
+
+    return {'dispatch': float(result_dispatch), 'solver': result_solver, 'u_st_dispatch': u_st, 'u_st_solver': float(values[problem.family('u_st')])}
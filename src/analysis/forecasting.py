@@ -11,13 +11,16 @@ import pickle as pkl
 import operator
 
 from pandas.plotting import autocorrelation_plot
-from statsmodels.tsa.arima_model import ARIMA
+from scipy import stats
 import statsmodels.api as sm
 import itertools
 
+from src.analysis.model_cache import FitCache, fit_cache
+from src.data.store import TimeSeriesStore
+
 # This function was supposed to forecast prices and demand based on SARIMA function.
 # As it presents much worse solutions than Prophet, it wasn't used.
-# Hyperparameters were chosen by previously done grid search method.
+# Hyperparameters were chosen by previously done grid search method (see grid_search.py).
 
 def mean_absolute_percentage_error(y_true, y_pred):
     y_true, y_pred = np.array(y_true), np.array(y_pred)
@@ -30,34 +33,104 @@ def plot_mean_and_CI(mean, lb, ub, color_mean=None, color_shading=None):
     # plot the mean on top
     plt.plot(mean, color_mean)
 
+# Options of the SARIMAX model of the forecasting functions (fit_sarimax), part of the fingerprint of grid_search.py checkpoints
+SARIMAX_OPTIONS = {'trend': None, 'enforce_stationarity': False, 'enforce_invertibility': False}
+
+def fit_sarimax(series, order = (3,1,3), seasonal_order = (2,2,3,7), cache = None, **fit_kwargs):
+    """
+    Fits SARIMAX model used by the forecasting functions (and grid_search.py) to the series.
+    cache - FitCache (or its directory - the same FitCache for every call, see fit_cache) of fitted models,
+    None - always fitted from scratch (see model_cache.py). fit_kwargs are passed to fit, e.g. maxiter.
+    """
+    def fit():
+        model = sm.tsa.statespace.SARIMAX(series,
+                                          order=order,
+                                          seasonal_order=seasonal_order,
+                                          **SARIMAX_OPTIONS)
+        return model.fit(disp=0, **fit_kwargs)
+
+    if cache is None:
+        return fit()
+    if isinstance(cache, str):
+        cache = fit_cache(cache)
+    return cache.get_or_fit(series, order, seasonal_order, fit, fit_kwargs)
+
+class SarimaxForecaster:
+    """
+    SARIMAX forecaster fitted once and used for many forecasts:
+        forecaster = SarimaxForecaster((3,1,3), (2,2,3,7)).fit(gas_data, '2012-01-01', '2012-12-31')
+        forecaster.predict('2013-01-01', '2013-04-01')                 # mean forecast
+        forecaster.intervals('2013-01-01', '2013-04-01', alpha = 0.1)  # the same format as pred.conf_int()
+        forecaster.quantiles('2013-01-01', '2013-04-01', (0.05, 0.5, 0.95))
+    Predictions of a period are computed once and reused by every alpha / quantile level.
+    The object (with the fitted model) can be pickled, e.g. sent to worker processes.
+    cache - FitCache (or its directory) of fitted models (see model_cache.py), fit_kwargs are passed to fit.
+    """
+
+    def __init__(self, order = (3,1,3), seasonal_order = (2,2,3,7), cache = None, **fit_kwargs):
+        self.order = order
+        self.seasonal_order = seasonal_order
+        self.cache = cache
+        self.fit_kwargs = fit_kwargs
+        self.model_fit = None
+        self._predictions = {}
+
+    def fit(self, series, data_since = None, data_till = None):
+        """
+        Fits the model to series from data_since to data_till (None - from the beginning / to the end). Returns self.
+        """
+        since = pd.to_datetime(data_since) if data_since is not None else None
+        till = pd.to_datetime(data_till) if data_till is not None else None
+        self.model_fit = fit_sarimax(series.loc[since:till], self.order, self.seasonal_order, self.cache, **self.fit_kwargs)
+        self._predictions = {}
+        return self
+
+    def _prediction(self, forecasting_since, forecasting_till):
+        if self.model_fit is None:
+            raise ValueError("The forecaster has to be fitted first")
+        key = (pd.to_datetime(forecasting_since), pd.to_datetime(forecasting_till))
+        if key not in self._predictions:
+            self._predictions[key] = self.model_fit.get_prediction(start = key[0], end = key[1], dynamic = False)
+        return self._predictions[key]
+
+    def predict(self, forecasting_since, forecasting_till):
+        return self._prediction(forecasting_since, forecasting_till).predicted_mean
+
+    def intervals(self, forecasting_since, forecasting_till, alpha = 0.05):
+        return self._prediction(forecasting_since, forecasting_till).conf_int(alpha = alpha)
+
+    def quantiles(self, forecasting_since, forecasting_till, levels = (0.05, 0.5, 0.95)):
+        """
+        DataFrame of the forecasted quantiles (one column per level).
+        """
+        prediction = self._prediction(forecasting_since, forecasting_till)
+        mean = np.asarray(prediction.predicted_mean)
+        deviation = np.asarray(prediction.se_mean)
+        return pd.DataFrame({level: mean + stats.norm.ppf(level) * deviation for level in levels},
+                            index = prediction.predicted_mean.index)
+
+    def __getstate__(self):
+        # Prediction results keep references to the whole model - they are computed again after unpickling
+        state = self.__dict__.copy()
+        state['_predictions'] = {}
+        return state
+
 def forecast_prices(gas_data,
                     data_since = '2012-01-01', 
                     data_till = '2012-12-31',
                     forecasting_since = '2013-01-01',
                     forecasting_till = '2013-04-01',
                     ARIMA_order = (3,1,3),
-                    ARIMA_season_order = (2,2,3,7)
+                    ARIMA_season_order = (2,2,3,7),
+                    cache = None
                     ):
     """
-    Here: a bit of comments on what this function does
+    Fits SarimaxForecaster to gas_data from data_since to data_till and returns pred_ci - lower and upper bounds
+    of the forecast from forecasting_since to forecasting_till (95% intervals).
+    cache - FitCache (or its directory) of fitted models, so the same fit is not repeated (see model_cache.py).
     """
-    data_since = pd.to_datetime(data_since)
-    data_till = pd.to_datetime(data_till)
-    forecasting_since = pd.to_datetime(forecasting_since)
-    forecasting_till = pd.to_datetime(forecasting_till)
-
-    series = gas_data.loc[data_since:data_till]
-
-    # fit model
-    model = sm.tsa.statespace.SARIMAX(series,
-                                      order=ARIMA_order,
-                                      seasonal_order=ARIMA_season_order,
-                                      enforce_stationarity=False,
-                                      enforce_invertibility=False)
-    model_fit = model.fit(disp=0)
-    
-    pred = model_fit.get_prediction(start=forecasting_since, end=forecasting_till, dynamic=False)
-    pred_ci = pred.conf_int()    
+    forecaster = SarimaxForecaster(ARIMA_order, ARIMA_season_order, cache).fit(gas_data, data_since, data_till)
+    pred_ci = forecaster.intervals(forecasting_since, forecasting_till)
     return pred_ci
 
 def forecast_demand(gas_data,
@@ -66,24 +139,53 @@ def forecast_demand(gas_data,
                     forecasting_since = '2013-01-01',
                     forecasting_till = '2013-04-01',
                     ARIMA_order = (3,1,3),
-                    ARIMA_season_order = (2,2,3,7)
+                    ARIMA_season_order = (2,2,3,7),
+                    cache = None
                     ):
     """
-    Here: a bit of comments on what this function does
+    The same as forecast_prices (demand is fitted only on the window data_since - data_till too).
+    """
+    return forecast_prices(gas_data, data_since, data_till, forecasting_since, forecasting_till,
+                           ARIMA_order, ARIMA_season_order, cache)
+
+def store_series(store,
+                 source,
+                 document_type,
+                 zone,
+                 data_since = '2015-01-01',
+                 data_till = '2015-12-31',
+                 frequency = 'D',
+                 **filters
+                 ):
+    """
+    Reads series of the time series store (TimeSeriesStore or its directory, see store.py) from data_since to data_till
+    (whole days, UTC) as input of the forecasting functions: mean of every period of frequency (default 'D' - daily values),
+    dates without time zone. filters select one series, e.g. psr_type = 'B16'.
+    """
+    store = TimeSeriesStore(store) if isinstance(store, str) else store
+    start = pd.to_datetime(data_since).normalize()
+    end = pd.to_datetime(data_till).normalize() + pd.Timedelta(days = 1)
+    series = store.series(source, document_type, zone, start, end, **filters).astype(float)
+    series.index = series.index.tz_convert('UTC').tz_localize(None)
+    return series.resample(frequency).mean()
+
+def forecast_store(store,
+                   source,
+                   document_type,
+                   zone,
+                   data_since = '2015-01-01',
+                   data_till = '2015-12-31',
+                   forecasting_since = '2016-01-01',
+                   forecasting_till = '2016-03-31',
+                   ARIMA_order = (3,1,3),
+                   ARIMA_season_order = (2,2,3,7),
+                   frequency = 'D',
+                   cache = None,
+                   **filters
+                   ):
+    """
+    forecast_prices of the series of the store (see store_series), e.g. daily load of ENTSO-E downloaded by entsoe_sync.py:
+        forecast_store('data/store', 'entsoe', 'A65', '10YPL-AREA-----S', process_type = 'A16')
     """
-    data_since = pd.to_datetime(data_since)
-    data_till = pd.to_datetime(data_till)
-    forecasting_since = pd.to_datetime(forecasting_since)
-    forecasting_till = pd.to_datetime(forecasting_till)
-
-    # fit model
-    model = sm.tsa.statespace.SARIMAX(gas_data,
-                                      order=ARIMA_order,
-                                      seasonal_order=ARIMA_season_order,
-                                      enforce_stationarity=False,
-                                      enforce_invertibility=False)
-    model_fit = model.fit(disp=0)
-    
-    pred = model_fit.get_prediction(start=forecasting_since, end=forecasting_till, dynamic=False)
-    pred_ci = pred.conf_int()    
-    return pred_ci
\ No newline at end of file
+    series = store_series(store, source, document_type, zone, data_since, data_till, frequency, **filters)
+    return forecast_prices(series, data_since, data_till, forecasting_since, forecasting_till, ARIMA_order, ARIMA_season_order, cache)
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Fourier regression forecaster - a light alternative of forecast_prices / forecast_demand for hourly series
+# (e.g. generation and load of api_entsoe.py), where SARIMAX with seasons of 24 and 168 is very slow.
+# The series is a linear regression on trend, Fourier terms of daily, weekly and yearly seasonality and a holiday dummy,
+# with AR(ar_order) errors. Both are fitted with least squares (numpy.linalg.lstsq), so a year of hourly data
+# takes milliseconds. The AR errors are the short-memory replacement of the ARMA errors of SARIMAX.
+# Lags are lags in time: the series is put on the regular grid of its step first, so a missing date (a gap in the data)
+# is a missing value and lags over it are skipped in the fit of the AR errors.
+# Prediction intervals are Gaussian, from the variance of the AR forecast (without uncertainty of the parameters),
+# in the same format as pred.conf_int() of forecasting.py.
+
+# Seasonal periods in hours
+PERIODS = {'daily': 24, 'weekly': 168, 'yearly': 8766}
+
+# Origin of the time of the Fourier terms, the same for the fit and the forecast
+_ORIGIN = pd.Timestamp('2000-01-01')
+
+
+def _step(index):
+    """
+    Time between observations of the series (median difference of index).
+    """
+    if len(index) < 2:
+        raise ValueError("At least two observations are needed")
+    return pd.Timedelta(np.median(np.diff(index.to_numpy()).astype('timedelta64[ns]').astype(np.int64)))
+
+
+def _design(index, harmonics, holidays, start, scale):
+    """
+    Regressors of the dates in index: intercept, trend, sine and cosine of every harmonic of every period
+    and the holiday dummy (if holidays are given).
+    """
+    hours = (index - _ORIGIN) / pd.Timedelta(hours = 1)
+    columns = [np.ones(len(index)), (hours - start) / scale]
+    for period, k in harmonics:
+        angle = 2 * np.pi * np.outer(hours, np.arange(1, k + 1)) / period
+        columns.extend(np.sin(angle).T)
+        columns.extend(np.cos(angle).T)
+    if holidays is not None:
+        columns.append(index.normalize().isin(holidays).astype(float))
+    return np.column_stack(columns)
+
+
+def fit_fourier(series,
+                daily = 10,
+                weekly = 5,
+                yearly = 3,
+                ar_order = 2,
+                holidays = None
+                ):
+    """
+    This function will fit the Fourier regression to the series (pd.Series with dates as index, missing values allowed):
+    - daily, weekly, yearly - numbers of harmonics of every seasonality (0 - none); seasonalities with period not longer
+      than two steps of the series are skipped (e.g. daily of the daily data),
+    - ar_order - order of the AR errors (0 - independent errors),
+    - holidays - dates of the public holidays (one dummy of all their hours), None - no holiday dummy.
+    Returns dictionary of the fitted model, used by predict_fourier.
+    """
+    series = series.astype(float)
+    step = _step(series.index)
+    # Missing dates of the regular grid are added as missing values (observations off the grid are kept)
+    grid = pd.date_range(series.index[0], series.index[-1], freq = step)
+    series = series.reindex(series.index.union(grid))
+    step_hours = step / pd.Timedelta(hours = 1)
+    harmonics = [(PERIODS[name], k) for name, k in (('daily', daily), ('weekly', weekly), ('yearly', yearly))
+                 if k > 0 and PERIODS[name] > 2 * step_hours]
+    harmonics = [(period, min(k, int((period / step_hours - 1) // 2))) for period, k in harmonics]
+    if holidays is not None:
+        holidays = pd.DatetimeIndex(pd.to_datetime(list(holidays))).normalize()
+
+    hours = (series.index - _ORIGIN) / pd.Timedelta(hours = 1)
+    start, scale = hours[0], max(hours[-1] - hours[0], 1.0)
+    X = _design(series.index, harmonics, holidays, start, scale)
+    y = series.to_numpy()
+    observed = np.isfinite(y)
+    if holidays is not None and not X[observed, -1].any():
+        # No holiday in the data - the dummy cannot be estimated
+        holidays = None
+        X = X[:, :-1]
+    coefficients = np.linalg.lstsq(X[observed], y[observed], rcond = None)[0]
+
+    # AR errors, fitted on residuals of the regression on the grid (lags with missing values are skipped)
+    residuals = y - X @ coefficients
+    phi = np.zeros(ar_order)
+    if ar_order > 0:
+        lags = np.column_stack([residuals[ar_order - i - 1:len(y) - i - 1] for i in range(ar_order)])
+        target = residuals[ar_order:]
+        rows = np.isfinite(target) & np.all(np.isfinite(lags), axis = 1)
+        if rows.sum() > ar_order:
+            phi = np.linalg.lstsq(lags[rows], target[rows], rcond = None)[0]
+        innovations = target - np.nan_to_num(lags) @ phi
+        innovations = innovations[rows]
+    else:
+        innovations = residuals[observed]
+    sigma = np.sqrt(np.mean(innovations ** 2)) if innovations.shape[0] else np.nan
+
+    return {'coefficients': coefficients, 'phi': phi, 'sigma': sigma, 'residuals': residuals, 'index': series.index,
+            'step': step, 'harmonics': harmonics, 'holidays': holidays, 'start': start, 'scale': scale,
+            'name': series.name if series.name is not None else 'y'}
+
+
+def predict_fourier(model, forecasting_since, forecasting_till, alpha = 0.05):
+    """
+    Prediction of the fitted model (fit_fourier) from forecasting_since to forecasting_till: one-step-ahead predictions
+    for dates of the data and forecasts (with all the steps after the data) for later dates.
+    Returns DataFrame of the lower and upper bounds of the prediction intervals (format of pred.conf_int()).
+    """
+    forecasting_since = pd.to_datetime(forecasting_since)
+    forecasting_till = pd.to_datetime(forecasting_till)
+    index, step, phi = model['index'], model['step'], model['phi']
+    p = phi.shape[0]
+
+    # Residuals of the data, then AR forecast of the residuals of all the steps after the data
+    last = index[-1]
+    future = pd.date_range(last + step, max(forecasting_till, last), freq = step)
+    errors = np.nan_to_num(model['residuals'])
+    history = np.concatenate([np.zeros(p), errors, np.zeros(len(future))])
+    psi = np.zeros(len(future))
+    for h in range(len(future)):
+        t = p + len(index) + h
+        history[t] = history[t - p:t][::-1] @ phi if p else 0.0
+        # psi weights of the AR process, variance of the h-step forecast is sigma^2 sum(psi^2)
+        psi[h] = 1.0 if h == 0 else sum(phi[i] * psi[h - 1 - i] for i in range(min(p, h)))
+    forecast_errors = history[p + len(index):]
+    variance = model['sigma'] ** 2 * np.cumsum(psi ** 2)
+
+    # One-step-ahead predictions of the errors inside the data
+    inside_errors = np.zeros(len(index))
+    for i in range(p):
+        inside_errors += phi[i] * history[p - 1 - i:p - 1 - i + len(index)]
+
+    dates = index.append(future)
+    mean = _design(dates, model['harmonics'], model['holidays'], model['start'], model['scale']) @ model['coefficients']
+    mean = mean + np.concatenate([inside_errors, forecast_errors])
+    deviation = np.sqrt(np.concatenate([np.full(len(index), model['sigma'] ** 2), variance]))
+
+    selected = (dates >= forecasting_since) & (dates <= forecasting_till)
+    z = stats.norm.ppf(1 - alpha / 2)
+    name = model['name']
+    return pd.DataFrame({'lower %s' % name: mean[selected] - z * deviation[selected],
+                         'upper %s' % name: mean[selected] + z * deviation[selected]}, index = dates[selected])
+
+
+def forecast_fourier(data,
+                     data_since = '2015-01-01',
+                     data_till = '2015-12-31 23:00',
+                     forecasting_since = '2016-01-01',
+                     forecasting_till = '2016-01-07 23:00',
+                     daily = 10,
+                     weekly = 5,
+                     yearly = 3,
+                     ar_order = 2,
+                     holidays = None,
+                     alpha = 0.05
+                     ):
+    """
+    This function will forecast the series (data, e.g. hourly load of api_entsoe.py) with the Fourier regression
+    fitted from data_since to data_till (see fit_fourier for the other parameters).
+    Returns pred_ci - DataFrame of the lower and upper bounds of the prediction intervals, as forecast_prices.
+    """
+    series = data.loc[pd.to_datetime(data_since):pd.to_datetime(data_till)]
+    model = fit_fourier(series, daily, weekly, yearly, ar_order, holidays)
+    return predict_fourier(model, forecasting_since, forecasting_till, alpha)
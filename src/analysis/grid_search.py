@@ -0,0 +1,168 @@
+import hashlib
+import itertools
+import json
+import os
+import time as timer
+import warnings
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import forecasting
+
+# Grid search of SARIMAX orders for forecast_prices / forecast_demand.
+# Candidates (order, seasonal_order) are fitted in a process pool in two stages:
+# - screening - short fit (screening_maxiter iterations) of every candidate; candidates which fail and candidates with
+#   AIC worse than the best one by more than aic_margin are stopped there,
+# - full fit of the rest, the most promising first; pending candidates are cancelled as soon as a full fit shows
+#   they are more than aic_margin worse.
+# Every finished fit is appended to the checkpoint file (JSON lines), so an interrupted search resumes where it stopped.
+# Records of the checkpoint are valid only for the same data and the same fits (fingerprint of the training and
+# validation series, numbers of iterations and options of the model).
+
+
+def _fingerprint(series, validation, options):
+    digest = hashlib.sha256()
+    for s in (series, validation):
+        if s is not None:
+            digest.update(pd.util.hash_pandas_object(s).to_numpy().tobytes())
+    digest.update(json.dumps({k: repr(v) for k, v in sorted(options.items())}).encode())
+    return digest.hexdigest()[:16]
+
+
+def _fit_candidate(series, validation, order, seasonal_order, maxiter):
+    """
+    Fits one candidate. Returns AIC, BIC, convergence, MAPE on validation (if given), time of fitting (in seconds)
+    and error message of a failed fit.
+    """
+    start = timer.perf_counter()
+    record = {'aic': np.nan, 'bic': np.nan, 'converged': False, 'mape': np.nan, 'error': None}
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model_fit = forecasting.fit_sarimax(series, order, seasonal_order, maxiter = maxiter)
+            record.update(aic = float(model_fit.aic), bic = float(model_fit.bic),
+                          converged = bool(model_fit.mle_retvals.get('converged', True)))
+            if validation is not None:
+                pred = model_fit.get_prediction(start = validation.index[0], end = validation.index[-1], dynamic = False)
+                record['mape'] = float(forecasting.mean_absolute_percentage_error(validation, pred.predicted_mean))
+    except Exception as error: # every failure of a candidate only stops this candidate
+        record['error'] = '%s: %s' % (type(error).__name__, error)
+    record['seconds'] = timer.perf_counter() - start
+
+    return record
+
+
+def _read_checkpoint(checkpoint, fingerprint):
+    done = {}
+    if checkpoint is not None and os.path.exists(checkpoint):
+        with open(checkpoint) as file:
+            for line in file:
+                record = json.loads(line)
+                if record['fingerprint'] == fingerprint:
+                    done[(record['stage'], tuple(record['order']), tuple(record['seasonal_order']))] = record
+    return done
+
+
+def _run_stage(stage, candidates, series, validation, maxiter, executor, done, checkpoint, fingerprint, stop = None):
+    """
+    Fits candidates (in the given order), skipping the ones in done. stop(record, pending) returns candidates,
+    which should not be fitted any more after record was finished. Returns records of all the candidates fitted in this stage.
+    """
+    results = {candidate: done[(stage,) + candidate] for candidate in candidates if (stage,) + candidate in done}
+    futures = {executor.submit(_fit_candidate, series, validation, order, seasonal_order, maxiter): (order, seasonal_order)
+               for order, seasonal_order in candidates if (order, seasonal_order) not in results}
+
+    while futures:
+        finished, _ = wait(futures, return_when = FIRST_COMPLETED)
+        for future in finished:
+            candidate = futures.pop(future)
+            record = dict(future.result(), stage = stage, order = list(candidate[0]), seasonal_order = list(candidate[1]), fingerprint = fingerprint)
+            results[candidate] = record
+            if checkpoint is not None:
+                with open(checkpoint, 'a') as file:
+                    file.write(json.dumps(record) + '\n')
+
+        if stop is not None:
+            cancelled = stop(results, [futures[future] for future in futures])
+            for future in [future for future, candidate in futures.items() if candidate in cancelled]:
+                if future.cancel():
+                    del futures[future]
+
+    return results
+
+
+def grid_search(gas_data,
+                orders = ((1,1,1), (2,1,2), (3,1,3)),
+                seasonal_orders = ((1,1,1,7), (2,2,3,7)),
+                data_since = '2012-01-01',
+                data_till = '2012-12-31',
+                forecasting_since = None,
+                forecasting_till = None,
+                processes = None,
+                checkpoint = None,
+                aic_margin = 50,
+                screening_maxiter = 10,
+                maxiter = 50
+                ):
+    """
+    This function will choose SARIMAX orders of forecast_prices / forecast_demand based on:
+    - series (gas_data) used for fitting from data_since to data_till,
+    - validation period (forecasting_since, forecasting_till) - if given, candidates are ranked by MAPE of the forecast there,
+      otherwise by AIC,
+    - all combinations of orders (ARIMA_order) and seasonal_orders (ARIMA_season_order).
+    processes defines number of worker processes (default - number of CPUs), checkpoint the JSON lines file of finished fits.
+    Candidates failing or worse than the best one by more than aic_margin of AIC are stopped early (see above),
+    screening_maxiter and maxiter define number of iterations of the screening and of the full fit.
+
+    Returns table of all the candidates, ranked (the best first), with status and time of every stage (in seconds).
+    """
+    series = gas_data.loc[pd.to_datetime(data_since):pd.to_datetime(data_till)]
+    validation = None
+    if forecasting_since is not None:
+        validation = gas_data.loc[pd.to_datetime(forecasting_since):pd.to_datetime(forecasting_till)]
+    fingerprint = _fingerprint(series, validation, dict(forecasting.SARIMAX_OPTIONS, screening_maxiter = screening_maxiter, maxiter = maxiter))
+    done = _read_checkpoint(checkpoint, fingerprint)
+
+    candidates = [(tuple(order), tuple(seasonal_order)) for order, seasonal_order in itertools.product(orders, seasonal_orders)]
+
+    with ProcessPoolExecutor(max_workers = processes) as executor:
+        # Stage 1 - short fits of all the candidates
+        screening = _run_stage('screening', candidates, series, validation, screening_maxiter, executor, done, checkpoint, fingerprint)
+        best_screening = np.nanmin([r['aic'] for r in screening.values()] + [np.inf])
+        promising = sorted([c for c, r in screening.items() if r['error'] is None and r['aic'] <= best_screening + aic_margin],
+                           key = lambda c: screening[c]['aic'])
+
+        # Stage 2 - full fits, pending candidates are cancelled when they are too far from the best full fit
+        def stop(results, pending):
+            best = np.nanmin([r['aic'] for r in results.values()] + [np.inf])
+            return [c for c in pending if screening[c]['aic'] > best + aic_margin]
+
+        full = _run_stage('full', promising, series, validation, maxiter, executor, done, checkpoint, fingerprint, stop)
+
+    rows = []
+    for candidate in candidates:
+        first, second = screening[candidate], full.get(candidate)
+        if first['error'] is not None:
+            status = 'failed'
+        elif second is None:
+            status = 'stopped early'
+        elif second['error'] is not None:
+            status = 'failed'
+        else:
+            status = 'fitted' if second['converged'] else 'not converged'
+        result = second if second is not None else {}
+        rows.append({'order': candidate[0], 'seasonal_order': candidate[1], 'status': status,
+                     'aic': result.get('aic', np.nan), 'bic': result.get('bic', np.nan), 'mape': result.get('mape', np.nan),
+                     'screening_aic': first['aic'], 'screening_seconds': first['seconds'], 'seconds': result.get('seconds', np.nan),
+                     'error': result.get('error') or first['error']})
+
+    table = pd.DataFrame(rows)
+    table['fitted'] = table['status'].isin(['fitted', 'not converged'])
+    metric = 'mape' if validation is not None else 'aic'
+    table = table.sort_values(['fitted', metric, 'screening_aic'], ascending = [False, True, True], na_position = 'last')
+    table = table.drop(columns = 'fitted').reset_index(drop = True)
+    table.insert(0, 'rank', np.arange(1, table.shape[0] + 1))
+
+    return table
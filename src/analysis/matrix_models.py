@@ -0,0 +1,436 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from src.analysis.scenario_tree import ScenarioTree
+
+# Array based versions of the models from optimization.py.
+# Instead of adding every constraint with a Python generator, the models are described as
+# whole sparse matrix blocks (objective vector, constraint matrix, bounds) and passed to the
+# solver via its matrix API (see backends.py). The variables are the same as in the original
+# functions, in the same order, so the results can be compared name by name.
+
+
+class MatrixProblem:
+    """
+    Optimization model stored as arrays:
+        minimize c'x + x'Qx + constant
+        subject to A x (sense) rhs, lb <= x <= ub, x[vtype == 'B'] binary.
+    families maps the name of every variable family (e.g. 'g_spot') to its (start, shape) in x.
+    """
+
+    def __init__(self, c, A, sense, rhs, lb, ub, vtype, families, Q = None, constant = 0.0, name = 'mip1'):
+        self.c = c
+        self.A = A
+        self.sense = sense
+        self.rhs = rhs
+        self.lb = lb
+        self.ub = ub
+        self.vtype = vtype
+        self.families = families
+        self.Q = Q
+        self.constant = constant
+        self.name = name
+
+    @property
+    def num_vars(self):
+        return self.c.shape[0]
+
+    @property
+    def num_constrs(self):
+        return self.A.shape[0]
+
+    def family(self, name):
+        """
+        Returns positions of the variable family in x, shaped as the family (e.g. (time, scenarios)).
+        """
+        start, shape = self.families[name]
+        return np.arange(start, start + int(np.prod(shape, dtype = int))).reshape(shape)
+
+    def var_names(self):
+        """
+        Returns names of all variables, the same as Gurobi gives them (e.g. 'g_spot[0]', 'st_max', 'g_DA[0,1]').
+        """
+        return family_names(self.families)
+
+
+def family_names(families):
+    """
+    Returns names of all the variables of families ({name: (start, shape)}), e.g. 'g_spot[0]', 'st_max', 'g_DA[0,1]'.
+    """
+    names = []
+    for name, (start, shape) in families.items():
+        if shape == ():
+            names.append(name)
+        else:
+            names.extend(name + '[' + ','.join(map(str, index)) + ']' for index in np.ndindex(*shape))
+    return names
+
+
+class _MatrixBuilder:
+    """
+    Collects variable families and constraint blocks before creating MatrixProblem.
+    """
+
+    def __init__(self):
+        self.families = {}
+        self.num_vars = 0
+        self.lb, self.ub, self.vtype = [], [], []
+        self.rows, self.cols, self.vals = [], [], []
+        self.sense, self.rhs = [], []
+        self.num_constrs = 0
+        self.c = []
+        self.q_rows, self.q_cols, self.q_vals = [], [], []
+        self.constant = 0.0
+
+    def add_vars(self, name, shape, lb = 0.0, ub = np.inf, vtype = 'C'):
+        size = int(np.prod(shape, dtype = int))
+        index = np.arange(self.num_vars, self.num_vars + size).reshape(shape)
+        self.families[name] = (self.num_vars, shape)
+        self.lb.append(np.broadcast_to(np.asarray(lb, dtype = float), shape).ravel())
+        self.ub.append(np.broadcast_to(np.asarray(ub, dtype = float), shape).ravel())
+        self.vtype.append(np.full(size, vtype))
+        self.num_vars += size
+        return index
+
+    def add_constrs(self, terms, sense, rhs):
+        """
+        Adds a block of rows, one for every element of rhs (rows in C order for multidimensional rhs).
+        terms is a list of (variables, coefficients) - row r gets coefficients[r] * variables[r],
+        both are broadcasted to the shape of rhs.
+        """
+        rhs = np.atleast_1d(np.asarray(rhs, dtype = float))
+        n = rhs.size
+        row_index = np.arange(self.num_constrs, self.num_constrs + n)
+        for variables, coefficients in terms:
+            self.rows.append(row_index)
+            self.cols.append(np.broadcast_to(np.asarray(variables), rhs.shape).ravel())
+            self.vals.append(np.broadcast_to(np.asarray(coefficients, dtype = float), rhs.shape).ravel())
+        self.sense.append(np.full(n, sense))
+        self.rhs.append(rhs.ravel())
+        self.num_constrs += n
+        return row_index
+
+    def add_objective(self, variables, coefficients):
+        variables, coefficients = np.broadcast_arrays(np.atleast_1d(variables), np.asarray(coefficients, dtype = float))
+        self.c.append((variables.ravel(), coefficients.ravel()))
+
+    def add_quadratic(self, variables_1, variables_2, coefficients):
+        variables_1, variables_2 = np.broadcast_arrays(np.atleast_1d(variables_1), np.atleast_1d(variables_2))
+        self.q_rows.append(variables_1.ravel())
+        self.q_cols.append(variables_2.ravel())
+        self.q_vals.append(np.broadcast_to(np.asarray(coefficients, dtype = float), variables_1.shape).ravel())
+
+    def problem(self, name = 'mip1'):
+        c = np.zeros(self.num_vars)
+        for variables, coefficients in self.c:
+            np.add.at(c, variables, coefficients)
+
+        A = sp.csr_matrix((np.concatenate(self.vals), (np.concatenate(self.rows), np.concatenate(self.cols))),
+                          shape = (self.num_constrs, self.num_vars))
+
+        Q = None
+        if self.q_vals:
+            Q = sp.csr_matrix((np.concatenate(self.q_vals), (np.concatenate(self.q_rows), np.concatenate(self.q_cols))),
+                              shape = (self.num_vars, self.num_vars))
+
+        return MatrixProblem(c, A, np.concatenate(self.sense), np.concatenate(self.rhs),
+                             np.concatenate(self.lb), np.concatenate(self.ub), np.concatenate(self.vtype),
+                             self.families, Q = Q, constant = self.constant, name = name)
+
+
+def horizon_arrays(forecasting_since, forecasting_till, prices, demand):
+    """
+    Computes the horizon the same way as the functions in optimization.py (public holidays are
+    removed from demand) and returns prices and demand as NumPy arrays of that length.
+    """
+    time = (pd.to_datetime(forecasting_till) - pd.to_datetime(forecasting_since)).days - demand[~demand.index.isin(prices.index)].shape[0] + 1
+    demand = demand[demand.index.isin(prices.index)]
+
+    return np.asarray(prices, dtype = float)[:time], np.asarray(demand, dtype = float)[:time]
+
+
+def _storage_constraints(builder, st, st_in, st_out, capacity, in_rate, out_rate):
+    """
+    Adds capacity, rate and flow constraints of one storage.
+    capacity, in_rate and out_rate are lists of (variables, coefficients) terms moved to the left hand side,
+    e.g. st[t] <= st_max is added as st[t] - st_max <= 0.
+    """
+    time = st.shape[0]
+
+    # Max capacity of the storage
+    builder.add_constrs([(st, 1)] + capacity[0], '<', capacity[1])
+
+    # Max injection and withdrawal
+    builder.add_constrs([(st_in, 1)] + in_rate[0], '<', in_rate[1])
+    builder.add_constrs([(st_out, 1)] + out_rate[0], '<', out_rate[1])
+
+    # Flow in the storage
+    builder.add_constrs([(st[0], 1)], '=', 0)
+    builder.add_constrs([(st[:-1], 1), (st_in[:-1], 1), (st_out[:-1], -1), (st[1:], -1)], '=', np.zeros(time - 1))
+    builder.add_constrs([(st[time-1], 1)], '=', 0)
+
+
+def deterministic_problem(storage_bid, storage_parameters, prices, demand):
+    """
+    Array version of the model built in optimization.deterministic.
+    prices and demand are NumPy arrays of the horizon length (see horizon_arrays).
+    """
+    storage_available, default_in_rate, default_out_rate, price_injection, limit_buying, limit_selling = storage_parameters
+    time = prices.shape[0]
+    builder = _MatrixBuilder()
+
+    ### Setting variables
+
+    g_spot = builder.add_vars('g_spot', (time,), lb = -limit_selling, ub = limit_buying)
+    st_max = builder.add_vars('st_max', (), lb = 0, ub = storage_available)
+    st = builder.add_vars('st', (time,))
+    st_in = builder.add_vars('st_in', (time,))
+    st_out = builder.add_vars('st_out', (time,))
+    u_st = builder.add_vars('u_st', (), lb = 0, ub = 1, vtype = 'B')
+
+    ### Objective function
+
+    # storage_bid * st_max + (u_st * st_in.sum() + (1 - u_st) * st_max) * price_injection
+    builder.add_objective(st_max, storage_bid + price_injection)
+    builder.add_quadratic(u_st, st_in, price_injection)
+    builder.add_quadratic(u_st, st_max, -price_injection)
+
+    # Cost of trading on spot market
+    builder.add_objective(g_spot, prices)
+
+    ### Setting constraints
+
+    # Demand and supply balance of Day-Ahead market
+    builder.add_constrs([(g_spot, 1), (st_in, -1), (st_out, 1)], '=', demand)
+
+    _storage_constraints(builder, st, st_in, st_out,
+                         capacity = ([(st_max, -1)], np.zeros(time)),
+                         in_rate = ([(st_max, -1/default_in_rate)], np.zeros(time)),
+                         out_rate = ([(st_max, -1/default_out_rate)], np.zeros(time)))
+
+    return builder.problem()
+
+
+def additional_flexibility_full_problem(storage_bid, storage_parameters, limit_trading, prices, demand):
+    """
+    Array version of the model built in optimization.additional_flexibility_full.
+    """
+    storage_available, default_in_rate, default_out_rate, min_in_rate, min_out_rate, add_price_injection, add_price_withdrawal, price_injection = storage_parameters
+    time = prices.shape[0]
+    builder = _MatrixBuilder()
+
+    ### Setting variables
+
+    g_spot = builder.add_vars('g_spot', (time,), lb = -limit_trading, ub = limit_trading)
+    st_max = builder.add_vars('st_max', (), lb = 0, ub = storage_available)
+    st = builder.add_vars('st', (time,))
+    st_in = builder.add_vars('st_in', (time,))
+    st_out = builder.add_vars('st_out', (time,))
+    u_st = builder.add_vars('u_st', (), lb = 0, ub = 1, vtype = 'B')
+
+    ### Objective function
+
+    price_additional_injecting = 1 / (default_in_rate * 24) * add_price_injection * (default_in_rate/min_in_rate - 1)
+    price_additional_withdrawal = 1 / (default_out_rate * 24) * add_price_withdrawal * (default_out_rate/min_out_rate - 1)
+    builder.add_objective(st_max, storage_bid + price_additional_injecting + price_additional_withdrawal + price_injection)
+    builder.add_quadratic(u_st, st_in, price_injection)
+    builder.add_quadratic(u_st, st_max, -price_injection)
+
+    builder.add_objective(g_spot, prices)
+
+    ### Setting constraints
+
+    builder.add_constrs([(g_spot, 1), (st_in, -1), (st_out, 1)], '=', demand)
+
+    _storage_constraints(builder, st, st_in, st_out,
+                         capacity = ([(st_max, -1)], np.zeros(time)),
+                         in_rate = ([(st_max, -1/min_in_rate)], np.zeros(time)),
+                         out_rate = ([(st_max, -1/min_out_rate)], np.zeros(time)))
+
+    return builder.problem()
+
+
+def additional_flexibility_problem(st_max, storage_bid, storage_parameters, limit_trading, prices, demand):
+    """
+    Array version of the model built in optimization.additional_flexibility (st_max is a parameter here).
+    """
+    storage_in_max, storage_out_max, cost_in_additional, cost_out_additional, storage_in_additional, storage_out_additional, price_injection = storage_parameters
+    time = prices.shape[0]
+    builder = _MatrixBuilder()
+
+    ### Setting variables
+
+    g_spot = builder.add_vars('g_spot', (time,), lb = -limit_trading, ub = limit_trading)
+    st = builder.add_vars('st', (time,))
+    st_in = builder.add_vars('st_in', (time,))
+    st_in_additional = builder.add_vars('st_in_additional', (), lb = 1, ub = storage_in_additional)
+    st_out = builder.add_vars('st_out', (time,))
+    st_out_additional = builder.add_vars('st_out_additional', (), lb = 1, ub = storage_out_additional)
+    u_st = builder.add_vars('u_st', (), lb = 0, ub = 1, vtype = 'B')
+
+    ### Objective function
+
+    # (storage_bid + price_additional_injecting + price_additional_withdrawal) * st_max, where
+    # price_additional_injecting = (1/storage_in_max) / 24 * cost_in_additional * (st_in_additional - 1)
+    in_coefficient = st_max * (1/storage_in_max) / 24 * cost_in_additional
+    out_coefficient = st_max * (1/storage_out_max) / 24 * cost_out_additional
+    builder.add_objective(st_in_additional, in_coefficient)
+    builder.add_objective(st_out_additional, out_coefficient)
+    builder.constant += storage_bid * st_max - in_coefficient - out_coefficient
+
+    # (u_st * st_in.sum() + (1 - u_st) * st_max) * price_injection
+    builder.add_quadratic(u_st, st_in, price_injection)
+    builder.add_objective(u_st, -st_max * price_injection)
+    builder.constant += st_max * price_injection
+
+    builder.add_objective(g_spot, prices)
+
+    ### Setting constraints
+
+    builder.add_constrs([(g_spot, 1), (st_in, -1), (st_out, 1)], '=', demand)
+
+    _storage_constraints(builder, st, st_in, st_out,
+                         capacity = ([], np.full(time, float(st_max))),
+                         in_rate = ([(st_in_additional, -(1/storage_in_max) * st_max)], np.zeros(time)),
+                         out_rate = ([(st_out_additional, -(1/storage_out_max) * st_max)], np.zeros(time)))
+
+    return builder.problem()
+
+
+def stochastic_arrays(forecasting_since, forecasting_till, prices_GPN, prices_WD, demand, demand_WD):
+    """
+    Converts inputs of optimization.stochastic to NumPy arrays:
+    prices_GPN (paths, time), prices_WD (paths, time), demand (paths, time) and demand_WD (demand paths, time, samples).
+    demand_WD can be given as DataFrame with an array of within-day samples in every cell, as in optimization.stochastic.
+    """
+    time = (pd.to_datetime(forecasting_till) - pd.to_datetime(forecasting_since)).days + 1
+
+    if isinstance(demand_WD, pd.DataFrame):
+        cells = demand_WD.iloc[:, :time].to_numpy()
+        demand_WD = np.stack([np.asarray(cell, dtype = float) for cell in cells.ravel()]).reshape(cells.shape + (-1,))
+
+    return (np.asarray(prices_GPN, dtype = float)[:, :time], np.asarray(prices_WD, dtype = float)[:, :time],
+            np.asarray(demand, dtype = float)[:, :time], np.asarray(demand_WD, dtype = float)[:, :time])
+
+
+def _stochastic_model(builder, u_st, tree, prices_GPN, prices_WD, demand, demand_WD, capacity, in_rate, out_rate, out_rate_WD, price_injection):
+    """
+    Adds second (Day-ahead) and third (Within-day) stage variables, trading costs and constraints, shared by
+    stochastic_problem and additional_flexibility_stochastic_problem. Scenarios are defined by tree (ScenarioTree),
+    every constraint is added once, for all the scenarios at the same time.
+    capacity, in_rate, out_rate and out_rate_WD are (terms, rhs) pairs as in _storage_constraints, rhs is broadcasted to all the scenarios.
+    """
+    time = prices_GPN.shape[1]
+    scenarios_DA, scenarios_WD = tree.scenarios_DA, tree.scenarios_WD
+    demand_of_b = tree.demand[tree.parent]
+
+    ### Setting variables
+
+    ## Second stage decision variables (Day-ahead)
+    g_DA = builder.add_vars('g_DA', (time, scenarios_DA), lb = -np.inf)
+    st_DA = builder.add_vars('st_DA', (time, scenarios_DA))
+    st_in_DA = builder.add_vars('st_in_DA', (time, scenarios_DA))
+    st_out_DA = builder.add_vars('st_out_DA', (time, scenarios_DA))
+
+    ## Third stage decision variables (Within-day)
+    g_WD = builder.add_vars('g_WD', (time, scenarios_WD), lb = -np.inf)
+    st_WD = builder.add_vars('st_WD', (time, scenarios_WD))
+    st_in_WD = builder.add_vars('st_in_WD', (time, scenarios_WD))
+    st_out_WD = builder.add_vars('st_out_WD', (time, scenarios_WD))
+
+    ### Objective function
+
+    # Paying for injection in WD scenarios
+    builder.add_quadratic(u_st, st_in_WD, price_injection * tree.probability_WD)
+
+    # Cost of trading on spot markets
+    builder.add_objective(g_DA, prices_GPN[tree.GPN].T * tree.probability_DA)
+    builder.add_objective(g_WD, prices_WD[tree.WD].T * tree.probability_WD)
+
+    ### Setting constraints
+
+    # Demand and supply balance of Day-Ahead market
+    builder.add_constrs([(g_DA, 1), (st_in_DA, -1), (st_out_DA, 1)], '=', demand[tree.demand].T)
+
+    # Demand and supply balance of changes that have to be done on Within-Day market
+    builder.add_constrs([(g_WD, 1), (st_in_DA[:, tree.parent], -1), (st_in_WD, 1), (st_out_DA[:, tree.parent], 1), (st_out_WD, -1)], '=',
+                        demand[demand_of_b].T - demand_WD[demand_of_b, :, tree.sample].T)
+
+    for st, st_in, st_out, out_rate_stage in ((st_DA, st_in_DA, st_out_DA, out_rate), (st_WD, st_in_WD, st_out_WD, out_rate_WD)):
+        # Max capacity of the storage
+        builder.add_constrs([(st, 1)] + capacity[0], '<', np.broadcast_to(capacity[1], st.shape))
+
+        # Max injection and withdrawal
+        builder.add_constrs([(st_in, 1)] + in_rate[0], '<', np.broadcast_to(in_rate[1], st.shape))
+        builder.add_constrs([(st_out, 1)] + out_rate_stage[0], '<', np.broadcast_to(out_rate_stage[1], st.shape))
+
+        # Flow in the storage
+        builder.add_constrs([(st[0], 1)], '=', np.zeros(st.shape[1]))
+        builder.add_constrs([(st[time-1], 1)], '=', np.zeros(st.shape[1]))
+        builder.add_constrs([(st[:-1], 1), (st_in[:-1], 1), (st_out[:-1], -1), (st[1:], -1)], '=', np.zeros((time - 1, st.shape[1])))
+
+    # No withdrawal in the last day of DA
+    builder.add_constrs([(st_out_DA[time-1], 1)], '=', np.zeros(scenarios_DA))
+
+
+def stochastic_problem(storage_bid, storage_parameters, prices_GPN, prices_WD, demand, demand_WD, tree = None):
+    """
+    Array version of the model built in optimization.stochastic.
+    Inputs are NumPy arrays returned by stochastic_arrays, tree is ScenarioTree of them (default - all combinations of the paths).
+    """
+    storage_available, storage_in_max, storage_out_max, price_injection = storage_parameters
+    tree = tree if tree is not None else ScenarioTree.product(prices_GPN.shape[0], prices_WD.shape[0], demand.shape[0], demand_WD.shape[2])
+    builder = _MatrixBuilder()
+
+    ## First stage decision variables
+    u_st = builder.add_vars('u_st', (), lb = 0, ub = 1, vtype = 'B')
+    st_max = builder.add_vars('st_max', (), lb = 0, ub = storage_available)
+
+    # storage_bid * st_max + (1 - u_st) * st_max * price_injection
+    builder.add_objective(st_max, storage_bid + price_injection)
+    builder.add_quadratic(u_st, st_max, -price_injection)
+
+    _stochastic_model(builder, u_st, tree, prices_GPN, prices_WD, demand, demand_WD,
+                      capacity = ([(st_max, -1)], 0),
+                      in_rate = ([(st_max, -storage_in_max)], 0),
+                      out_rate = ([(st_max, -storage_out_max)], 0),
+                      out_rate_WD = ([(st_max, -storage_out_max)], 0),
+                      price_injection = price_injection)
+
+    return builder.problem()
+
+
+def additional_flexibility_stochastic_problem(st_max, storage_bid, storage_parameters, prices_GPN, prices_WD, demand, demand_WD, tree = None):
+    """
+    Array version of the model built in optimization.additional_flexibility_stochastic (st_max is a parameter here).
+    As in the original model, WD withdrawal is limited with st_in_additional. tree is the same as in stochastic_problem.
+    """
+    storage_in_max, storage_out_max, cost_in_additional, cost_out_additional, storage_in_additional, storage_out_additional, price_injection = storage_parameters
+    tree = tree if tree is not None else ScenarioTree.product(prices_GPN.shape[0], prices_WD.shape[0], demand.shape[0], demand_WD.shape[2])
+    builder = _MatrixBuilder()
+
+    ## First stage decision variables
+    u_st = builder.add_vars('u_st', (), lb = 0, ub = 1, vtype = 'B')
+    st_in_additional = builder.add_vars('st_in_additional', (), lb = 0, ub = storage_in_additional - 1)
+    st_out_additional = builder.add_vars('st_out_additional', (), lb = 0, ub = storage_out_additional - 1)
+
+    # (storage_bid + price_additional_injecting + price_additional_withdrawal) * st_max + (1 - u_st) * st_max * price_injection
+    builder.add_objective(st_in_additional, storage_in_max / 24 * cost_in_additional * st_max)
+    builder.add_objective(st_out_additional, storage_out_max / 24 * cost_out_additional * st_max)
+    builder.add_objective(u_st, -st_max * price_injection)
+    builder.constant += (storage_bid + price_injection) * st_max
+
+    # st_in <= storage_in_max * st_max * (st_in_additional + 1)
+    in_rate = ([(st_in_additional, -storage_in_max * st_max)], storage_in_max * st_max)
+    out_rate = ([(st_out_additional, -storage_out_max * st_max)], storage_out_max * st_max)
+    out_rate_WD = ([(st_in_additional, -storage_out_max * st_max)], storage_out_max * st_max)
+
+    _stochastic_model(builder, u_st, tree, prices_GPN, prices_WD, demand, demand_WD,
+                      capacity = ([], st_max),
+                      in_rate = in_rate,
+                      out_rate = out_rate,
+                      out_rate_WD = out_rate_WD,
+                      price_injection = price_injection)
+
+    return builder.problem()
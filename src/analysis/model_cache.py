@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import pickle as pkl
+import tempfile
+
+import pandas as pd
+import statsmodels
+
+# On-disk cache of fitted SARIMAX results of forecast_prices / forecast_demand.
+# Key is a hash of the training series (values and dates), orders, fit options and statsmodels version,
+# so a repeated call with the same window and orders only runs get_prediction.
+# Every result is one pickle file in the directory; its modification time is the time of the last use,
+# and the least recently used files are removed when the directory is larger than max_bytes.
+# A cache given by its directory (e.g. cache = 'data/fit_cache' of the forecasting functions) is one FitCache object
+# per directory in a process (fit_cache), so its statistics are kept between the calls.
+
+# FitCache of every directory used in this process
+_caches = {}
+
+
+class FitCache:
+    """
+    Cache of fitted models in directory, of at most max_bytes (default 1 GB).
+    cache.stats() returns numbers of hits, misses, stores, evictions and the current size.
+    """
+
+    def __init__(self, directory, max_bytes = 2 ** 30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok = True)
+
+    def key(self, series, order, seasonal_order, fit_kwargs = None):
+        digest = hashlib.sha256()
+        digest.update(pd.util.hash_pandas_object(series).to_numpy().tobytes())
+        digest.update(json.dumps({'order': list(order), 'seasonal_order': list(seasonal_order),
+                                  'fit': {k: repr(v) for k, v in sorted((fit_kwargs or {}).items())},
+                                  'name': str(getattr(series, 'name', None)), 'statsmodels': statsmodels.__version__}).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+
+    def get(self, key):
+        """
+        Returns cached result of key or None.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                result = pkl.load(file)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (pkl.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Damaged file or file of another version of the libraries - fitted again
+            os.remove(path)
+            self.misses += 1
+            return None
+
+        os.utime(path)
+        self.hits += 1
+        return result
+
+    def put(self, key, result):
+        # Written to a temporary file first, so other processes never read a partial file
+        descriptor, temporary = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+        with os.fdopen(descriptor, 'wb') as file:
+            pkl.dump(result, file, protocol = pkl.HIGHEST_PROTOCOL)
+        os.replace(temporary, self._path(key))
+        self.stores += 1
+        self.evict()
+
+    def get_or_fit(self, series, order, seasonal_order, fit, fit_kwargs = None):
+        """
+        Returns cached result of the series and orders, or fits it with fit() and stores it.
+        """
+        key = self.key(series, order, seasonal_order, fit_kwargs)
+        result = self.get(key)
+        if result is None:
+            result = fit()
+            self.put(key, result)
+        return result
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                try:
+                    status = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, name))
+        return entries
+
+    def evict(self):
+        """
+        Removes the least recently used results until the cache is not larger than max_bytes.
+        """
+        entries = sorted(self._entries())
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, name in entries:
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+            self.evictions += 1
+
+    def clear(self):
+        for _, _, name in self._entries():
+            os.remove(os.path.join(self.directory, name))
+
+    def stats(self):
+        entries = self._entries()
+        requests = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / requests if requests else 0.0,
+                'stores': self.stores, 'evictions': self.evictions, 'entries': len(entries),
+                'bytes': sum(entry[1] for entry in entries), 'max_bytes': self.max_bytes}
+
+
+def fit_cache(directory):
+    """
+    FitCache of directory - the same object for every call in this process.
+    """
+    key = os.path.abspath(directory)
+    if key not in _caches:
+        _caches[key] = FitCache(directory)
+    return _caches[key]
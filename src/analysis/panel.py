@@ -0,0 +1,108 @@
+import time as timer
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import forecasting
+
+# Forecasting of many series (hubs, exit zones, bidding zones) with SarimaxForecaster (the model of forecast_prices),
+# one series per task in a process pool.
+# Values of all the series are put once in shared memory, which the workers read without copying (read-only view),
+# so the tasks contain only the number of the column. A failed series is reported and the others are finished.
+
+# Data of the worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(name, shape, dates):
+    memory = shared_memory.SharedMemory(name = name)
+    values = np.ndarray(shape, dtype = np.float64, buffer = memory.buf)
+    values.flags.writeable = False
+    _worker.clear()
+    _worker.update(memory = memory, values = values, dates = pd.DatetimeIndex(dates))
+
+
+def _forecast_column(column, parameters):
+    """
+    Forecast of one column of the shared data. Returns forecast (predicted mean) and bounds (or the error) and time of fitting (in seconds).
+    """
+    start = timer.perf_counter()
+    series = pd.Series(_worker['values'][:, column], index = _worker['dates'])
+    try:
+        if series.loc[pd.to_datetime(parameters['data_since']):pd.to_datetime(parameters['data_till'])].count() == 0:
+            raise ValueError("no data in the training window")
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            forecaster = forecasting.SarimaxForecaster(parameters['ARIMA_order'], parameters['ARIMA_season_order'],
+                                                       parameters['cache']).fit(series, parameters['data_since'], parameters['data_till'])
+            mean = forecaster.predict(parameters['forecasting_since'], parameters['forecasting_till'])
+            pred_ci = forecaster.intervals(parameters['forecasting_since'], parameters['forecasting_till'])
+        forecast, lower, upper = mean.to_numpy(), pred_ci.iloc[:, 0].to_numpy(), pred_ci.iloc[:, 1].to_numpy()
+        if not (np.all(np.isfinite(forecast)) and np.all(np.isfinite(lower)) and np.all(np.isfinite(upper))):
+            raise ValueError("forecast has missing values")
+        return {'dates': pred_ci.index.to_numpy(), 'forecast': forecast, 'lower': lower, 'upper': upper, 'error': None,
+                'seconds': timer.perf_counter() - start}
+    except Exception as error: # failure of one series does not stop the others
+        return {'error': '%s: %s' % (type(error).__name__, error), 'seconds': timer.perf_counter() - start}
+
+
+def forecast_panel(data,
+                   data_since = '2012-01-01',
+                   data_till = '2012-12-31',
+                   forecasting_since = '2013-01-01',
+                   forecasting_till = '2013-04-01',
+                   ARIMA_order = (3,1,3),
+                   ARIMA_season_order = (2,2,3,7),
+                   orders = None,
+                   processes = None,
+                   cache = None
+                   ):
+    """
+    This function will forecast every column of data (wide DataFrame with dates as index, e.g. GPN, TTF, NCG, Gaspool)
+    with the model of forecast_prices and the same parameters. orders can define other (ARIMA_order, ARIMA_season_order) of some columns,
+    e.g. {'TTF': ((2,1,2), (1,1,1,7))}. processes defines number of worker processes (default - number of CPUs),
+    cache the FitCache or its directory (see model_cache.py).
+
+    Returns stacked forecasts (columns series, date, forecast, lower, upper) and report of every series
+    (status 'ok' or 'failed', error and time of fitting in seconds).
+    """
+    values = np.ascontiguousarray(data.to_numpy(dtype = np.float64))
+    orders = orders or {}
+    if cache is not None and not isinstance(cache, str):
+        cache = cache.directory
+
+    memory = shared_memory.SharedMemory(create = True, size = max(values.nbytes, 1))
+    try:
+        np.ndarray(values.shape, dtype = np.float64, buffer = memory.buf)[:] = values
+        initargs = (memory.name, values.shape, data.index.to_numpy())
+
+        results = {}
+        with ProcessPoolExecutor(max_workers = processes, initializer = _init_worker, initargs = initargs) as executor:
+            futures = {}
+            for column, name in enumerate(data.columns):
+                order, season_order = orders.get(name, (ARIMA_order, ARIMA_season_order))
+                parameters = {'data_since': data_since, 'data_till': data_till, 'forecasting_since': forecasting_since,
+                              'forecasting_till': forecasting_till, 'ARIMA_order': order, 'ARIMA_season_order': season_order,
+                              'cache': cache}
+                futures[executor.submit(_forecast_column, column, parameters)] = name
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+    finally:
+        memory.close()
+        memory.unlink()
+
+    forecasts, report = [], []
+    for name in data.columns:
+        result = results[name]
+        report.append({'series': name, 'status': 'failed' if result['error'] else 'ok', 'error': result['error'], 'seconds': result['seconds']})
+        if result['error'] is None:
+            forecasts.append(pd.DataFrame({'series': name, 'date': result['dates'], 'forecast': result['forecast'],
+                                           'lower': result['lower'], 'upper': result['upper']}))
+
+    columns = ['series', 'date', 'forecast', 'lower', 'upper']
+    forecasts = pd.concat(forecasts, ignore_index = True) if forecasts else pd.DataFrame(columns = columns)
+
+    return forecasts, pd.DataFrame(report)
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+from src.analysis import matrix_models
+
+# Result of an optimization stored by columns - values of all the variables in one NumPy array (taken from the solver
+# in one call), split into variable families with their index shapes, e.g. g_spot (time,), st_WD (time, scenarios).
+# Names of the variables are created only when they are needed (to_frame, to_parquet).
+
+RESULT_FORMATS = ('frame', 'result')
+
+
+def family_layout(shapes):
+    """
+    Returns families ({name: (start, shape)}) of variables added one family after another,
+    from list of (name, shape) pairs, e.g. [('g_spot', (time,)), ('st_max', ())].
+    """
+    families = {}
+    start = 0
+    for name, shape in shapes:
+        families[name] = (start, tuple(shape))
+        start += int(np.prod(shape, dtype = int))
+    return families
+
+
+class OptimizationResult:
+    """
+    Objective value and values of the variables of a solved model:
+    - result.family('st_WD') (or result['st_WD']) - values of the family as array of its shape,
+    - result.to_frame() - the Names/Values table returned by the functions in optimization.py,
+    - result.to_parquet(path) - long table (family, index, value) written family by family.
+    """
+
+    def __init__(self, objective, values, families):
+        self.objective = objective
+        self.values = np.asarray(values, dtype = float)
+        self.families = families
+
+    @classmethod
+    def from_problem(cls, objective, values, problem):
+        return cls(objective, values, problem.families)
+
+    def __getitem__(self, name):
+        return self.family(name)
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def family(self, name):
+        start, shape = self.families[name]
+        return self.values[start:start + int(np.prod(shape, dtype = int))].reshape(shape)
+
+    def names(self):
+        return matrix_models.family_names(self.families)
+
+    def to_frame(self):
+        """
+        Returns table with columns Names and Values, the same as created by the row-by-row loop before.
+        """
+        return pd.DataFrame({'Names': self.names(), 'Values': self.values})
+
+    def to_parquet(self, path, compression = 'snappy'):
+        """
+        Writes the result to Parquet with columns family, index_0, index_1, ... (-1 where the family has less dimensions)
+        and value, one row group per family, so the names are never created for all the variables at once.
+        Objective value is kept in the metadata of the file (see from_parquet).
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        dimensions = max([len(shape) for _, shape in self.families.values()] + [1])
+        schema = pa.schema([('family', pa.string())] + [('index_%d' % d, pa.int32()) for d in range(dimensions)] + [('value', pa.float64())],
+                           metadata = {'objective': repr(float(self.objective))})
+
+        with pq.ParquetWriter(path, schema, compression = compression) as writer:
+            for name, (_, shape) in self.families.items():
+                values = self.family(name).ravel()
+                indices = np.indices(shape).reshape(len(shape), -1) if shape != () else np.zeros((0, 1), dtype = int)
+                columns = {'family': pa.array(np.full(values.shape[0], name, dtype = object), pa.string())}
+                for d in range(dimensions):
+                    column = indices[d] if d < len(shape) else np.full(values.shape[0], -1)
+                    columns['index_%d' % d] = pa.array(column.astype(np.int32))
+                columns['value'] = pa.array(values)
+                writer.write_table(pa.table(columns, schema = schema))
+
+    @classmethod
+    def from_parquet(cls, path):
+        """
+        Reads result written by to_parquet.
+        """
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path)
+        objective = float(table.schema.metadata[b'objective'])
+        frame = table.to_pandas()
+
+        shapes = []
+        for name, rows in frame.groupby('family', sort = False):
+            indices = rows.filter(like = 'index_').to_numpy()
+            indices = indices[:, indices[0] >= 0] if len(rows) > 0 else indices
+            shapes.append((name, tuple(indices.max(axis = 0) + 1) if indices.shape[1] > 0 else ()))
+
+        return cls(objective, frame['value'].to_numpy(), family_layout(shapes))
+
+
+def format_result(result, result_format = 'frame'):
+    """
+    Returns result_variables of the functions in optimization.py - Names/Values table ('frame')
+    or OptimizationResult ('result').
+    """
+    if result_format == 'frame':
+        return result.to_frame()
+    elif result_format == 'result':
+        return result
+    raise ValueError("Unknown result_format %r, use one of %s" % (result_format, RESULT_FORMATS))
@@ -0,0 +1,147 @@
+import time as timer
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import backends
+from src.analysis import matrix_models
+
+# Rolling (receding) horizon dispatch - the storage is planned every day for the next window days and only the
+# decisions of the first day are realized, then the window moves one day forward.
+# The first stage decisions (capacity, payment mode, additional flexibility) are fixed, as they are decided in the auction.
+# The model of the window is built once: between the days only prices (objective), demand and the initial storage
+# level (right hand sides) are changed, and every solve starts from the previous one (see backends.GurobiModel).
+# The last window ends with forecasting_till, all its days are realized and only there the storage has to be empty at the end.
+
+
+def _rows(time):
+    """
+    Rows of the models built by matrix_models: balance (time), capacity, injection and withdrawal (time each),
+    initial storage level, flow (time - 1) and final storage level.
+    """
+    return {'balance': np.arange(time), 'initial': 4 * time, 'final': 5 * time}
+
+
+def _first_stage(problem, names, fixed, backend):
+    """
+    Values of the first stage variables - given in fixed, or optimal for the whole horizon.
+    """
+    fixed = dict(fixed or {})
+    if any(name not in fixed for name in names):
+        _, values = backends.solve(problem, backend)
+        for name in names:
+            fixed.setdefault(name, float(values[problem.family(name)]))
+    return {name: float(fixed[name]) for name in names}
+
+
+def _window_model(build, window, prices, demand, fixed, backend, output_flag, threads):
+    """
+    Persistent model of one window with the first stage variables fixed and the final storage level free (st <= inf).
+    """
+    problem = build(prices[:window], demand[:window])
+    problem = backends.fix_binaries(problem, problem.family('u_st').ravel(), [fixed['u_st']])
+    for name, value in fixed.items():
+        problem.lb[problem.family(name)] = problem.ub[problem.family(name)] = value
+
+    rows = _rows(window)
+    problem.sense = problem.sense.copy()
+    problem.rhs = problem.rhs.copy()
+    problem.sense[rows['final']] = '<'
+    problem.rhs[rows['final']] = np.inf
+
+    return problem, backends.persistent_model(problem, backend, output_flag, threads)
+
+
+def _rolling(build, first_stage, forecasting_since, forecasting_till, window, prices, demand, fixed,
+             price_forecasts, demand_forecasts, backend, output_flag, threads):
+    dates = prices.index if isinstance(prices, pd.Series) else None
+    prices, demand = matrix_models.horizon_arrays(forecasting_since, forecasting_till, prices, demand)
+    horizon = prices.shape[0]
+    window = min(window, horizon)
+    if window < 2:
+        raise ValueError("window has to be at least 2 days")
+    steps = horizon - window + 1
+
+    # First stage decisions, fixed in all the windows
+    full = build(prices, demand)
+    fixed = _first_stage(full, first_stage, fixed, backend)
+
+    problem, model = _window_model(build, window, prices, demand, fixed, backend, output_flag, threads)
+    rows = _rows(window)
+    g_spot, st, st_in, st_out = (problem.family(name) for name in ('g_spot', 'st', 'st_in', 'st_out'))
+
+    realized = {name: np.zeros(horizon) for name in ('g_spot', 'st', 'st_in', 'st_out', 'seconds')}
+    level = 0.0
+    for step in range(steps):
+        prices_window = prices[step:step + window] if price_forecasts is None else np.asarray(price_forecasts[step], dtype = float)
+        demand_window = demand[step:step + window] if demand_forecasts is None else np.asarray(demand_forecasts[step], dtype = float)
+
+        start = timer.perf_counter()
+        c = problem.c.copy()
+        c[g_spot] = prices_window
+        model.set_objective(c)
+        model.set_rhs(np.concatenate([rows['balance'], [rows['initial'], rows['final']]]),
+                      np.concatenate([demand_window, [level, 0.0 if step == steps - 1 else np.inf]]))
+        _, values = model.solve()
+        seconds = timer.perf_counter() - start
+
+        # Decisions of the first day (of all the days in the last window) are realized
+        days = slice(0, window if step == steps - 1 else 1)
+        for name, index in (('g_spot', g_spot), ('st', st), ('st_in', st_in), ('st_out', st_out)):
+            realized[name][step + days.start:step + days.stop] = values[index[days]]
+        realized['seconds'][step + days.start:step + days.stop] = seconds
+        level = values[st[0]] + values[st_in[0]] - values[st_out[0]]
+
+        if output_flag:
+            print("Step %d: %f s" % (step, seconds))
+
+    # Objective of the whole horizon for the realized decisions (with the real prices)
+    x = np.zeros(full.num_vars)
+    for name, value in fixed.items():
+        x[full.family(name)] = value
+    for name in ('g_spot', 'st', 'st_in', 'st_out'):
+        x[full.family(name)] = realized[name]
+    result_optimization = full.c @ x + full.constant + (x @ (full.Q @ x) if full.Q is not None else 0.0)
+
+    plan = pd.DataFrame(realized)
+    plan.insert(0, 'price', prices)
+    plan.insert(1, 'demand', demand)
+    plan['cost'] = plan['g_spot'] * plan['price']
+    if dates is not None:
+        plan.index = dates[:horizon]
+
+    return result_optimization, plan, fixed
+
+
+def deterministic(forecasting_since, forecasting_till, window, storage_bid, storage_parameters, prices, demand, fixed = None,
+                  price_forecasts = None, demand_forecasts = None, backend = 'gurobi', output_flag = False, threads = None):
+    """
+    This function will dispatch the storage of optimization.deterministic day by day, with:
+    - window - number of days planned every day,
+    - fixed - values of st_max and u_st (default - optimal for the whole horizon, as in optimization.deterministic),
+    - price_forecasts, demand_forecasts - arrays (steps, window), row k known when the window starting on day k is planned
+      (default - real prices and demand, i.e. perfect foresight within the window).
+    The other parameters are the same as in optimization.deterministic.
+
+    Returns objective value of the realized decisions, table of the realized decisions with solve time of every step
+    (seconds, the same for all the days of the last window) and the fixed first stage decisions.
+    """
+    def build(prices, demand):
+        return matrix_models.deterministic_problem(storage_bid, storage_parameters, prices, demand)
+
+    return _rolling(build, ['st_max', 'u_st'], forecasting_since, forecasting_till, window, prices, demand, fixed,
+                    price_forecasts, demand_forecasts, backend, output_flag, threads)
+
+
+def additional_flexibility(forecasting_since, forecasting_till, window, st_max, storage_bid, storage_parameters, limit_trading, prices, demand, fixed = None,
+                           price_forecasts = None, demand_forecasts = None, backend = 'gurobi', output_flag = False, threads = None):
+    """
+    This function will dispatch the storage of optimization.additional_flexibility day by day, with
+    st_in_additional, st_out_additional and u_st fixed (fixed, default - optimal for the whole horizon).
+    The other parameters are the same as in deterministic and optimization.additional_flexibility.
+    """
+    def build(prices, demand):
+        return matrix_models.additional_flexibility_problem(st_max, storage_bid, storage_parameters, limit_trading, prices, demand)
+
+    return _rolling(build, ['st_in_additional', 'st_out_additional', 'u_st'], forecasting_since, forecasting_till, window, prices, demand, fixed,
+                    price_forecasts, demand_forecasts, backend, output_flag, threads)
@@ -0,0 +1,172 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import matrix_models
+from src.analysis.scenario_tree import ScenarioTree
+
+# Scenario reduction before stochastic optimization.
+# Number of scenarios in stochastic() is the product of numbers of GPN price paths, WD price paths, demand paths
+# and within-day demand samples. Every set of paths is reduced here to a smaller set of its own paths with new
+# probabilities (probability of a removed path goes to the nearest kept one), so the number of scenarios (and the
+# time of solving) can be chosen deliberately, knowing the error of the approximation.
+# Error is the Kantorovich distance between the original and the reduced distribution (mean distance from a path to
+# the kept path replacing it), relative error divides it by the mean distance from the paths to their mean.
+
+Reduction = namedtuple('Reduction', ['indices', 'probabilities', 'error', 'relative_error'])
+
+# Above this number of paths 'auto' uses k-medoids, as forward selection needs the full distance matrix
+MAX_FORWARD_PATHS = 3000
+
+
+def _distances(paths_1, paths_2):
+    """
+    Euclidean distances between all the paths (rows) of paths_1 and paths_2.
+    """
+    squared = (paths_1 ** 2).sum(axis = 1)[:, None] + (paths_2 ** 2).sum(axis = 1)[None, :] - 2 * paths_1 @ paths_2.T
+    return np.sqrt(np.maximum(squared, 0))
+
+
+def _nearest(paths, centres, chunk = 2048):
+    """
+    Returns index of the nearest centre and distance to it for every path. Paths are processed in chunks,
+    so the distance matrix of all the paths is never created.
+    """
+    nearest = np.empty(paths.shape[0], dtype = int)
+    distance = np.empty(paths.shape[0])
+    for start in range(0, paths.shape[0], chunk):
+        d = _distances(paths[start:start + chunk], centres)
+        nearest[start:start + chunk] = d.argmin(axis = 1)
+        distance[start:start + chunk] = d[np.arange(d.shape[0]), nearest[start:start + chunk]]
+    return nearest, distance
+
+
+def _forward_selection(paths, n_scenarios, probabilities):
+    """
+    Fast forward selection - in every step adds the path, which decreases the error the most.
+    """
+    distances = _distances(paths, paths).astype(np.float32)
+    selected = []
+    current = np.full(paths.shape[0], np.inf, dtype = np.float32)
+    available = np.ones(paths.shape[0], dtype = bool)
+    for _ in range(n_scenarios):
+        errors = probabilities @ np.minimum(current[:, None], distances)
+        errors[~available] = np.inf
+        best = int(errors.argmin())
+        selected.append(best)
+        available[best] = False
+        current = np.minimum(current, distances[:, best])
+    return np.array(selected)
+
+
+def _kmedoids(paths, n_scenarios, probabilities, iterations, seed):
+    """
+    Weighted k-means (with k-means++ initialization) on the paths, followed by choosing the medoid - the path
+    nearest to the centre - of every cluster. Works in chunks, so it is used for large numbers of paths.
+    """
+    rng = np.random.default_rng(seed)
+
+    # k-means++ initialization
+    centres = [rng.choice(paths.shape[0], p = probabilities)]
+    distance = _distances(paths, paths[centres]).ravel()
+    for _ in range(1, n_scenarios):
+        weights = probabilities * distance ** 2
+        if weights.sum() == 0:
+            break
+        centres.append(rng.choice(paths.shape[0], p = weights / weights.sum()))
+        distance = np.minimum(distance, _distances(paths, paths[[centres[-1]]]).ravel())
+    centres = paths[centres]
+
+    for _ in range(iterations):
+        nearest, _ = _nearest(paths, centres)
+        mass = np.bincount(nearest, weights = probabilities, minlength = centres.shape[0])
+        sums = np.zeros_like(centres)
+        np.add.at(sums, nearest, probabilities[:, None] * paths)
+        updated = np.where(mass[:, None] > 0, sums / np.maximum(mass, 1e-300)[:, None], centres)
+        if np.allclose(updated, centres):
+            break
+        centres = updated
+
+    # Medoids - paths nearest to the centres
+    nearest, _ = _nearest(paths, centres)
+    medoids = []
+    for cluster in np.unique(nearest):
+        members = np.flatnonzero(nearest == cluster)
+        medoids.append(members[_distances(paths[members], centres[[cluster]]).ravel().argmin()])
+    return np.array(medoids)
+
+
+def reduce_paths(paths, n_scenarios, probabilities = None, method = 'auto', iterations = 50, seed = 0):
+    """
+    This function will choose n_scenarios of the paths (rows of paths) representing all of them:
+    - method 'forward' - fast forward selection, exact but with the distance matrix of all the paths in memory,
+    - method 'kmedoids' - weighted k-means and medoids of the clusters, for large numbers of paths,
+    - method 'auto' - 'forward' up to MAX_FORWARD_PATHS paths, 'kmedoids' above.
+    probabilities of the paths default to equal ones.
+
+    Returns Reduction with indices of the chosen paths, their new probabilities (sum of probabilities
+    of the paths nearest to them), error and relative error of the approximation.
+    """
+    paths = np.asarray(paths, dtype = float).reshape(len(paths), -1)
+    n = paths.shape[0]
+    probabilities = np.full(n, 1 / n) if probabilities is None else np.asarray(probabilities, dtype = float) / np.sum(probabilities)
+
+    if n_scenarios >= n:
+        indices = np.arange(n)
+    elif method == 'forward' or (method == 'auto' and n <= MAX_FORWARD_PATHS):
+        indices = _forward_selection(paths, n_scenarios, probabilities)
+    elif method in ('kmedoids', 'auto'):
+        indices = _kmedoids(paths, n_scenarios, probabilities, iterations, seed)
+    else:
+        raise ValueError("Unknown method %r, use 'auto', 'forward' or 'kmedoids'" % method)
+
+    # Redistribution - every path gives its probability to the nearest chosen one
+    nearest, distance = _nearest(paths, paths[indices])
+    reduced = np.bincount(nearest, weights = probabilities, minlength = indices.shape[0])
+    error = float(np.dot(probabilities, distance))
+
+    spread = float(np.dot(probabilities, _nearest(paths, (probabilities @ paths)[None, :])[1]))
+    relative_error = error / spread if spread > 0 else 0.0
+
+    return Reduction(indices, reduced, error, relative_error)
+
+
+def reduce_scenarios(forecasting_since, forecasting_till, prices_GPN, prices_WD, demand, demand_WD,
+                     paths_GPN, paths_WD, paths_demand, samples_WD = None, method = 'auto', seed = 0):
+    """
+    This function will reduce the inputs of optimization.stochastic (and additional_flexibility_stochastic):
+    - prices_GPN to paths_GPN paths,
+    - prices_WD to paths_WD paths,
+    - demand (together with its demand_WD) to paths_demand paths,
+    - within-day samples of demand_WD to samples_WD samples (default - all of them are kept).
+    Only the forecasting horizon (from forecasting_since to forecasting_till) of the paths is compared.
+
+    Returns reduced prices_GPN, prices_WD, demand and demand_WD (as NumPy arrays), ScenarioTree with the new probabilities
+    and table with the error of every reduction. The first five are passed to stochastic directly, e.g.
+        prices_GPN, prices_WD, demand, demand_WD, tree, errors = reduce_scenarios(since, till, prices_GPN, prices_WD, demand, demand_WD, 5, 5, 5)
+        stochastic(since, till, storage_bid, storage_parameters, prices_GPN, prices_WD, demand, demand_WD, tree = tree)
+    """
+    prices_GPN, prices_WD, demand, demand_WD = matrix_models.stochastic_arrays(forecasting_since, forecasting_till, prices_GPN, prices_WD, demand, demand_WD)
+
+    reductions = {'GPN': reduce_paths(prices_GPN, paths_GPN, method = method, seed = seed),
+                  'WD': reduce_paths(prices_WD, paths_WD, method = method, seed = seed),
+                  'demand': reduce_paths(demand, paths_demand, method = method, seed = seed)}
+    demand_WD = demand_WD[reductions['demand'].indices]
+
+    # Sample l is the path of within-day demand of all the (chosen) demand paths
+    samples = np.moveaxis(demand_WD, 2, 0).reshape(demand_WD.shape[2], -1)
+    reductions['samples'] = reduce_paths(samples, samples.shape[0] if samples_WD is None else samples_WD, method = method, seed = seed)
+    demand_WD = demand_WD[:, :, reductions['samples'].indices]
+
+    tree = ScenarioTree.product(reductions['GPN'].indices.shape[0], reductions['WD'].indices.shape[0],
+                                reductions['demand'].indices.shape[0], reductions['samples'].indices.shape[0],
+                                reductions['GPN'].probabilities, reductions['WD'].probabilities,
+                                reductions['demand'].probabilities, reductions['samples'].probabilities)
+
+    errors = pd.DataFrame([{'paths': name, 'original': paths.shape[0], 'reduced': reduction.indices.shape[0],
+                            'error': reduction.error, 'relative_error': reduction.relative_error}
+                           for (name, reduction), paths in zip(reductions.items(), (prices_GPN, prices_WD, demand, samples))])
+
+    return (prices_GPN[reductions['GPN'].indices], prices_WD[reductions['WD'].indices], demand[reductions['demand'].indices],
+            demand_WD, tree, errors)
@@ -0,0 +1,97 @@
+import numpy as np
+
+
+class ScenarioTree:
+    """
+    Three-stage scenario tree of the stochastic models, stored in NumPy arrays:
+    - first stage - one root (decisions u_st and st_max),
+    - second stage (Day-ahead) - scenario a uses GPN price path GPN[a] and demand path demand[a], with probability probability_DA[a],
+    - third stage (Within-day) - scenario b is a child of DA scenario parent[b] and uses WD price path WD[b] and within-day
+      demand sample sample[b] (of its demand path), with unconditional probability probability_WD[b].
+    Children of every DA scenario are stored one after another, in the order of DA scenarios.
+    """
+
+    def __init__(self, GPN, demand, probability_DA, parent, WD, sample, probability_WD):
+        self.GPN = np.asarray(GPN)
+        self.demand = np.asarray(demand)
+        self.probability_DA = np.asarray(probability_DA, dtype = float)
+        self.parent = np.asarray(parent)
+        self.WD = np.asarray(WD)
+        self.sample = np.asarray(sample)
+        self.probability_WD = np.asarray(probability_WD, dtype = float)
+
+    @classmethod
+    def product(cls, paths_GPN, paths_WD, paths_demand, samples_WD, weights_GPN = None, weights_WD = None, weights_demand = None, weights_samples = None):
+        """
+        Tree of all combinations of the paths, as in optimization.stochastic: DA scenario a = paths_demand * i + j
+        of GPN path i and demand path j, WD scenario b = samples_WD * (paths_WD * a + k) + l of WD path k and sample l.
+        Probability of a scenario is the product of weights of its paths (default - equal weights).
+        """
+        def normalized(weights, n):
+            weights = np.ones(n) if weights is None else np.asarray(weights, dtype = float)
+            return weights / weights.sum()
+
+        weights_GPN = normalized(weights_GPN, paths_GPN)
+        weights_WD = normalized(weights_WD, paths_WD)
+        weights_demand = normalized(weights_demand, paths_demand)
+        weights_samples = normalized(weights_samples, samples_WD)
+
+        scenarios_DA = paths_GPN * paths_demand
+        GPN = np.repeat(np.arange(paths_GPN), paths_demand)
+        demand = np.tile(np.arange(paths_demand), paths_GPN)
+        parent = np.repeat(np.arange(scenarios_DA), paths_WD * samples_WD)
+        WD = np.tile(np.repeat(np.arange(paths_WD), samples_WD), scenarios_DA)
+        sample = np.tile(np.arange(samples_WD), scenarios_DA * paths_WD)
+
+        probability_DA = weights_GPN[GPN] * weights_demand[demand]
+        probability_WD = probability_DA[parent] * weights_WD[WD] * weights_samples[sample]
+
+        return cls(GPN, demand, probability_DA, parent, WD, sample, probability_WD)
+
+    @property
+    def scenarios_DA(self):
+        return self.GPN.shape[0]
+
+    @property
+    def scenarios_WD(self):
+        return self.parent.shape[0]
+
+    def children(self, a):
+        """
+        Returns slice of WD scenarios of DA scenario a.
+        """
+        return slice(np.searchsorted(self.parent, a, side = 'left'), np.searchsorted(self.parent, a, side = 'right'))
+
+    def subtree(self, a):
+        """
+        Tree of DA scenario a only (with probability 1) and its WD scenarios (with conditional probabilities).
+        Indices of the paths are not changed, so the subtree is used with the same price and demand arrays.
+        """
+        children = self.children(a)
+        return ScenarioTree(self.GPN[[a]], self.demand[[a]], [1.0], np.zeros(children.stop - children.start, dtype = int),
+                            self.WD[children], self.sample[children], self.probability_WD[children] / self.probability_DA[a])
+
+    def model_size(self, time, first_stage = 2, capacity_terms = 1):
+        """
+        Expected size of the stochastic model of this tree, computed before building anything:
+        rows, columns, nonzeros of the constraint matrix, memory of the built MatrixProblem and peak memory of building it (bytes).
+        first_stage is the number of first stage variables (2 in stochastic, 3 in additional_flexibility_stochastic), capacity_terms
+        the number of them in the capacity constraint (1 in stochastic - st_max, 0 in additional_flexibility_stochastic).
+        """
+        scenarios_DA, scenarios_WD = self.scenarios_DA, self.scenarios_WD
+
+        # balance, capacity, injection, withdrawal (time), first and last storage level, flow (time - 1), DA withdrawal in the last day
+        rows = scenarios_DA * (5 * time + 2) + scenarios_WD * (5 * time + 1)
+        columns = first_stage + 4 * time * (scenarios_DA + scenarios_WD)
+        flow = 2 + 4 * (time - 1)
+        nonzeros = (scenarios_DA * (time * (3 + 1 + capacity_terms + 2 + 2) + flow + 1)
+                    + scenarios_WD * (time * (5 + 1 + capacity_terms + 2 + 2) + flow))
+        # u_st * st_in_WD, and u_st * st_max if st_max is a variable
+        quadratic = scenarios_WD * time + capacity_terms
+
+        # CSR matrices (float64 data, int32 indices) and float64/unicode vectors of MatrixProblem
+        memory = (nonzeros + quadratic) * 12 + (rows + 2 * columns + 2) * 4 + columns * (3 * 8 + 4) + rows * (8 + 4)
+        # Triplets (int64 rows, int64 columns, float64 values) are kept until the CSR matrix is created
+        build_memory = memory + nonzeros * 24
+
+        return {'rows': rows, 'columns': columns, 'nonzeros': nonzeros, 'memory': memory, 'build_memory': build_memory}
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+
+from src.analysis import forecasting
+
+# Monte Carlo paths of prices and demand from fitted SARIMAX models (see forecasting.py), for the stochastic models.
+# SARIMAX is a linear Gaussian state-space model with time-invariant matrices:
+#     y[t] = d + Z a[t] + e[t],  a[t+1] = c + T a[t] + R n[t],  e ~ N(0, H), n ~ N(0, Q),
+# so all the paths are simulated at the same time - one matrix product per day for the (paths, states) array,
+# starting from the distribution of the state after the last observation.
+# One step of the model is one observation of the series (trading days - no weekends and public holidays), so the
+# simulated steps are dated with the dates of the series or, after its last date, with business days.
+
+
+def _square_root(covariance):
+    """
+    Matrix S with S S' = covariance, for positive semi-definite (possibly singular) covariance.
+    """
+    values, vectors = np.linalg.eigh(covariance)
+    return vectors * np.sqrt(np.clip(values, 0, None))
+
+
+def simulate(model_fit, horizon, n_paths, seed = None):
+    """
+    This function will simulate n_paths paths of the next horizon observations after the data of model_fit
+    (fitted SARIMAX results, e.g. forecasting.fit_sarimax), with random generator seeded with seed.
+    Returns NumPy array (n_paths, horizon).
+    """
+    rng = np.random.default_rng(seed)
+    results = model_fit.filter_results
+
+    Z = results.design[0, :, 0]
+    d = results.obs_intercept[0, 0]
+    H = results.obs_cov[0, 0, 0]
+    T = results.transition[:, :, 0]
+    c = results.state_intercept[:, 0]
+    R = results.selection[:, :, 0]
+    Q = results.state_cov[:, :, 0]
+
+    # State after the last observation
+    state = results.predicted_state[:, -1] + rng.standard_normal((n_paths, T.shape[0])) @ _square_root(results.predicted_state_cov[:, :, -1]).T
+
+    # All the shocks are drawn at once, state shocks are mapped to the states by R
+    shocks = rng.standard_normal((horizon, n_paths, Q.shape[0])) @ (R @ _square_root(Q)).T
+    noise = rng.standard_normal((horizon, n_paths)) * np.sqrt(max(H, 0))
+
+    paths = np.empty((n_paths, horizon))
+    for t in range(horizon):
+        paths[:, t] = d + state @ Z + noise[t]
+        state = c + state @ T.T + shocks[t]
+
+    return paths
+
+
+def forecast_dates(series, data_till, forecasting_till):
+    """
+    Dates of the steps of the model after data_till up to forecasting_till: dates of the series where it covers
+    the period, business days (Monday - Friday) after its last date.
+    """
+    data_till, forecasting_till = pd.to_datetime(data_till), pd.to_datetime(forecasting_till)
+    index = pd.DatetimeIndex(series.index)
+    dates = index[(index > data_till) & (index <= forecasting_till)]
+    last = max(index.max(), data_till) if len(index) else data_till
+    return dates.append(pd.bdate_range(last + pd.Timedelta(days = 1), forecasting_till))
+
+
+def simulate_forecast(gas_data,
+                      n_paths,
+                      data_since = '2012-01-01',
+                      data_till = '2012-12-31',
+                      forecasting_since = '2013-01-01',
+                      forecasting_till = '2013-04-01',
+                      ARIMA_order = (3,1,3),
+                      ARIMA_season_order = (2,2,3,7),
+                      seed = None,
+                      cache = None
+                      ):
+    """
+    This function will fit the model of forecast_prices (with the same parameters) and simulate n_paths paths
+    of the observations from forecasting_since to forecasting_till (dated as in forecast_dates).
+    Returns DataFrame with one path per row and dates as columns.
+    """
+    data_till = pd.to_datetime(data_till)
+    forecasting_since = pd.to_datetime(forecasting_since)
+    forecasting_till = pd.to_datetime(forecasting_till)
+
+    series = gas_data.loc[pd.to_datetime(data_since):data_till]
+    model_fit = forecasting.fit_sarimax(series, ARIMA_order, ARIMA_season_order, cache)
+
+    # The steps between the data and the forecast are simulated too, and dropped
+    dates = forecast_dates(gas_data, data_till, forecasting_till)
+    offset = int((dates < forecasting_since).sum())
+    paths = simulate(model_fit, len(dates), n_paths, seed)
+    return pd.DataFrame(paths[:, offset:], columns = dates[offset:])
+
+
+def within_day_samples(demand, samples, sigma, seed = None):
+    """
+    Creates samples of within-day demand of every demand path (NumPy array (paths, time)) - the path with Gaussian
+    deviations of standard deviation sigma (e.g. standard deviation of the residuals of the demand model).
+    Returns NumPy array (paths, time, samples), demand_WD of stochastic.
+    """
+    rng = np.random.default_rng(seed)
+    demand = np.asarray(demand, dtype = float)
+    return demand[:, :, None] + sigma * rng.standard_normal(demand.shape + (samples,))
+
+
+def to_stochastic_inputs(forecasting_since, prices_GPN, prices_WD, demand, demand_WD):
+    """
+    Converts simulated paths (NumPy arrays (paths, time) or DataFrames of simulate_forecast, demand_WD (demand paths,
+    time, samples)) to the inputs of optimization.stochastic: DataFrames with one path per row and days as columns,
+    demand_WD with the array of the within-day samples in every cell.
+    Columns are the dates of prices_GPN if it is a DataFrame, otherwise consecutive days from forecasting_since.
+    """
+    if isinstance(prices_GPN, pd.DataFrame):
+        days = pd.DatetimeIndex(prices_GPN.columns)
+    else:
+        days = pd.date_range(pd.to_datetime(forecasting_since), periods = np.shape(prices_GPN)[1], freq = 'D')
+    prices_GPN, prices_WD, demand = (np.asarray(paths, dtype = float) for paths in (prices_GPN, prices_WD, demand))
+    demand_WD = np.asarray(demand_WD, dtype = float)
+
+    cells = np.empty(demand_WD.shape[:2], dtype = object)
+    for index in np.ndindex(*cells.shape):
+        cells[index] = demand_WD[index]
+
+    return (pd.DataFrame(prices_GPN, columns = days), pd.DataFrame(prices_WD, columns = days),
+            pd.DataFrame(demand, columns = days), pd.DataFrame(cells, columns = days))
@@ -0,0 +1,132 @@
+import copy
+import os
+import time as timer
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.analysis import backends
+from src.analysis import matrix_models
+
+# Bid curve of the storage - deterministic model solved for many values of storage_bid (and price_injection).
+# The model is built once per worker, only the objective coefficients are changed between the points
+# and every solve is warm-started from the previous one. Chunks of the grid are solved in a process pool.
+# With formulation 'split' there is one LP model per value of u_st, with 'mccormick' one linearized model (see backends.py).
+
+
+def _objective(problem, storage_bid, price_injection):
+    """
+    Objective of deterministic_problem built with storage_bid = 0 and price_injection = 1:
+    storage_bid * st_max + (u_st * st_in.sum() + (1 - u_st) * st_max) * price_injection + trading costs.
+    """
+    c = problem.c.copy()
+    c[problem.family('st_max')] = storage_bid + price_injection
+    return c, problem.Q * price_injection
+
+
+def _solve_bilinear(problem, backend, threads):
+    model = backends.persistent_model(problem, backend, threads = threads)
+    current_injection = None
+
+    def solve(storage_bid, price_injection):
+        nonlocal current_injection
+        c, Q = _objective(problem, storage_bid, price_injection)
+        if price_injection == current_injection:
+            model.set_objective(c)
+        else:
+            model.set_objective(c, Q)
+            current_injection = price_injection
+        return model.solve()
+
+    return solve
+
+
+def _solve_split(problem, backend, threads):
+    u_st = problem.family('u_st').ravel()
+    models = {value: backends.persistent_model(backends.fix_binaries(problem, u_st, [value]), backend, threads = threads) for value in (0.0, 1.0)}
+
+    def solve(storage_bid, price_injection):
+        c, Q = _objective(problem, storage_bid, price_injection)
+        objective = copy.copy(problem)
+        objective.c, objective.Q = c, Q
+        results = []
+        for value, model in models.items():
+            # Products with the fixed u_st are linear, the constant does not change (there are no products of two binaries)
+            model.set_objective(backends.fix_binaries(objective, u_st, [value]).c)
+            results.append(model.solve())
+        return min(results, key = lambda result: result[0])
+
+    return solve
+
+
+def _solve_mccormick(problem, backend, threads):
+    linear = backends.mccormick(problem)
+    model = backends.persistent_model(linear, backend, threads = threads)
+    products = problem.Q.tocoo().data
+
+    def solve(storage_bid, price_injection):
+        c, _ = _objective(problem, storage_bid, price_injection)
+        model.set_objective(np.concatenate([c, products * price_injection]))
+        result_optimization, values = model.solve()
+        return result_optimization, values[:problem.num_vars]
+
+    return solve
+
+
+def _solve_chunk(storage_parameters, prices, demand, grid, backend, threads, formulation = 'bilinear'):
+    """
+    Solves one chunk of (storage_bid, price_injection) grid with one model (two with formulation 'split').
+    """
+    storage_parameters = tuple(storage_parameters)
+    problem = matrix_models.deterministic_problem(0, storage_parameters[:3] + (1,) + storage_parameters[4:], prices, demand)
+    solvers = {'bilinear': _solve_bilinear, 'split': _solve_split, 'mccormick': _solve_mccormick}
+    if formulation not in solvers:
+        raise ValueError("Unknown formulation %r, use one of %s" % (formulation, backends.FORMULATIONS))
+    solve = solvers[formulation](problem, backend, threads)
+    st_max = problem.family('st_max')
+    u_st = problem.family('u_st')
+
+    results = []
+    for storage_bid, price_injection in grid:
+        start = timer.perf_counter()
+        result_optimization, values = solve(storage_bid, price_injection)
+        results.append({'storage_bid': storage_bid, 'price_injection': price_injection,
+                        'st_max': values[st_max], 'u_st': values[u_st], 'objective': result_optimization,
+                        'seconds': timer.perf_counter() - start})
+
+    return results
+
+
+def storage_bid_sweep(forecasting_since, forecasting_till, storage_bids, storage_parameters, prices, demand,
+                      price_injections = None, backend = 'gurobi', processes = None, threads = 1, formulation = 'bilinear'):
+    """
+    This function will optimize storage capacity (as deterministic function) for every storage bid in storage_bids and,
+    if price_injections are given, for every combination of storage bid and price of injection.
+    The other parameters are the same as in deterministic (price_injection from storage_parameters is used if price_injections is None).
+    processes defines number of worker processes (default - number of CPUs, 1 - no pool), threads number of solver threads in each of them.
+    formulation defines how the payment term u_st * st_in.sum() is solved (see backends.FORMULATIONS) - 'split' and 'mccormick' solve only LPs/MILPs.
+
+    Returns bid curve table with st_max, u_st and objective value for every point, and time of solving it (in seconds)
+    (empty table if storage_bids or price_injections are empty).
+    """
+    prices, demand = matrix_models.horizon_arrays(forecasting_since, forecasting_till, prices, demand)
+    if price_injections is None:
+        price_injections = [storage_parameters[3]]
+
+    # Points with the same price of injection are solved one after another, so only st_max coefficient changes
+    grid = [(float(storage_bid), float(price_injection)) for price_injection in price_injections for storage_bid in storage_bids]
+    if not grid: # no storage bids or prices of injection - nothing to solve
+        return pd.DataFrame(columns = ['storage_bid', 'price_injection', 'st_max', 'u_st', 'objective', 'seconds'])
+
+    processes = processes or os.cpu_count()
+    chunks = [chunk.tolist() for chunk in np.array_split(np.array(grid), min(processes, len(grid))) if len(chunk) > 0]
+
+    if len(chunks) == 1:
+        results = [_solve_chunk(storage_parameters, prices, demand, chunks[0], backend, threads, formulation)]
+    else:
+        with ProcessPoolExecutor(max_workers = len(chunks)) as executor:
+            futures = [executor.submit(_solve_chunk, storage_parameters, prices, demand, chunk, backend, threads, formulation) for chunk in chunks]
+            results = [future.result() for future in futures]
+
+    return pd.DataFrame([row for chunk in results for row in chunk])
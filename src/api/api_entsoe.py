@@ -1,13 +1,13 @@
-import requests
-import xmltodict
-import pandas as pd
-from datetime import timedelta
 import configparser
 import os
 
+from src.api.entsoe_client import EntsoeClient
+from src.api.http_cache import ResponseCache
+from src.data.store import TimeSeriesStore
+
 # CONFIG
 config = configparser.ConfigParser()
-api_filename = os.path.dirname(os.path.dirname(os.getcwd())) + "\\api.cfg"
+api_filename = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "api.cfg")
 config.read(api_filename)
 
 processtype = {
@@ -85,16 +85,15 @@ FINAL EXAMPLE:
 if __name__ == "__main__":
     """
     To run the script,:
-    - go to the entsoe_api dir,
-    - run "python api_entsoe.py"
+    - go to the main dir of the repository,
+    - run "python -m src.api.api_entsoe"
     
     App ID is required, which needs to be received from ENTSO-E after requested.
 
-    Output: csv file to be analysed, saved in 'data/outputs' directory.
+    Output: data appended to the time series store in 'data/store' directory (see src/data/store.py).
     """
 
     APP_ID = list(config['ENTSOE'].values())[0]
-    PATH = 'https://transparency.entsoe.eu/api?securityToken='
 
     START_TIME = 201512312300
     END_TIME = 201912312300
@@ -102,19 +101,10 @@ if __name__ == "__main__":
     DOCUMENT_TYPE = 'A75'
     PROCESS_TYPE = 'A16'
 
-    FINAL_STRING = f'{PATH}{APP_ID}&documentType={DOCUMENT_TYPE}&processType={PROCESS_TYPE}&in_Domain={ZONE}&periodStart={START_TIME}&periodEnd={END_TIME}'
-
-    response = requests.get(FINAL_STRING)
-    o = xmltodict.parse(response.content)
-
-    time_indices = []
-    values = []
-    for i in (o['GL_MarketDocument']['TimeSeries']):
-        for j in (i['Period']['Point']):
-            j_index = pd.to_datetime(i['Period']['timeInterval']['start']) + timedelta(hours = int(j['position']))
-            j_value = int(j['quantity'])
-            time_indices.append(j_index)
-            values.append(j_value)
+    # Period is downloaded in yearly chunks, concurrently (see entsoe_client.py)
+    # Responses are cached in data/http_cache (see http_cache.py)
+    with EntsoeClient(APP_ID, cache = ResponseCache()) as client:
+        final_data = client.fetch(DOCUMENT_TYPE, ZONE, START_TIME, END_TIME, processType = PROCESS_TYPE)
 
-    final_data = pd.DataFrame(index = time_indices, data = values)
-    final_data.to_csv(f'./data/cleaned/{DOCUMENT_TYPE}_{PROCESS_TYPE}_{ZONE}_{START_TIME}_{END_TIME}.csv')
+    final_data['process_type'] = PROCESS_TYPE
+    TimeSeriesStore().append(final_data, 'entsoe', DOCUMENT_TYPE, ZONE)
@@ -1,39 +1,56 @@
 import requests
 import configparser
+import json
 import os
 
+from src.api.http_cache import ResponseCache
+
+BASE_URL = 'https://openexchangerates.org/api'
+
+
+def fetch_json(endpoint, app_id, params = None, cache = None, session = None, base_url = BASE_URL, timeout = 60):
+    """
+    Response of endpoint (e.g. 'latest.json', 'time-series.json') of Open Exchange Rates with params, as dictionary.
+    cache - ResponseCache of the responses (see http_cache.py; app_id is not part of its key), None - always downloaded.
+    """
+    url = f'{base_url}/{endpoint}'
+    params = dict(params or {})
+
+    def download():
+        response = (session or requests).get(url, params = dict(params, app_id = app_id), timeout = timeout)
+        response.raise_for_status()
+        return response.content
+
+    content = download() if cache is None else cache.get_or_fetch(url, params, download)
+    return json.loads(content)
+
 
 if __name__ == '__main__':
     """
     This script is just to make sure that config and connection to some API works.
+    Run from the main dir of the repository: "python -m src.api.api_openexchangerates".
     """
     # CONFIG
     config = configparser.ConfigParser()
-    api_filename = os.path.dirname(os.path.dirname(os.getcwd())) + "\\api.cfg"
+    api_filename = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "api.cfg")
     config.read(api_filename)
 
 
     APP_ID = list(config['EXCHANGE'].values())[0]
 
+    # Responses are cached in data/http_cache (see http_cache.py)
+    cache = ResponseCache()
+
     # # Time series
-    # ENDPOINT = 'https://openexchangerates.org/api/time-series.json'
     # START_DATE = '2019-01-01'
     # END_DATE = '2020-01-01'
     # BASE = 'PLN'
     # SYMBOLS = 'EUR, DKK, USD'
 
-    # response = requests.get(f'{ENDPOINT}?app_id={APP_ID}&start={START_DATE}&end={END_DATE}&base={BASE}&symbols={SYMBOLS}&prettyprint=1')
-    # print(response)
-
-    # exchange_rates = response.json()['rates']
+    # exchange_rates = fetch_json('time-series.json', APP_ID, {'start': START_DATE, 'end': END_DATE, 'base': BASE,
+    #                                                          'symbols': SYMBOLS}, cache)['rates']
     # print(exchange_rates['2019-01-01'])
 
     # Latest
-    ENDPOINT = 'https://openexchangerates.org/api/latest.json'
-    SYMBOLS = 'EUR, DKK, USD, PLN'
-
-    response = requests.get(f'{ENDPOINT}?app_id={APP_ID}')
-    print(response)
-
-    exchange_rates = response.json()['rates']
+    exchange_rates = fetch_json('latest.json', APP_ID, cache = cache)['rates']
     print(exchange_rates['PLN'], exchange_rates['DKK'])
@@ -0,0 +1,184 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.api.entsoe_parser import parse_document
+
+# Client of the ENTSO-E transparency platform API.
+# ENTSO-E limits the period of one request (one year for most of the documents), so a long period is split into chunks,
+# which are downloaded concurrently by a thread pool over one pooled session (connections are reused).
+# Requests are spaced to stay below the quota of the API (requests per minute); responses 429 and 5xx and failed
+# connections are retried with exponential backoff. The chunks are parsed and joined in their order.
+
+BASE_URL = 'https://transparency.entsoe.eu/api'
+
+# Format of periodStart / periodEnd (UTC)
+PERIOD_FORMAT = '%Y%m%d%H%M'
+
+# Statuses worth retrying
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def split_period(start, end, max_span = timedelta(days = 365)):
+    """
+    Splits period from start to end into consecutive chunks of at most max_span. Returns list of (start, end).
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    chunks = []
+    while start < end:
+        chunks.append((start, min(start + max_span, end)))
+        start = chunks[-1][1]
+    return chunks
+
+
+def to_period(timestamp):
+    """
+    Timestamp as periodStart / periodEnd parameter, e.g. 201512312300 (number or string).
+    """
+    if isinstance(timestamp, (int, str)) and len(str(timestamp)) == 12 and str(timestamp).isdigit():
+        return str(timestamp)
+    return parse_period(timestamp).strftime(PERIOD_FORMAT)
+
+
+def parse_period(value):
+    """
+    Inverse of to_period - timestamp in UTC without time zone (timestamps with time zone are converted to UTC).
+    """
+    if isinstance(value, (int, str)) and len(str(value)) == 12 and str(value).isdigit():
+        return pd.to_datetime(str(value), format = PERIOD_FORMAT)
+    value = pd.Timestamp(value)
+    return value.tz_convert('UTC').tz_localize(None) if value.tz is not None else value
+
+
+class RateLimiter:
+    """
+    Spaces calls of wait() (from any thread) at least 60 / requests_per_minute seconds apart.
+    """
+
+    def __init__(self, requests_per_minute = 400):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class EntsoeClient:
+    """
+    Client of the ENTSO-E API with security token token:
+        client = EntsoeClient(token)
+        data = client.fetch('A75', '10YPL-AREA-----S', 201512312300, 201912312300, processType = 'A16')
+    - base_url - address of the API (e.g. of a local test server),
+    - max_span - the longest period of one request,
+    - workers - number of concurrent requests (and size of the connection pool),
+    - requests_per_minute - quota of the API,
+    - retries, backoff - number of retries of a failed request and the first pause (in seconds, doubled every retry),
+    - timeout - timeout of one request (in seconds),
+    - parser - function parsing content of one response to a DataFrame with dates as index (see entsoe_parser.py),
+    - cache - ResponseCache of the responses (see http_cache.py), None - every request goes to the API.
+    """
+
+    def __init__(self,
+                 token,
+                 base_url = BASE_URL,
+                 max_span = timedelta(days = 365),
+                 workers = 4,
+                 requests_per_minute = 400,
+                 retries = 5,
+                 backoff = 1.0,
+                 timeout = 60,
+                 parser = parse_document,
+                 cache = None
+                 ):
+        self.token = token
+        self.base_url = base_url
+        self.max_span = max_span
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.parser = parser
+        self.cache = cache
+        self.limiter = RateLimiter(requests_per_minute)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections = workers, pool_maxsize = workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get(self, params):
+        """
+        Content of the response to one request with params (without the token), from the cache if possible.
+        """
+        if self.cache is None:
+            return self._download(params)
+        return self.cache.get_or_fetch(self.base_url, params, lambda: self._download(params))
+
+    def _download(self, params):
+        """
+        Content of the response of the API, with retries.
+        """
+        params = dict(params, securityToken = self.token)
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            try:
+                response = self.session.get(self.base_url, params = params, timeout = self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                retry_after = response.headers.get('Retry-After', '')
+                time.sleep(float(retry_after) if retry_after.isdigit() else self.backoff * 2 ** attempt)
+                continue
+            response.raise_for_status()
+            return response.content
+
+    def query(self, params, start, end):
+        """
+        Contents of the responses of all the chunks of the period from start to end, in order of the chunks.
+        """
+        chunks = split_period(parse_period(start), parse_period(end), self.max_span)
+        requests_params = [dict(params, periodStart = to_period(s), periodEnd = to_period(e)) for s, e in chunks]
+        if len(requests_params) == 1 or self.workers == 1:
+            return [self.get(p) for p in requests_params]
+        with ThreadPoolExecutor(max_workers = self.workers) as executor:
+            return list(executor.map(self.get, requests_params))
+
+    def fetch(self, document_type, zone, start, end, **params):
+        """
+        This function will download documentType document_type of the area zone (in_Domain) from start to end
+        (timestamps or numbers as 201512312300), with other parameters params (e.g. processType = 'A16').
+        Returns parsed chunks joined in order (points repeated at the borders of the chunks are kept once).
+        """
+        params = dict({'documentType': document_type, 'in_Domain': zone}, **params)
+        parts = [self.parser(content) for content in self.query(params, start, end)]
+        parts = [part for part in parts if len(part)]
+        if not parts:
+            return self.parser(b'<empty/>')
+        data = pd.concat(parts)
+        # The same point of the same TimeSeries (e.g. psr_type) returned by two chunks is kept once
+        keys = data.reset_index().drop(columns = 'value', errors = 'ignore')
+        return data[~keys.duplicated(keep = 'last').to_numpy()]
@@ -0,0 +1,117 @@
+import io
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+# Streaming parser of ENTSO-E documents (GL_MarketDocument, Publication_MarketDocument, ...).
+# The document is read with iterparse, element by element; every finished TimeSeries is removed from the tree,
+# so memory holds only the current TimeSeries and the arrays of the results, however large the response is.
+# Every Period is converted at once: time of the point = start + (position - 1) * resolution, with the resolution
+# declared by the Period (PT15M, PT30M, PT60M, ...). Curves of type A03 (a point only where the value changes)
+# are filled forward to all the positions of the Period.
+
+# Metadata of TimeSeries kept as columns (path of the element in TimeSeries -> column)
+METADATA = {
+    'businessType': 'business_type',
+    'MktPSRType/psrType': 'psr_type',
+    'inBiddingZone_Domain.mRID': 'in_bidding_zone',
+    'outBiddingZone_Domain.mRID': 'out_bidding_zone',
+    'in_Domain.mRID': 'in_domain',
+    'out_Domain.mRID': 'out_domain',
+    'quantity_Measure_Unit.name': 'unit',
+    'currency_Unit.name': 'currency',
+}
+
+# Elements with the value of a Point
+VALUES = ('quantity', 'price.amount')
+
+
+def _name(tag):
+    # Tag without namespace
+    return tag.rpartition('}')[2]
+
+
+def parse_resolution(resolution):
+    """
+    Resolution of a Period (ISO 8601 duration, e.g. PT15M, PT60M, P1D) as pd.Timedelta.
+    Months and years have no fixed length and are not supported.
+    """
+    if resolution.rstrip('0123456789').endswith(('M', 'Y')) and 'T' not in resolution:
+        raise ValueError("Resolution %s has no fixed length" % resolution)
+    return pd.Timedelta(resolution)
+
+
+def _period_arrays(start, end, resolution, positions, values, curve_type):
+    """
+    Times (int64 nanoseconds, UTC) and values of the points of one Period.
+    """
+    step = parse_resolution(resolution).value
+    positions = np.asarray(positions, dtype = np.int64)
+    values = np.asarray(values, dtype = float)
+    start = pd.Timestamp(start).value
+
+    if curve_type == 'A03' and end is not None:
+        # Points only where the value changes - every position takes the value of the last point before it
+        count = (pd.Timestamp(end).value - start) // step
+        order = np.argsort(positions)
+        positions, values = positions[order], values[order]
+        all_positions = np.arange(1, count + 1)
+        values = values[np.maximum(np.searchsorted(positions, all_positions, side = 'right') - 1, 0)]
+        positions = all_positions
+
+    return start + (positions - 1) * step, values
+
+
+def parse_document(source):
+    """
+    This function will parse ENTSO-E document source (bytes of the response, path or file object).
+    Returns DataFrame with times of the points (UTC) as index, column value and metadata of their TimeSeries
+    (business_type, psr_type, in_bidding_zone, ..., resolution; missing where the document has no such element).
+    Documents without TimeSeries (e.g. Acknowledgement_MarketDocument - no data) give an empty DataFrame.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    times, values, metadata = [], [], []
+    for _, element in ET.iterparse(source, events = ('end',)):
+        if _name(element.tag) != 'TimeSeries':
+            continue
+        ns = element.tag[:-len('TimeSeries')]
+
+        def find(path, parent = element):
+            return parent.findtext('/'.join(ns + part for part in path.split('/')))
+
+        labels = {column: find(path) for path, column in METADATA.items()}
+        curve_type = find('curveType')
+        for period in element.iter(ns + 'Period'):
+            points = period.findall(ns + 'Point')
+            positions = [int(point.findtext(ns + 'position')) for point in points]
+            value_tag = next((ns + tag for tag in VALUES if points and points[0].find(ns + tag) is not None), ns + VALUES[0])
+            point_values = [float(point.findtext(value_tag)) for point in points]
+            resolution = find('resolution', period)
+            point_times, point_values = _period_arrays(find('timeInterval/start', period), find('timeInterval/end', period),
+                                                       resolution, positions, point_values, curve_type)
+            times.append(point_times)
+            values.append(point_values)
+            metadata.append((dict(labels, resolution = resolution), point_times.shape[0]))
+
+        # Finished TimeSeries is not needed any more
+        element.clear()
+
+    columns = ['value'] + list(METADATA.values()) + ['resolution']
+    if not times:
+        return pd.DataFrame(columns = columns, index = pd.DatetimeIndex([], tz = 'UTC', name = 'time'))
+
+    # Metadata is the same for all the points of a Period - repeated as codes of categoricals (small integers)
+    counts = np.array([count for _, count in metadata])
+    data = {'value': np.concatenate(values)}
+    for column in columns[1:]:
+        labels = [m[column] for m, _ in metadata]
+        categories = sorted(set(label for label in labels if label is not None))
+        codes = np.array([categories.index(label) if label is not None else -1 for label in labels],
+                         dtype = np.int8 if len(categories) < 127 else np.int32)
+        data[column] = pd.Categorical.from_codes(np.repeat(codes, counts), categories = categories)
+    index = pd.DatetimeIndex(np.concatenate(times).view('datetime64[ns]'), name = 'time').tz_localize('UTC')
+
+    return pd.DataFrame(data, index = index)
@@ -0,0 +1,95 @@
+import argparse
+import configparser
+import os
+import time as timer
+from datetime import timedelta
+
+import pandas as pd
+
+from src.api.entsoe_client import EntsoeClient, parse_period
+from src.data.store import TimeSeriesStore, CoverageIndex
+
+# Incremental download of ENTSO-E data to the time series store (see store.py).
+# The coverage index (coverage.json in the directory of the store, see store.py) keeps the periods already downloaded
+# of every (documentType, processType, zone, psrType); a sync downloads only the gaps of the requested period
+# and the last revision days (ENTSO-E revises recent data), merges them into the store (the last write wins,
+# so a repeated sync changes nothing) and adds them to the index.
+#
+# Usage (from the main dir of the repository):
+#     python -m src.api.entsoe_sync --document-type A75 --process-type A16 --zones 10YPL-AREA-----S 10YCZ-CEPS-----N
+#                                   --start 201512312300 [--end 202001010000] [--revision-days 7]
+
+
+def sync(client,
+         store,
+         document_type,
+         zone,
+         start,
+         end = None,
+         process_type = None,
+         psr_type = None,
+         revision = timedelta(days = 7),
+         index = None
+         ):
+    """
+    This function will bring the store up to date with ENTSO-E data of document_type, zone, process_type and psr_type
+    (None - not used in the request) from start to end (timestamps or numbers as 201512312300, UTC if without time zone;
+    end None - now):
+    - client - EntsoeClient, store - TimeSeriesStore,
+    - revision - the last period always downloaded again,
+    - index - CoverageIndex (default - coverage.json in the directory of the store).
+    Returns dictionary with the downloaded intervals, number of rows and time of the download (in seconds).
+    """
+    index = CoverageIndex(os.path.join(store.root, 'coverage.json')) if index is None else index
+    start = parse_period(start)
+    end = pd.Timestamp.now(tz = 'UTC').tz_localize(None).floor('h') if end is None else parse_period(end)
+    key = CoverageIndex.key(document_type, process_type, zone, psr_type)
+
+    params = {}
+    if process_type is not None:
+        params['processType'] = process_type
+    if psr_type is not None:
+        params['psrType'] = psr_type
+
+    intervals = index.to_update(key, start, end, revision)
+    rows = 0
+    begin = timer.perf_counter()
+    for interval_start, interval_end in intervals:
+        data = client.fetch(document_type, zone, interval_start, interval_end, **params)
+        if len(data):
+            if process_type is not None:
+                data['process_type'] = process_type
+            rows += store.append(data, 'entsoe', document_type, zone)
+        # The interval is covered also when ENTSO-E has no data there
+        index.add(key, interval_start, interval_end)
+
+    return {'key': key, 'intervals': intervals, 'rows': rows, 'seconds': timer.perf_counter() - begin}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Incremental download of ENTSO-E data to the time series store.')
+    parser.add_argument('--document-type', required = True)
+    parser.add_argument('--process-type', default = None)
+    parser.add_argument('--psr-types', nargs = '+', default = [None])
+    parser.add_argument('--zones', nargs = '+', required = True)
+    parser.add_argument('--start', required = True, help = 'e.g. 201512312300 (UTC)')
+    parser.add_argument('--end', default = None, help = 'default - now')
+    parser.add_argument('--revision-days', type = float, default = 7)
+    parser.add_argument('--store', default = None, help = 'directory of the store (default - data/store)')
+    parser.add_argument('--compact', action = 'store_true', help = 'merge files of every month after the sync')
+    args = parser.parse_args()
+
+    # CONFIG
+    config = configparser.ConfigParser()
+    config.read(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "api.cfg"))
+    APP_ID = list(config['ENTSOE'].values())[0]
+
+    store = TimeSeriesStore() if args.store is None else TimeSeriesStore(args.store)
+    with EntsoeClient(APP_ID) as client:
+        for zone in args.zones:
+            for psr_type in args.psr_types:
+                result = sync(client, store, args.document_type, zone, args.start, args.end, args.process_type, psr_type,
+                              timedelta(days = args.revision_days))
+                print("%s: %d intervals, %d rows, %.1f s" % (result['key'], len(result['intervals']), result['rows'], result['seconds']))
+            if args.compact:
+                store.compact('entsoe', args.document_type, zone)
@@ -0,0 +1,124 @@
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from src.api.api_openexchangerates import fetch_json, BASE_URL
+from src.data.store import TimeSeriesStore, CoverageIndex, merge_intervals
+
+# Historical exchange rates (Open Exchange Rates) and conversion of price series between currencies.
+# Rates of a period are downloaded with time-series.json in chunks of at most max_days days (the longest period
+# of one request), all the currencies in one request, and kept in the time series store (see store.py) as
+# source 'openexchangerates', document type 'rates', zone = base currency, with the downloaded periods in the
+# coverage index (see store.py) - a later call downloads only the days not stored yet.
+# Conversion is as-of: every time of the prices takes the rate of the last day not later than it, found for all the
+# times at once with searchsorted, so a whole Series / DataFrame is converted with one multiplication.
+
+
+def _day(date):
+    date = pd.Timestamp(date)
+    return (date.tz_convert('UTC').tz_localize(None) if date.tz is not None else date).normalize()
+
+
+def fetch_rates(app_id,
+                since,
+                till,
+                symbols = ('EUR', 'PLN', 'DKK'),
+                base = 'USD',
+                cache = None,
+                max_days = 31,
+                session = None,
+                base_url = BASE_URL
+                ):
+    """
+    This function will download daily rates of symbols (units of the currency per 1 base) from since to till
+    (both inclusive) with time-series.json, in requests of at most max_days days.
+    cache - ResponseCache of the responses (see http_cache.py).
+    Returns DataFrame with days as index and one column per currency.
+    """
+    since, till = _day(since), _day(till)
+    frames = []
+    start = since
+    while start <= till:
+        end = min(start + timedelta(days = max_days - 1), till)
+        response = fetch_json('time-series.json', app_id, {'start': start.strftime('%Y-%m-%d'), 'end': end.strftime('%Y-%m-%d'),
+                                                           'base': base, 'symbols': ','.join(symbols)},
+                              cache = cache, session = session, base_url = base_url)
+        frames.append(pd.DataFrame.from_dict(response['rates'], orient = 'index'))
+        start = end + timedelta(days = 1)
+
+    rates = pd.concat(frames) if frames else pd.DataFrame(columns = list(symbols))
+    rates.index = pd.to_datetime(rates.index)
+    return rates.sort_index().reindex(columns = list(symbols)).astype(float)
+
+
+def load_rates(app_id,
+               since,
+               till,
+               symbols = ('EUR', 'PLN', 'DKK'),
+               base = 'USD',
+               store = None,
+               cache = None,
+               max_days = 31,
+               base_url = BASE_URL
+               ):
+    """
+    Rates of symbols per 1 base from since to till (as fetch_rates), read from the store (default - data/store);
+    only the days missing in the store are downloaded (and added to it).
+    """
+    store = TimeSeriesStore() if store is None else store
+    index = CoverageIndex(os.path.join(store.root, 'coverage.json'))
+    since, till = _day(since), _day(till)
+
+    # Days missing for any of the currencies are downloaded for all of them
+    keys = {symbol: 'openexchangerates|%s|%s' % (base, symbol) for symbol in symbols}
+    end = till + timedelta(days = 1)
+    missing = []
+    for key in keys.values():
+        missing.extend(index.to_update(key, since, end, revision = timedelta(0), now = end))
+
+    for start, stop in merge_intervals(missing):
+        rates = fetch_rates(app_id, start, stop - timedelta(days = 1), symbols, base, cache, max_days, base_url = base_url)
+        long = rates.rename_axis('time').reset_index().melt(id_vars = 'time', var_name = 'currency', value_name = 'value')
+        store.append(long.dropna().set_index('time'), 'openexchangerates', 'rates', base)
+        for key in keys.values():
+            index.add(key, start, stop)
+
+    data = store.read('openexchangerates', 'rates', base, since, end)
+    if data.shape[0] == 0:
+        return pd.DataFrame(columns = list(symbols), dtype = float)
+    rates = data.pivot_table(index = data.index, columns = 'currency', values = 'value', aggfunc = 'last')
+    rates.index = rates.index.tz_localize(None)
+    return rates.reindex(columns = list(symbols)).rename_axis(index = None, columns = None)
+
+
+def convert(prices, rates, from_currency, to_currency, base = 'USD'):
+    """
+    This function will convert prices (Series or DataFrame with times as index, e.g. daily or hourly prices)
+    from from_currency to to_currency with rates (DataFrame of load_rates / fetch_rates - units per 1 base currency;
+    the base currency itself has rate 1). Every time (in UTC) takes the rates of the last day not later than it (as-of);
+    times before the first rate give NaN. A currency which is neither in rates nor the base raises KeyError.
+    """
+    if from_currency == to_currency:
+        return prices.copy()
+
+    def column(currency):
+        if currency in rates.columns:
+            return rates[currency].to_numpy(dtype = float)
+        if currency == base:
+            return np.ones(rates.shape[0])
+        raise KeyError("No rates of %s (base %s) - rates of: %s" % (currency, base, ', '.join(map(str, rates.columns))))
+
+    factor_by_day = column(to_currency) / column(from_currency)
+
+    times = pd.DatetimeIndex(prices.index)
+    if times.tz is not None:
+        times = times.tz_convert('UTC').tz_localize(None)
+    days = pd.DatetimeIndex(rates.index).to_numpy()
+    position = np.searchsorted(days, times.to_numpy(), side = 'right') - 1
+    factor = np.where(position >= 0, factor_by_day[np.maximum(position, 0)], np.nan)
+
+    if isinstance(prices, pd.DataFrame):
+        return prices * factor[:, None]
+    return prices * factor
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# Disk cache of HTTP responses of the API clients (entsoe_client.py, api_openexchangerates.py).
+# Key is a hash of the address and of the sorted parameters without the secret ones (security tokens, app ids),
+# so the same query gives the same key for every user and the token is never written to the disk.
+# Every response is one file <key>.bin with the content and <key>.json with the request (without secrets) and time
+# of the download. Responses older than ttl seconds are downloaded again; when the cache is larger than max_bytes
+# the oldest responses are removed. In the offline mode responses are served only from the cache (whatever their age)
+# and a missing response raises CacheMiss - runs are reproducible without network.
+
+DEFAULT_DIRECTORY = os.path.join('data', 'http_cache')
+
+# Parameters never used in the key nor saved
+SECRET_PARAMS = ('securityToken', 'app_id')
+
+
+class CacheMiss(LookupError):
+    """
+    Response not in the cache in the offline mode.
+    """
+
+
+class ResponseCache:
+    """
+    Cache in directory: ttl - time of life of a response in seconds (None - unlimited), max_bytes - size of the cache,
+    offline - serve only from the cache, secret_params - parameters excluded from the key.
+    cache.stats() returns numbers of hits, misses, stores, evictions and the current size.
+    """
+
+    def __init__(self, directory = DEFAULT_DIRECTORY, ttl = 24 * 3600, max_bytes = 2 ** 30, offline = False,
+                 secret_params = SECRET_PARAMS):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.secret_params = secret_params
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok = True)
+
+    def _public(self, params):
+        return {str(k): str(v) for k, v in sorted((params or {}).items()) if k not in self.secret_params}
+
+    def key(self, url, params = None):
+        request = json.dumps({'url': url, 'params': self._public(params)}, sort_keys = True)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def _path(self, key, extension):
+        return os.path.join(self.directory, key + extension)
+
+    def get(self, url, params = None):
+        """
+        Cached content of the response to url with params, or None (not cached or expired).
+        In the offline mode raises CacheMiss instead of returning None.
+        """
+        key = self.key(url, params)
+        try:
+            with open(self._path(key, '.json')) as file:
+                fetched = json.load(file)['fetched']
+            with open(self._path(key, '.bin'), 'rb') as file:
+                content = file.read()
+        except (FileNotFoundError, ValueError, KeyError):
+            content = None
+
+        if content is not None and (self.offline or self.ttl is None or time.time() - fetched <= self.ttl):
+            self.hits += 1
+            return content
+
+        self.misses += 1
+        if self.offline:
+            raise CacheMiss("No cached response of %s %s" % (url, self._public(params)))
+        return None
+
+    def put(self, url, params, content):
+        key = self.key(url, params)
+        # Content first, then the description, both through temporary files - other processes never read a partial response
+        for extension, data in (('.bin', content),
+                                ('.json', json.dumps({'url': url, 'params': self._public(params), 'fetched': time.time()}).encode())):
+            descriptor, temporary = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temporary, self._path(key, extension))
+        self.stores += 1
+        self.evict()
+
+    def get_or_fetch(self, url, params, fetch):
+        """
+        Cached content of the response to url with params, or content returned by fetch() (then cached).
+        """
+        content = self.get(url, params)
+        if content is None:
+            content = fetch()
+            self.put(url, params, content)
+        return content
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.bin'):
+                try:
+                    status = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((status.st_mtime, status.st_size, name[:-len('.bin')]))
+        return entries
+
+    def _remove(self, key):
+        for extension in ('.bin', '.json'):
+            try:
+                os.remove(self._path(key, extension))
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """
+        Removes expired responses, then the oldest ones until the cache is not larger than max_bytes.
+        """
+        entries = sorted(self._entries())
+        size = sum(entry[1] for entry in entries)
+        now = time.time()
+        for modified, entry_size, key in entries:
+            expired = not self.offline and self.ttl is not None and now - modified > self.ttl
+            if not expired and size <= self.max_bytes:
+                break
+            self._remove(key)
+            size -= entry_size
+            self.evictions += 1
+
+    def clear(self):
+        for _, _, key in self._entries():
+            self._remove(key)
+
+    def stats(self):
+        entries = self._entries()
+        requests = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / requests if requests else 0.0,
+                'stores': self.stores, 'evictions': self.evictions, 'entries': len(entries),
+                'bytes': sum(entry[1] for entry in entries), 'max_bytes': self.max_bytes}
@@ -1,45 +1,187 @@
-import pandas as pd 
-import numpy as np 
-import os 
-import pickle as pkl 
+import pandas as pd
+import numpy as np
+import os
+import pickle as pkl
+import hashlib
+import json
+import time as timer
+from collections.abc import Mapping
 
-def prepare_data(raw_data):
+# Cache of the worksheets of the raw workbook ("Data1.xlsx").
+# Every sheet is one Parquet file (pickle if its columns cannot be stored in Parquet, e.g. mixed types) in
+# data/cleaned/<name of the workbook>_sheets, with manifest.json describing the workbook it was made from
+# (size, modification time and SHA-256 of the file). The cache is valid while the workbook is the same:
+# size and modification time are compared first, the hash only when they differ (e.g. the file was copied).
+# Sheets are read from the cache only when used (gas_data['Grunddata'] reads only that sheet).
 
+try:
+    import python_calamine # faster (Rust) reader of Excel files, used by pandas as engine 'calamine'
+    EXCEL_ENGINE = 'calamine'
+except ImportError:
+    EXCEL_ENGINE = 'openpyxl'
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(2 ** 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_description(path):
+    status = os.stat(path)
+    return {'size': status.st_size, 'mtime_ns': status.st_mtime_ns}
+
+
+class SheetCache(Mapping):
     """
-    This function is preparing the raw_data ("Data1.xlsx") to be changed to pickle, if loaded for the first time.
-    To use it, put the file called as above in folder "data" -> "raw".
-    Pickle file should be in folder "data" -> "cleaned".
+    Worksheets of the cache as a read-only dictionary {sheet name: DataFrame}; every sheet is read when it is used
+    for the first time. timings contains times (in seconds) of the validation, the rebuild and reading of the sheets.
     """
-    print("Trying to load data from cache...")    
 
-    try: # try loading the processed data
-        
-        # Change 'Data1' to name used in the raw_data!
-        gas_data = pkl.load(open(os.getcwd() +"\\data\\cleaned\\" + "Data1" + "_import_cleaned.pkl","rb"))
-        print("Loaded data from cache.")
-        print("Here are the names of the worksheets:")
-        print(*list(gas_data.keys()))
+    def __init__(self, directory, manifest, timings):
+        self.directory = directory
+        self.manifest = manifest
+        self.timings = timings
+        self._sheets = {}
 
-    except: # if the file doesn't exist then we need to process it
-        # Takes raw data and transforms it by cleaning the transition and collection loans.
-        # Also saves the output in /data/cleaned as a pickle file that can directly be loaded.
-        print("Unable to load from cache, loading from raw file and starting preprocessing. Might take some time...")
+    def __getitem__(self, sheet_name):
+        if sheet_name not in self._sheets:
+            file_name = self.manifest['files'][sheet_name]
+            start = timer.perf_counter()
+            path = os.path.join(self.directory, file_name)
+            if file_name.endswith('.parquet'):
+                self._sheets[sheet_name] = pd.read_parquet(path, memory_map = True)
+            else:
+                with open(path, 'rb') as file:
+                    self._sheets[sheet_name] = pkl.load(file)
+            self.timings.setdefault('sheets', {})[sheet_name] = timer.perf_counter() - start
+        return self._sheets[sheet_name]
 
-        gas_data_raw = pd.ExcelFile(raw_data)
+    def __iter__(self):
+        return iter(self.manifest['sheets'])
 
-        # reading all sheets to a map 
-        gas_data = {}
-        for sheet_name in gas_data_raw.sheet_names:
-            gas_data[sheet_name] = gas_data_raw.parse(sheet_name)
+    def __len__(self):
+        return len(self.manifest['sheets'])
 
-        # Printing the names of worksheets for analyst further purposes
-        print("Here are the names of the worksheets:")
-        print(*list(gas_data.keys()))
-        print("Saved data from the worksheets to the defined file.")
 
-        # Change 'Data1' to name used in the raw_data!
-        output = open(os.getcwd() +"\\data\\cleaned\\" + "Data1" + "_import_cleaned.pkl","wb")
-        pkl.dump(gas_data,output)
+def _write_sheet(directory, number, sheet):
+    """
+    Saves sheet as Parquet (or pickle, if Parquet cannot store it). Returns name of the file.
+    """
+    file_name = '%03d.parquet' % number
+    try:
+        sheet.to_parquet(os.path.join(directory, file_name))
+    except (ValueError, TypeError, ImportError): # e.g. columns of mixed types or names which are not strings
+        file_name = '%03d.pkl' % number
+        with open(os.path.join(directory, file_name), 'wb') as file:
+            pkl.dump(sheet, file, protocol = pkl.HIGHEST_PROTOCOL)
+    return file_name
+
+
+def _remove_cache(directory):
+    """
+    Removes the manifest and the files of the sheets listed in it (other files in directory are not touched).
+    """
+    try:
+        with open(os.path.join(directory, 'manifest.json')) as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return
+
+    # The manifest first - the cache is invalid from now on
+    os.remove(os.path.join(directory, 'manifest.json'))
+    for file_name in manifest.get('files', {}).values():
+        try:
+            os.remove(os.path.join(directory, os.path.basename(file_name)))
+        except FileNotFoundError:
+            pass
+
 
+def _rebuild(raw_data, directory, source, engine):
+    """
+    Reads all the sheets of raw_data and saves them in directory (replacing the previous cache). Returns the manifest.
+    """
+    os.makedirs(directory, exist_ok = True)
+    _remove_cache(directory)
+
+    sheets = pd.read_excel(raw_data, sheet_name = None, engine = engine)
+    files = {}
+    for number, (sheet_name, sheet) in enumerate(sheets.items()):
+        files[sheet_name] = _write_sheet(directory, number, sheet)
+
+    # The manifest is written last - a rebuild stopped in the middle is not taken as valid cache
+    manifest = dict(source, source = os.path.abspath(raw_data), sheets = list(sheets), files = files, engine = engine)
+    with open(os.path.join(directory, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent = 1)
+    return manifest
+
+
+def _valid_manifest(directory, raw_data, source):
+    """
+    Manifest of the cache in directory if it was made from the same raw_data, otherwise None.
+    """
+    try:
+        with open(os.path.join(directory, 'manifest.json')) as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if manifest['size'] == source['size'] and manifest['mtime_ns'] == source['mtime_ns']:
+        return manifest
+    if manifest['size'] == source['size'] and manifest.get('sha256') == _file_hash(raw_data):
+        # The same content with a new modification time - the cache is kept
+        manifest.update(source)
+        with open(os.path.join(directory, 'manifest.json'), 'w') as file:
+            json.dump(manifest, file, indent = 1)
+        return manifest
+    return None
+
+
+def prepare_data(raw_data, cache_directory = None, engine = None, verbose = True):
+
+    """
+    This function is preparing the raw_data ("Data1.xlsx") - every worksheet is saved in the cache when the workbook
+    is loaded for the first time (or after it was changed), later the sheets are read from the cache.
+    To use it, put the file called as above in folder "data" -> "raw".
+    The cache is in folder "data" -> "cleaned" -> "<name of the workbook>_sheets" (or cache_directory).
+    engine - reader of the Excel file (default - calamine if installed, otherwise openpyxl).
+
+    Returns dictionary-like SheetCache {sheet name: DataFrame}, sheets are read when used;
+    gas_data.timings gives times of loading (in seconds).
+    """
+    if cache_directory is None:
+        name = os.path.splitext(os.path.basename(raw_data))[0]
+        cache_directory = os.path.join('data', 'cleaned', name + '_sheets')
+
+    if verbose:
+        print("Trying to load data from cache...")
+    start = timer.perf_counter()
+    source = _source_description(raw_data)
+    manifest = _valid_manifest(cache_directory, raw_data, source)
+    timings = {'validation': timer.perf_counter() - start}
+
+    if manifest is not None:
+        timings['cache'] = 'hit'
+        if verbose:
+            print("Loaded data from cache.")
+    else: # if the cache doesn't exist or the workbook was changed then we need to process it
+        if verbose:
+            print("Unable to load from cache, loading from raw file and starting preprocessing. Might take some time...")
+        start = timer.perf_counter()
+        source['sha256'] = _file_hash(raw_data)
+        manifest = _rebuild(raw_data, cache_directory, source, engine or EXCEL_ENGINE)
+        timings['cache'] = 'miss'
+        timings['rebuild'] = timer.perf_counter() - start
+        if verbose:
+            print("Saved data from the worksheets to the cache (%.1f s)." % timings['rebuild'])
+
+    gas_data = SheetCache(cache_directory, manifest, timings)
+
+    # Printing the names of worksheets for analyst further purposes
+    if verbose:
+        print("Here are the names of the worksheets:")
+        print(*list(gas_data.keys()))
 
-    return gas_data
\ No newline at end of file
+    return gas_data
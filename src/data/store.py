@@ -0,0 +1,267 @@
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Local columnar store of time series (Parquet), the data layer of the API scripts and of the forecasting / optimization code.
+# Data is partitioned by source, document type, zone and month of the time (UTC):
+#     root/source=entsoe/document_type=A75/zone=10YPL-AREA-----S/month=2016-01/part-<sequence>.parquet
+# append only adds new files (written to a temporary file and renamed), so it never rewrites existing data;
+# the same point written again (same time and metadata columns) is resolved on reading - the last write wins.
+# read opens only the month directories of the requested period, with memory-mapped files.
+# The coverage index (CoverageIndex, coverage.json in the root) keeps the periods already downloaded of every series,
+# so the download scripts (entsoe_sync.py, fx_rates.py) fetch only what is missing.
+
+DEFAULT_ROOT = os.path.join('data', 'store')
+
+# Partition keys, in the order of the directories
+KEYS = ('source', 'document_type', 'zone', 'month')
+
+
+def _month(timestamp):
+    return pd.Timestamp(timestamp).strftime('%Y-%m')
+
+
+def _to_utc(index):
+    index = pd.DatetimeIndex(index)
+    return index.tz_localize('UTC') if index.tz is None else index.tz_convert('UTC')
+
+
+def _naive_utc(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_convert('UTC').tz_localize(None) if timestamp.tz is not None else timestamp
+
+
+def _normalize(table):
+    """
+    The same Arrow types in every file: labels as strings (Parquet encodes them as dictionaries anyway),
+    numbers as float64, so files of different appends can be joined.
+    """
+    fields = []
+    for field in table.schema:
+        kind = field.type
+        if pa.types.is_dictionary(kind) or pa.types.is_large_string(kind):
+            kind = pa.string()
+        elif pa.types.is_integer(kind) or pa.types.is_floating(kind):
+            kind = pa.float64()
+        fields.append(pa.field(field.name, kind))
+    return table.cast(pa.schema(fields, metadata = table.schema.metadata))
+
+
+class TimeSeriesStore:
+    """
+    Store in the directory root:
+        store = TimeSeriesStore()
+        store.append(data, 'entsoe', 'A75', '10YPL-AREA-----S')   # data - DataFrame with dates as index
+        store.read('entsoe', 'A75', '10YPL-AREA-----S', '2016-01-01', '2017-01-01', psr_type = 'B16')
+        store.series('entsoe', 'A65', '10YPL-AREA-----S', '2016-01-01', '2017-01-01')   # column value as Series
+    Times without time zone are taken as UTC; times returned by read are UTC.
+    """
+
+    def __init__(self, root = DEFAULT_ROOT):
+        self.root = root
+
+    def _directory(self, source, document_type, zone, month = None):
+        parts = [self.root, 'source=%s' % source, 'document_type=%s' % document_type, 'zone=%s' % zone]
+        if month is not None:
+            parts.append('month=%s' % month)
+        return os.path.join(*parts)
+
+    def append(self, data, source, document_type, zone):
+        """
+        Adds data (DataFrame or Series with dates as index) to the store. Returns number of written rows.
+        """
+        if isinstance(data, pd.Series):
+            data = data.to_frame('value' if data.name is None else data.name)
+        if data.shape[0] == 0:
+            return 0
+        data = data.copy()
+        data.index = _to_utc(data.index).rename('time')
+        months = data.index.strftime('%Y-%m')
+
+        # Names of the files sort in order of the writes
+        sequence = '%020d-%s' % (time.time_ns(), uuid.uuid4().hex[:8])
+        for month in np.unique(months):
+            directory = self._directory(source, document_type, zone, month)
+            os.makedirs(directory, exist_ok = True)
+            table = _normalize(pa.Table.from_pandas(data[months == month], preserve_index = True))
+            temporary = os.path.join(directory, '.part-%s.tmp' % sequence)
+            pq.write_table(table, temporary)
+            os.replace(temporary, os.path.join(directory, 'part-%s.parquet' % sequence))
+
+        return data.shape[0]
+
+    def months(self, source, document_type, zone):
+        """
+        Months (e.g. '2016-01') with data of the source, document type and zone.
+        """
+        directory = self._directory(source, document_type, zone)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name.split('=', 1)[1] for name in os.listdir(directory) if name.startswith('month='))
+
+    def partitions(self):
+        """
+        DataFrame of all the partitions (source, document_type, zone, month), with number of files and size in bytes.
+        """
+        rows = []
+        for directory, _, files in os.walk(self.root):
+            parts = [f for f in files if f.endswith('.parquet')]
+            if not parts:
+                continue
+            keys = dict(name.split('=', 1) for name in os.path.relpath(directory, self.root).split(os.sep))
+            rows.append(dict(keys, files = len(parts), bytes = sum(os.path.getsize(os.path.join(directory, f)) for f in parts)))
+        return pd.DataFrame(rows, columns = list(KEYS) + ['files', 'bytes']).sort_values(list(KEYS), ignore_index = True)
+
+    def _files(self, source, document_type, zone, start, end):
+        months = self.months(source, document_type, zone)
+        if start is not None:
+            months = [m for m in months if m >= _month(start)]
+        if end is not None:
+            months = [m for m in months if m <= _month(end)]
+        files = []
+        for month in months:
+            directory = self._directory(source, document_type, zone, month)
+            files.extend(os.path.join(directory, f) for f in sorted(os.listdir(directory)) if f.endswith('.parquet'))
+        return files
+
+    def read(self, source, document_type, zone, start = None, end = None, columns = None, **filters):
+        """
+        This function will read data of the source, document type and zone with times from start (inclusive)
+        to end (exclusive), None - without limit. Only the partitions of the period are read.
+        columns - columns to read (None - all), filters - values of metadata columns, e.g. psr_type = 'B16'.
+        Returns DataFrame with times (UTC) as index, sorted, every point once (the last written).
+        """
+        start = _to_utc([start])[0] if start is not None else None
+        end = _to_utc([end])[0] if end is not None else None
+
+        tables = [pq.read_table(path, memory_map = True) for path in self._files(source, document_type, zone, start, end)]
+        if not tables:
+            return pd.DataFrame(index = pd.DatetimeIndex([], tz = 'UTC', name = 'time'), columns = columns)
+        data = pa.concat_tables(tables, promote_options = 'permissive').to_pandas()
+
+        keep = np.ones(data.shape[0], dtype = bool)
+        if start is not None:
+            keep &= data.index >= start
+        if end is not None:
+            keep &= data.index < end
+        for column, value in filters.items():
+            keep &= (data[column] == value).to_numpy()
+        data = data[keep]
+
+        # Later writes of the same point replace the earlier ones
+        keys = data.reset_index().drop(columns = 'value', errors = 'ignore')
+        data = data[~keys.duplicated(keep = 'last').to_numpy()].sort_index(kind = 'stable')
+        if columns is not None:
+            data = data[list(columns)]
+        return data
+
+    def series(self, source, document_type, zone, start = None, end = None, **filters):
+        """
+        Column value of read as Series with times as index, e.g. input of forecast_prices / forecast_demand.
+        filters have to leave one point per time.
+        """
+        data = self.read(source, document_type, zone, start, end, **filters)
+        if data.index.has_duplicates:
+            raise ValueError("More than one point per time - add filters (e.g. psr_type)")
+        return data['value'].rename(zone)
+
+    def compact(self, source, document_type, zone):
+        """
+        Rewrites every month of the source, document type and zone as one file (after many small appends).
+        """
+        for month in self.months(source, document_type, zone):
+            directory = self._directory(source, document_type, zone, month)
+            old = [os.path.join(directory, f) for f in os.listdir(directory) if f.endswith('.parquet')]
+            if len(old) < 2:
+                continue
+            start = pd.Timestamp(month + '-01', tz = 'UTC')
+            data = self.read(source, document_type, zone, start, start + pd.offsets.MonthBegin(1))
+            self.append(data, source, document_type, zone)
+            for path in old:
+                os.remove(path)
+
+
+def merge_intervals(intervals):
+    """
+    Union of intervals (start, end) as sorted list of disjoint intervals.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_intervals(covered, start, end):
+    """
+    Parts of the period from start to end not covered by the (merged) intervals covered.
+    """
+    gaps = []
+    for covered_start, covered_end in covered:
+        if covered_end <= start or covered_start >= end:
+            continue
+        if covered_start > start:
+            gaps.append((start, covered_start))
+        start = max(start, covered_end)
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+
+class CoverageIndex:
+    """
+    Downloaded periods of every series (times in UTC without time zone), saved in the JSON file path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.coverage = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                self.coverage = {key: [(pd.Timestamp(s), pd.Timestamp(e)) for s, e in intervals]
+                                 for key, intervals in json.load(file).items()}
+
+    @staticmethod
+    def key(*parts):
+        """
+        Key of a series from its parts, e.g. (documentType, processType, zone, psrType) of ENTSO-E (None - empty part).
+        """
+        return '|'.join(str(part or '') for part in parts)
+
+    def covered(self, key):
+        return self.coverage.get(key, [])
+
+    def add(self, key, start, end):
+        self.coverage[key] = merge_intervals(self.covered(key) + [(start, end)])
+        self.save()
+
+    def save(self):
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok = True)
+        descriptor, temporary = tempfile.mkstemp(dir = directory, suffix = '.tmp')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump({key: [(s.isoformat(), e.isoformat()) for s, e in intervals]
+                       for key, intervals in self.coverage.items()}, file, indent = 1)
+        os.replace(temporary, self.path)
+
+    def to_update(self, key, start, end, revision = timedelta(days = 7), now = None):
+        """
+        Intervals of the period from start to end to download: the gaps of the coverage and the last revision
+        before now (the data which can still be revised).
+        """
+        now = pd.Timestamp.now(tz = 'UTC').tz_localize(None) if now is None else _naive_utc(now)
+        intervals = missing_intervals(self.covered(key), start, end)
+        recent = max(start, (now - revision).floor('h'))
+        if recent < end:
+            intervals.append((recent, end))
+        return merge_intervals(intervals)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules are imported as in the rest of the repository (from src.analysis import ...), from the main dir
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,30 @@
+import pytest
+
+from src.analysis import benchmark, decomposition, optimization
+
+# L-shaped decomposition has to reach the optimum of the extensive form (the whole scenario tree in one model),
+# both solved with HiGHS on a small synthetic tree.
+
+
+@pytest.fixture(scope = 'module')
+def scenarios():
+    return benchmark.synthetic_scenarios(10, 2, 2, 2, 2)
+
+
+def test_stochastic(scenarios):
+    forecasting_since, forecasting_till, *paths = scenarios
+    extensive, _ = optimization.stochastic(forecasting_since, forecasting_till, 1.0, benchmark.STOCHASTIC_PARAMETERS, *paths,
+                                           output_flag = False, backend = 'highs')
+    decomposed, variables = decomposition.stochastic(forecasting_since, forecasting_till, 1.0, benchmark.STOCHASTIC_PARAMETERS, *paths,
+                                                     backend = 'highs', processes = 1)
+    assert decomposed == pytest.approx(extensive, rel = 1e-6)
+    assert variables.shape[0] > 0
+
+
+def test_additional_flexibility_stochastic(scenarios):
+    forecasting_since, forecasting_till, *paths = scenarios
+    extensive, _ = optimization.additional_flexibility_stochastic(forecasting_since, forecasting_till, benchmark.ST_MAX, 1.0,
+                                                                  benchmark.FLEXIBILITY_PARAMETERS, *paths, output_flag = False, backend = 'highs')
+    decomposed, _ = decomposition.additional_flexibility_stochastic(forecasting_since, forecasting_till, benchmark.ST_MAX, 1.0,
+                                                                    benchmark.FLEXIBILITY_PARAMETERS, *paths, backend = 'highs', processes = 1)
+    assert decomposed == pytest.approx(extensive, rel = 1e-6)
@@ -0,0 +1,16 @@
+import pytest
+
+from src.analysis import benchmark, dispatch
+
+# The dynamic programming dispatch with fixed st_max has to give the same objective (and payment mode) as the LP/MIP
+# of optimization.deterministic with st_max fixed, solved by HiGHS (dispatch.cross_check).
+
+
+@pytest.mark.parametrize('st_max', [10, 40, 100])
+@pytest.mark.parametrize('price_injection', [0.5, 5.0])
+def test_cross_check(st_max, price_injection):
+    forecasting_since, forecasting_till, prices, demand = benchmark.synthetic_inputs(14)
+    storage_parameters = (100, 10, 10, price_injection, 200, 200)
+    check = dispatch.cross_check(forecasting_since, forecasting_till, st_max, 1.0, storage_parameters, prices, demand, backend = 'highs')
+    assert check['dispatch'] == pytest.approx(check['solver'], rel = 1e-6)
+    assert check['u_st_dispatch'] == pytest.approx(check['u_st_solver'])
@@ -0,0 +1,122 @@
+import threading
+from datetime import timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+import pytest
+
+from src.api import entsoe_client
+from src.api.entsoe_client import EntsoeClient, split_period
+
+# Tests of the ENTSO-E client against a local stand-in of the API (http.server in a thread).
+# The stand-in returns hourly points of the requested period (value = hours since 2016-01-01), one point more
+# than requested (overlapping the next chunk, as ENTSO-E does at some borders), and can fail the first requests.
+
+
+class StandIn(BaseHTTPRequestHandler):
+    requests = []
+    failures = []   # statuses (and Retry-After) of the next responses, e.g. [(503, None), (429, '1')]
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        with self.lock:
+            self.requests.append(query)
+            failure = self.failures.pop(0) if self.failures else None
+        if failure is not None:
+            status, retry_after = failure
+            self.send_response(status)
+            if retry_after is not None:
+                self.send_header('Retry-After', retry_after)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start = pd.to_datetime(query['periodStart'], format = '%Y%m%d%H%M')
+        end = pd.to_datetime(query['periodEnd'], format = '%Y%m%d%H%M')
+        count = int((end - start) / pd.Timedelta(hours = 1)) + 1
+        first = int((start - pd.Timestamp('2016-01-01')) / pd.Timedelta(hours = 1))
+        points = ''.join('<Point><position>%d</position><quantity>%d</quantity></Point>' % (i + 1, first + i) for i in range(count))
+        body = ('<GL_MarketDocument><TimeSeries><MktPSRType><psrType>B16</psrType></MktPSRType><Period><timeInterval>'
+                '<start>%s</start><end>%s</end></timeInterval><resolution>PT60M</resolution>%s</Period></TimeSeries>'
+                '</GL_MarketDocument>' % (start.strftime('%Y-%m-%dT%H:%MZ'), end.strftime('%Y-%m-%dT%H:%MZ'), points)).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    StandIn.requests = []
+    StandIn.failures = []
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StandIn)
+    thread = threading.Thread(target = httpd.serve_forever, daemon = True)
+    thread.start()
+    yield 'http://127.0.0.1:%d/api' % httpd.server_port
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # Pauses of the retries are recorded instead of slept
+    recorded = []
+    monkeypatch.setattr(entsoe_client.time, 'sleep', recorded.append)
+    return recorded
+
+
+def test_split_period():
+    chunks = split_period('2016-01-01', '2018-06-01', timedelta(days = 365))
+    assert chunks[0] == (pd.Timestamp('2016-01-01'), pd.Timestamp('2016-12-31'))
+    assert chunks[-1][1] == pd.Timestamp('2018-06-01')
+    assert len(chunks) == 3
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    assert all(e - s <= timedelta(days = 365) for s, e in chunks)
+    assert split_period('2016-01-01', '2016-01-01') == []
+
+
+def test_fetch_in_order_without_duplicates(server, sleeps):
+    client = EntsoeClient('token', base_url = server, max_span = timedelta(days = 30), workers = 4, requests_per_minute = None)
+    data = client.fetch('A75', '10YPL-AREA-----S', '2016-01-01', '2016-07-01', processType = 'A16')
+
+    assert len(StandIn.requests) == 7
+    assert all(r['securityToken'] == 'token' for r in StandIn.requests)
+    # Hourly points of the whole period (and the last one after it), in order and each once
+    assert data.index.is_monotonic_increasing
+    assert not data.index.has_duplicates
+    assert data.index[0] == pd.Timestamp('2016-01-01', tz = 'UTC')
+    assert data.shape[0] == int((pd.Timestamp('2016-07-01') - pd.Timestamp('2016-01-01')) / pd.Timedelta(hours = 1)) + 1
+    assert (data['value'].to_numpy() == range(data.shape[0])).all()
+    assert (data['psr_type'] == 'B16').all()
+
+
+def test_retries_with_backoff(server, sleeps):
+    StandIn.failures = [(503, None), (500, None)]
+    client = EntsoeClient('token', base_url = server, backoff = 0.5, requests_per_minute = None)
+    data = client.fetch('A75', '10YPL-AREA-----S', '2016-01-01', '2016-01-02')
+
+    assert len(StandIn.requests) == 3
+    assert sleeps == [0.5, 1.0]
+    assert data.shape[0] == 25
+
+
+def test_retry_after(server, sleeps):
+    StandIn.failures = [(429, '7')]
+    client = EntsoeClient('token', base_url = server, backoff = 0.5, requests_per_minute = None)
+    client.fetch('A75', '10YPL-AREA-----S', '2016-01-01', '2016-01-02')
+
+    assert len(StandIn.requests) == 2
+    assert sleeps == [7.0]
+
+
+def test_gives_up_after_retries(server, sleeps):
+    StandIn.failures = [(503, None)] * 3
+    client = EntsoeClient('token', base_url = server, retries = 2, backoff = 0.1, requests_per_minute = None)
+    with pytest.raises(entsoe_client.requests.HTTPError):
+        client.fetch('A75', '10YPL-AREA-----S', '2016-01-01', '2016-01-02')
+    assert len(StandIn.requests) == 3
@@ -0,0 +1,97 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from src.api.entsoe_client import parse_period, to_period
+from src.api.entsoe_sync import sync
+from src.data.store import TimeSeriesStore, CoverageIndex, merge_intervals, missing_intervals
+
+# Tests of the incremental download: the coverage index and sync with a stand-in of EntsoeClient,
+# which returns hourly points of the requested period (value = hours since 2016-01-01) and records the requests.
+
+
+def ts(value):
+    return pd.Timestamp(value)
+
+
+class StandInClient:
+
+    def __init__(self):
+        self.requests = []
+
+    def fetch(self, document_type, zone, start, end, **params):
+        start, end = parse_period(start), parse_period(end)
+        self.requests.append((start, end))
+        times = pd.date_range(start, end, freq = 'h', inclusive = 'left', tz = 'UTC')
+        values = (times.tz_localize(None) - ts('2016-01-01')) / pd.Timedelta(hours = 1)
+        return pd.DataFrame({'value': np.asarray(values, dtype = float), 'psr_type': 'B16'}, index = times.rename('time'))
+
+
+def test_merge_intervals():
+    assert merge_intervals([(3, 5), (1, 2), (2, 3), (7, 8)]) == [(1, 5), (7, 8)]
+    assert merge_intervals([]) == []
+
+
+def test_missing_intervals():
+    covered = [(ts('2016-01-05'), ts('2016-01-10')), (ts('2016-01-15'), ts('2016-01-20'))]
+    assert missing_intervals(covered, ts('2016-01-01'), ts('2016-01-31')) == [
+        (ts('2016-01-01'), ts('2016-01-05')), (ts('2016-01-10'), ts('2016-01-15')), (ts('2016-01-20'), ts('2016-01-31'))]
+    assert missing_intervals(covered, ts('2016-01-06'), ts('2016-01-09')) == []
+    assert missing_intervals([], ts('2016-01-01'), ts('2016-01-02')) == [(ts('2016-01-01'), ts('2016-01-02'))]
+
+
+def test_coverage_index_to_update(tmp_path):
+    index = CoverageIndex(str(tmp_path / 'coverage.json'))
+    key = CoverageIndex.key('A75', 'A16', '10YPL-AREA-----S', None)
+    index.add(key, ts('2016-01-01'), ts('2016-02-01'))
+
+    # Saved and loaded again
+    index = CoverageIndex(str(tmp_path / 'coverage.json'))
+    assert index.covered(key) == [(ts('2016-01-01'), ts('2016-02-01'))]
+
+    # Only the gap after the coverage, revision far in the past
+    assert index.to_update(key, ts('2016-01-01'), ts('2016-03-01'), now = ts('2020-01-01')) == [(ts('2016-02-01'), ts('2016-03-01'))]
+    # The last revision days are downloaded again, from the full hour
+    assert index.to_update(key, ts('2016-01-01'), ts('2016-02-01'), revision = timedelta(days = 7), now = ts('2016-02-03 10:30')) == [
+        (ts('2016-01-27 10:00'), ts('2016-02-01'))]
+
+
+def test_second_sync_downloads_nothing(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / 'store'))
+    client = StandInClient()
+
+    first = sync(client, store, 'A75', '10YPL-AREA-----S', '2016-01-01', '2016-01-11', process_type = 'A16')
+    assert first['intervals'] == [(ts('2016-01-01'), ts('2016-01-11'))]
+    assert first['rows'] == 240
+
+    second = sync(client, store, 'A75', '10YPL-AREA-----S', '2016-01-01', '2016-01-11', process_type = 'A16')
+    assert second['intervals'] == [] and second['rows'] == 0
+    assert len(client.requests) == 1
+
+    # A longer period downloads only the new days
+    third = sync(client, store, 'A75', '10YPL-AREA-----S', '2016-01-01', '2016-01-15', process_type = 'A16')
+    assert third['intervals'] == [(ts('2016-01-11'), ts('2016-01-15'))]
+
+    data = store.series('entsoe', 'A75', '10YPL-AREA-----S', '2016-01-01', '2016-01-15')
+    assert data.shape[0] == 14 * 24
+    assert not data.index.has_duplicates
+
+
+def test_sync_with_time_zone(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / 'store'))
+    client = StandInClient()
+
+    sync(client, store, 'A75', '10YPL-AREA-----S', '2016-01-01', '2016-01-11')
+    # The same period with time zones (Warsaw is UTC+1 in January) is already covered
+    result = sync(client, store, 'A75', '10YPL-AREA-----S', pd.Timestamp('2016-01-01 01:00', tz = 'Europe/Warsaw'),
+                  pd.Timestamp('2016-01-11 01:00', tz = 'Europe/Warsaw'))
+    assert result['intervals'] == []
+    assert len(client.requests) == 1
+
+
+def test_parse_period():
+    assert parse_period(201512312300) == ts('2015-12-31 23:00')
+    assert parse_period(pd.Timestamp('2016-01-01 00:00', tz = 'Europe/Warsaw')) == ts('2015-12-31 23:00')
+    assert parse_period('2016-01-01') == ts('2016-01-01')
+    assert to_period(pd.Timestamp('2016-01-01 00:00', tz = 'Europe/Warsaw')) == '201512312300'
@@ -0,0 +1,47 @@
+import importlib.util
+
+import pytest
+
+from src.analysis import backends, benchmark, optimization
+
+# The payment term u_st * st_in.sum() solved as a product ('bilinear'), as two LPs ('split') and linearized ('mccormick')
+# has to give the same optimum (objective and u_st) with both backends, for all the models with the term.
+# Models are small - they fit the size-limited Gurobi licence.
+
+BACKENDS = ['highs'] + (['gurobi'] if importlib.util.find_spec('gurobipy') is not None else [])
+
+TIME = 14
+
+
+def _solve(model, formulation, backend, price_injection):
+    forecasting_since, forecasting_till, prices, demand = benchmark.synthetic_inputs(TIME)
+    if model == 'deterministic':
+        parameters = benchmark.DETERMINISTIC_PARAMETERS[:3] + (price_injection,) + benchmark.DETERMINISTIC_PARAMETERS[4:]
+        return optimization.deterministic(forecasting_since, forecasting_till, benchmark.STORAGE_BID, parameters, prices, demand,
+                                          backend = backend, result_format = 'result', formulation = formulation)
+    elif model == 'additional_flexibility_full':
+        parameters = benchmark.FULL_PARAMETERS[:-1] + (price_injection,)
+        return optimization.additional_flexibility_full(forecasting_since, forecasting_till, benchmark.STORAGE_BID, parameters,
+                                                        benchmark.LIMIT_TRADING, prices, demand, backend = backend,
+                                                        result_format = 'result', formulation = formulation)
+    parameters = benchmark.FLEXIBILITY_PARAMETERS[:-1] + (price_injection,)
+    return optimization.additional_flexibility(forecasting_since, forecasting_till, benchmark.ST_MAX, benchmark.STORAGE_BID, parameters,
+                                               benchmark.LIMIT_TRADING, prices, demand, backend = backend,
+                                               result_format = 'result', formulation = formulation)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('model', ['deterministic', 'additional_flexibility_full', 'additional_flexibility'])
+@pytest.mark.parametrize('price_injection', [0.5, 50.0])
+@pytest.mark.parametrize('formulation', ['split', 'mccormick'])
+def test_same_optimum(backend, model, price_injection, formulation):
+    reference, reference_result = _solve(model, 'bilinear', backend, price_injection)
+    objective, result = _solve(model, formulation, backend, price_injection)
+
+    assert objective == pytest.approx(reference, rel = 1e-6, abs = 1e-6)
+    assert float(result['u_st']) == pytest.approx(float(reference_result['u_st']))
+
+
+def test_unknown_formulation():
+    with pytest.raises(ValueError):
+        _solve('deterministic', 'linear', 'highs', 0.5)
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.api.fx_rates import convert
+
+# As-of conversion of prices between currencies with rates per 1 USD (the base currency).
+
+
+@pytest.fixture
+def rates():
+    days = pd.date_range('2019-01-01', periods = 3, freq = 'D')
+    return pd.DataFrame({'EUR': [0.8, 0.9, 1.0], 'PLN': [4.0, 4.5, 5.0]}, index = days)
+
+
+def test_convert_as_of(rates):
+    times = pd.date_range('2018-12-31 12:00', periods = 4, freq = '12h', tz = 'UTC')
+    prices = pd.Series([10.0, 10.0, 10.0, 10.0], index = times)
+    converted = convert(prices, rates, 'EUR', 'PLN')
+
+    # Before the first rate - NaN, then the rates of the last day not later than the time
+    assert np.isnan(converted.iloc[0])
+    np.testing.assert_allclose(converted.iloc[1:].to_numpy(), [10 * 4.0 / 0.8, 10 * 4.0 / 0.8, 10 * 4.5 / 0.9])
+
+
+def test_convert_base_currency(rates):
+    prices = pd.DataFrame({'a': [1.0, 2.0]}, index = pd.to_datetime(['2019-01-01', '2019-01-03']))
+    converted = convert(prices, rates, 'USD', 'EUR')
+    np.testing.assert_allclose(converted['a'].to_numpy(), [0.8, 2.0])
+    np.testing.assert_allclose(convert(converted, rates, 'EUR', 'USD')['a'].to_numpy(), [1.0, 2.0])
+
+
+def test_convert_missing_currency(rates):
+    prices = pd.Series([1.0], index = pd.to_datetime(['2019-01-02']))
+    with pytest.raises(KeyError):
+        convert(prices, rates, 'EUR', 'GBP')
+    with pytest.raises(KeyError):
+        convert(prices, rates, 'EUR', 'USD', base = 'PLN')
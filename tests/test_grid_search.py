@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from src.analysis import grid_search
+
+# Checkpoint of the grid search: a rerun with the same data and options reuses the fits, other options fit again.
+
+
+def _search(series, checkpoint, **options):
+    return grid_search.grid_search(series, orders = ((1,0,0), (1,1,1)), seasonal_orders = ((0,0,0,0),),
+                                   data_since = '2012-01-01', data_till = '2012-06-30', processes = 1,
+                                   checkpoint = checkpoint, **options)
+
+
+def _records(checkpoint):
+    with open(checkpoint) as file:
+        return sum(1 for _ in file)
+
+
+def test_checkpoint_depends_on_options(tmp_path):
+    dates = pd.date_range('2012-01-01', '2012-06-30')
+    series = pd.Series(20 + np.random.default_rng(0).normal(0, 1, len(dates)).cumsum() * 0.1, index = dates)
+    checkpoint = str(tmp_path / 'checkpoint.jsonl')
+
+    first = _search(series, checkpoint, maxiter = 5)
+    assert _records(checkpoint) == 4   # screening and full fit of both candidates
+
+    second = _search(series, checkpoint, maxiter = 5)
+    assert _records(checkpoint) == 4
+    pd.testing.assert_frame_equal(first.drop(columns = ['screening_seconds', 'seconds']),
+                                  second.drop(columns = ['screening_seconds', 'seconds']))
+
+    _search(series, checkpoint, maxiter = 20)
+    assert _records(checkpoint) == 8
+    _search(series, checkpoint, maxiter = 20, screening_maxiter = 3)
+    assert _records(checkpoint) == 12
@@ -0,0 +1,33 @@
+import pytest
+
+from src.analysis import benchmark, optimization, rolling_horizon
+
+# With the window as long as the horizon (and perfect foresight) the rolling plan is the optimum of the whole horizon;
+# shorter windows cannot be better than it.
+
+
+@pytest.fixture(scope = 'module')
+def inputs():
+    return benchmark.synthetic_inputs(14)
+
+
+def test_full_window_is_optimal(inputs):
+    forecasting_since, forecasting_till, prices, demand = inputs
+    optimum, _ = optimization.deterministic(forecasting_since, forecasting_till, 1.0, benchmark.DETERMINISTIC_PARAMETERS, prices, demand,
+                                            backend = 'highs')
+    objective, plan, fixed = rolling_horizon.deterministic(forecasting_since, forecasting_till, 14, 1.0, benchmark.DETERMINISTIC_PARAMETERS,
+                                                           prices, demand, backend = 'highs')
+    assert objective == pytest.approx(optimum, rel = 1e-6)
+    assert plan.shape[0] == 14
+    assert set(fixed) == {'st_max', 'u_st'}
+
+
+@pytest.mark.parametrize('window', [2, 3, 7])
+def test_short_window_is_not_better(inputs, window):
+    forecasting_since, forecasting_till, prices, demand = inputs
+    optimum, _ = optimization.deterministic(forecasting_since, forecasting_till, 1.0, benchmark.DETERMINISTIC_PARAMETERS, prices, demand,
+                                            backend = 'highs')
+    objective, plan, _ = rolling_horizon.deterministic(forecasting_since, forecasting_till, window, 1.0, benchmark.DETERMINISTIC_PARAMETERS,
+                                                       prices, demand, backend = 'highs')
+    assert objective >= optimum - 1e-6 * abs(optimum)
+    assert plan['st'].iloc[0] == pytest.approx(0, abs = 1e-9)
@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from src.analysis import forecasting
+from src.data.store import TimeSeriesStore
+
+# The forecasting functions read their input from the time series store (hourly points, as written by entsoe_sync.py).
+
+
+def test_forecast_store(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / 'store'))
+    times = pd.date_range('2015-01-01', '2015-04-30 23:00', freq = 'h', tz = 'UTC')
+    hours = np.arange(len(times))
+    data = pd.DataFrame({'value': 100 + 10 * np.sin(2 * np.pi * hours / 24) + hours / 24, 'process_type': 'A16'}, index = times)
+    store.append(data, 'entsoe', 'A65', '10YPL-AREA-----S')
+
+    series = forecasting.store_series(store, 'entsoe', 'A65', '10YPL-AREA-----S', '2015-01-01', '2015-03-31', process_type = 'A16')
+    assert series.index[0] == pd.Timestamp('2015-01-01') and series.index[-1] == pd.Timestamp('2015-03-31')
+    assert series.index.tz is None
+    # Daily mean - the daily cycle averages out
+    np.testing.assert_allclose(series.to_numpy(), 100 + (np.arange(len(series)) * 24 + 11.5) / 24)
+
+    pred_ci = forecasting.forecast_store(str(tmp_path / 'store'), 'entsoe', 'A65', '10YPL-AREA-----S', '2015-01-01', '2015-03-31',
+                                         '2015-04-01', '2015-04-07', (1,1,0), (0,0,0,0), process_type = 'A16')
+    assert pred_ci.shape == (7, 2)
+    assert (pred_ci.iloc[:, 0] < pred_ci.iloc[:, 1]).all()